@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'goalit.settings')
+# async hot paths (goalit.asgi_urls) and ASGI-friendly database settings
+os.environ.setdefault('GOALIT_ASGI', '1')
 
 application = get_asgi_application()
@@ -0,0 +1,18 @@
+"""
+URL configuration under ASGI (goalit/asgi.py): the signup hot paths and
+the comment long poll of the match API go to their async versions in
+league.async_api; everything else is goalit.urls.
+"""
+from django.urls import path
+
+from league import async_api
+
+from .urls import urlpatterns as sync_urlpatterns
+
+urlpatterns = [
+    path("api/matches/<int:pk>/participants/", async_api.participants, name="async-match-participants"),
+    path("api/matches/<int:pk>/join/", async_api.join, name="async-match-join"),
+    path("api/matches/<int:pk>/leave/", async_api.leave, name="async-match-leave"),
+    path("api/matches/<int:pk>/comments/", async_api.comments, name="async-match-comments"),
+    *sync_urlpatterns,
+]
@@ -41,11 +41,13 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'league.apps.LeagueConfig',
     'rest_framework',
+    'django_filters',
   
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'league.middleware.RequestMetricsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -54,7 +56,10 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-ROOT_URLCONF = 'goalit.urls'
+# set by goalit/asgi.py: serve the match API's signup hot paths from league.async_api
+GOALIT_ASGI = os.environ.get('GOALIT_ASGI') == '1'
+
+ROOT_URLCONF = 'goalit.asgi_urls' if GOALIT_ASGI else 'goalit.urls'
 
 TEMPLATES = [
     {
@@ -84,9 +89,35 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # keep connections open between requests (league.sqlite sets them up once); not
+        # under ASGI, where each request runs its sync code in a new thread and would leak them
+        'CONN_MAX_AGE': 0 if GOALIT_ASGI else 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # take the write lock at BEGIN, so concurrent read-then-write transactions can't deadlock
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
+# PRAGMAs applied to every new SQLite connection, on top of league.sqlite.PRAGMAS
+LEAGUE_SQLITE_PRAGMAS = {}
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# locmem is per process; use FileBasedCache (or a shared backend) to share
+# rendered match fragments and hit/miss stats between workers.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'goalit',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+}
+LEAGUE_CACHE = 'default'
+LEAGUE_FRAGMENT_TIMEOUT = 60 * 60
+
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
         "rest_framework.authentication.SessionAuthentication",
@@ -134,6 +165,26 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 
+# Uploads (match highlights and their derivatives, see league.highlights)
+MEDIA_URL = '/media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+
+# Background jobs (league.jobs): threads of each web process that run jobs
+# as soon as the transaction queuing them commits. 0 leaves them all to
+# `manage.py run_jobs`, which should run anyway to pick up retries.
+LEAGUE_JOB_WORKERS = 2
+# a job "running" for longer than this (seconds) is assumed lost and requeued
+LEAGUE_JOB_TIMEOUT = 10 * 60
+
+# Request metrics (league.metrics), scraped at /metrics by staff users or
+# with "Authorization: Bearer <LEAGUE_METRICS_TOKEN>"
+LEAGUE_METRICS_TOKEN = os.environ.get('LEAGUE_METRICS_TOKEN')
+# share of requests whose queries are recorded (query histograms, SQL in the
+# slow-request log); the others skip the per-query wrapper altogether
+LEAGUE_METRICS_SAMPLE_RATE = 0.1
+# requests at least this slow are logged to "league.slow_requests"
+LEAGUE_SLOW_REQUEST_SECONDS = 1.0
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
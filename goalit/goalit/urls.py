@@ -14,12 +14,20 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
+from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path, include
+from league.views import highlight_derivative, prometheus_metrics
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', prometheus_metrics, name='metrics'),
+    path(f"{settings.MEDIA_URL.strip('/')}/highlights/derived/<path:path>", highlight_derivative),
     path('accounts/', include('django.contrib.auth.urls')),
     path('api/', include('league.api_urls')),
     path("", include("league.urls", namespace="league")),
 ]
+
+# uploaded originals; only served by Django while DEBUG
+urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
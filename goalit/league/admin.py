@@ -1,5 +1,27 @@
 from django.contrib import admin
-from .models import (PlayerProfil, Match, Team, MatchParticipation, BadgeType, Badge, MatchComment, MatchHighlight)
+from django.db import transaction
+from django.utils import timezone
+from .models import (PlayerProfil, Match, Team, MatchParticipation, Standing, BadgeType, Badge, BadgeRun, MatchComment, MatchHighlight,
+                     LedgerEntry, PlayerBalance, PlayerStats, Job)
+from .counters import recount_matches
+from .admission import promote_waitlist
+from . import events, highlights, jobs, search
+
+class FullTextSearchMixin:
+    # search_fields stay as the icontains fallback when FTS5 is unavailable
+    search_kind = None
+
+    def get_search_results(self, request, queryset, search_term):
+        words = search.terms(search_term)
+        if not words or not search.available():
+            return super().get_search_results(request, queryset, search_term)
+        return queryset.filter(search.matching(self.search_kind, words)), False
+
+def fill_free_slots(match_id):
+    # admin edits bypass admission.set_status: hand free slots to the waitlist and tell the pages
+    promoted = promote_waitlist(match_id)
+    if promoted:
+        events.roster_changed(match_id, promoted)
 
 class TeamInline(admin.TabularInline):
     model = Team
@@ -17,12 +39,26 @@ class TeamAdmin(admin.ModelAdmin):
     search_fields = ("name", "match__title", "match__location")
     
 @admin.register(Match)
-class MatchAdmin(admin.ModelAdmin):
-    list_display = ("title", "date", "time", "location", "max_players", "final_score", "confirmed_count")
+class MatchAdmin(FullTextSearchMixin, admin.ModelAdmin):
+    list_display = ("title", "date", "time", "location", "max_players", "final_score", "going_count", "waiting_count")
     list_filter = ("date", "location", "final_score")
     search_fields = ("title", "location", "notes")
+    search_kind = "matches"
     inlines = [TeamInline, ParticipationInline]
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if change and "max_players" in form.changed_data:
+            recount_matches(Match.objects.filter(pk=obj.pk))
+            fill_free_slots(obj.pk)
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # inline edits bypass the views, so resync the counters for this match
+        recount_matches(Match.objects.filter(pk=form.instance.pk))
+        # removed or moved players may free slots for the waitlist
+        fill_free_slots(form.instance.pk)
+
 @admin.register(MatchParticipation)
 class MatchParticipationAdmin(admin.ModelAdmin):
     list_display = ("match", "player", "status", "team", "actually_played", "goals", "assists", "is_mvp", "has_paid")
@@ -30,25 +66,122 @@ class MatchParticipationAdmin(admin.ModelAdmin):
     search_fields = ("match__title", "player__user__username", "player__nickname")
     autocomplete_fields = ("match", "player", "team")
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        recount_matches(Match.objects.filter(pk=obj.match_id))
+        fill_free_slots(obj.match_id)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        recount_matches(Match.objects.filter(pk=obj.match_id))
+        fill_free_slots(obj.match_id)
+
+    def delete_queryset(self, request, queryset):
+        match_ids = list(queryset.values_list("match_id", flat=True).distinct())
+        super().delete_queryset(request, queryset)
+        recount_matches(Match.objects.filter(pk__in=match_ids))
+        for match_id in match_ids:
+            fill_free_slots(match_id)
+
 @admin.register(PlayerProfil)
 class PlayerProfileAdmin(admin.ModelAdmin):
     list_display = ("__str__", "preferred_position")
     search_fields = ("user__username", "nickname")
 
+@admin.register(Standing)
+class StandingAdmin(admin.ModelAdmin):
+    list_display = ("player", "period", "points", "matches_played", "goals", "assists", "mvps", "no_shows")
+    list_filter = ("period",)
+    search_fields = ("player__user__username", "player__nickname")
+
+@admin.register(PlayerStats)
+class PlayerStatsAdmin(admin.ModelAdmin):
+    list_display = ("player", "points", "matches_played", "goals", "assists", "mvps", "no_shows", "last_played")
+    search_fields = ("player__user__username", "player__nickname")
+    list_select_related = ("player__user",)
+
 @admin.register(BadgeType)
 class BadgeTypeAdmin(admin.ModelAdmin):
     list_display = ("code", "name")
 
 @admin.register(Badge)
 class BadgeAdmin(admin.ModelAdmin):
-    list_display = ("player", "badge_type", "awarded_at", "period_start", "period_end")
+    list_display = ("player", "badge_type", "awarded_at", "period_start", "period_end", "match")
     list_filter = ("badge_type", "awarded_at")
 
+@admin.register(BadgeRun)
+class BadgeRunAdmin(admin.ModelAdmin):
+    list_display = ("watermark", "matches_processed", "badges_awarded", "badges_revoked")
+
+class ReadOnlyAdmin(admin.ModelAdmin):
+    # money moves through league.ledger only, so balances stay in step with the entries
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+@admin.register(LedgerEntry)
+class LedgerEntryAdmin(ReadOnlyAdmin):
+    list_display = ("created_at", "player", "kind", "amount", "match", "recorded_by", "note")
+    list_filter = ("kind", "created_at")
+    search_fields = ("player__user__username", "player__nickname", "note")
+    list_select_related = ("player__user", "match", "recorded_by__user")
+
+@admin.register(PlayerBalance)
+class PlayerBalanceAdmin(ReadOnlyAdmin):
+    list_display = ("player", "balance", "updated_at")
+    search_fields = ("player__user__username", "player__nickname")
+    list_select_related = ("player__user",)
+    ordering = ("-balance",)
+
 @admin.register(MatchComment)
-class MatchCommentAdmin(admin.ModelAdmin):
+class MatchCommentAdmin(FullTextSearchMixin, admin.ModelAdmin):
     list_display = ("match", "author", "created_at")
     search_fields = ("text",)
+    search_kind = "comments"
 
 @admin.register(MatchHighlight)
 class MatchHighlightAdmin(admin.ModelAdmin):
-    list_display = ("match", "added_by", "created_at")
+    list_display = ("match", "added_by", "status", "width", "height", "created_at")
+    list_filter = ("status",)
+    readonly_fields = ("content_hash", "status", "width", "height", "derivatives", "processed_at")
+    actions = ["reprocess"]
+
+    def save_model(self, request, obj, form, change):
+        if "image" in form.changed_data and obj.image:
+            obj.content_hash = highlights.content_hash(obj.image)
+            obj.status, obj.derivatives = "pending", {}
+        super().save_model(request, obj, form, change)
+        if obj.image and obj.status == "pending":
+            highlights.enqueue(obj.pk)
+
+    @admin.action(description="Generate missing thumbnails and variants")
+    def reprocess(self, request, queryset):
+        for pk in queryset.exclude(image="").values_list("pk", flat=True):
+            highlights.enqueue(pk)
+        self.message_user(request, "Queued for processing.")
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ("id", "kind", "status", "attempts", "run_after", "created_at", "finished_at")
+    list_filter = ("status", "kind")
+    readonly_fields = ("created_at", "started_at", "finished_at", "locked_by", "last_error")
+    actions = ["retry"]
+
+    @admin.action(description="Retry failed jobs now")
+    def retry(self, request, queryset):
+        # only failed jobs: the handlers aren't idempotent, re-running a done one applies its writes twice
+        selected = queryset.count()
+        count = queryset.filter(status="failed").update(
+            status="queued", attempts=0, run_after=timezone.now(), finished_at=None
+        )
+        transaction.on_commit(jobs.wake, robust=True)
+        message = f"{count} job(s) queued."
+        if selected > count:
+            message += f" {selected - count} skipped: only failed jobs can be retried."
+        self.message_user(request, message)
+
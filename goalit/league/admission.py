@@ -0,0 +1,173 @@
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from . import events
+from .counters import adjust_counters, recount_matches
+from .models import Match, MatchParticipation
+
+# statuses a player may pick for themselves; "waiting" is only ever assigned here
+SELF_SERVICE_STATUSES = ("going", "maybe", "not_going")
+
+
+class MatchFull(Exception):
+    """More players would be going than the match has room for."""
+
+
+def take_slot(match_id, behind_waitlist=False):
+    """
+    Claim one "going" slot with a single conditional UPDATE. True if the match had room.
+    With behind_waitlist the claim also fails while anyone is waiting: free
+    slots go to the head of the queue first.
+    """
+    matches = Match.objects.filter(pk=match_id, going_count__lt=F("max_players"))
+    if behind_waitlist:
+        matches = matches.filter(waiting_count=0)
+    return matches.update(going_count=F("going_count") + 1) == 1
+
+
+def release_slot(match_id):
+    Match.objects.filter(pk=match_id, going_count__gt=0).update(going_count=F("going_count") - 1)
+
+
+def waitlist(match_id):
+    """Waiting participations of a match, head of the queue first."""
+    return MatchParticipation.objects.filter(match_id=match_id, status="waiting").order_by("waitlisted_at", "id")
+
+
+def _ahead_of(part):
+    return waitlist(part.match_id).filter(
+        Q(waitlisted_at__lt=part.waitlisted_at) | Q(waitlisted_at=part.waitlisted_at, id__lt=part.id)
+    )
+
+
+def waitlist_position(part):
+    """1-based FIFO position of a waiting participation, None if it isn't waiting."""
+    if part.status != "waiting":
+        return None
+    return _ahead_of(part).count() + 1
+
+
+async def awaitlist_position(part):
+    """waitlist_position() for async views."""
+    if part.status != "waiting":
+        return None
+    return await _ahead_of(part).acount() + 1
+
+
+def promote_waitlist(match_id):
+    """
+    Move waiting players into free slots, head of the queue first.
+    Returns the promoted participations.
+    """
+    promoted = []
+    while True:
+        head = waitlist(match_id).first()
+        if head is None or not take_slot(match_id):
+            break
+        # someone else may have promoted or removed the head meanwhile
+        claimed = MatchParticipation.objects.filter(pk=head.pk, status="waiting").update(
+            status="going", waitlisted_at=None
+        )
+        if not claimed:
+            release_slot(match_id)
+            continue
+        adjust_counters(match_id, "waiting", None)
+        head.status = "going"
+        head.waitlisted_at = None
+        promoted.append(head)
+    return promoted
+
+
+@transaction.atomic
+def set_status(match, profile, status):
+    """
+    Put the player's participation in `status`, creating it if needed.
+    "going" takes a free slot only when nobody is waiting, otherwise the
+    player queues (or keeps their place) and free slots are handed out in
+    waitlist order; giving up a slot promotes the head of the waitlist in the
+    same transaction. Returns (participation, promoted participations), the
+    latter without the player's own participation.
+    """
+    part = MatchParticipation.objects.select_for_update().filter(match=match, player=profile).first()
+    old_status = part.status if part else None
+    if part is None:
+        part = MatchParticipation(match=match, player=profile)
+
+    if status != "going" or old_status == "going":
+        new_status = status
+    elif take_slot(match.pk, behind_waitlist=True):
+        new_status = "going"
+    else:
+        new_status = "waiting"
+
+    part.status = new_status
+    if new_status != "waiting":
+        part.waitlisted_at = None
+    elif old_status != "waiting":
+        part.waitlisted_at = timezone.now()
+    part.save()
+
+    # going_count is maintained by take_slot/release_slot, only the queue length is left
+    if new_status == "waiting" and old_status != "waiting":
+        adjust_counters(match.pk, None, "waiting")
+    elif old_status == "waiting" and new_status != "waiting":
+        adjust_counters(match.pk, "waiting", None)
+
+    promoted = []
+    if old_status == "going" and new_status != "going":
+        release_slot(match.pk)
+        promoted = promote_waitlist(match.pk)
+    elif new_status == "waiting":
+        # queued behind others, though slots may be free (e.g. max_players was raised)
+        promoted = promote_waitlist(match.pk)
+        if any(p.pk == part.pk for p in promoted):
+            part.status, part.waitlisted_at = "going", None
+            promoted = [p for p in promoted if p.pk != part.pk]
+    events.roster_changed(match.pk, [part, *promoted])
+    return part, promoted
+
+
+@transaction.atomic
+def leave(match, profile):
+    """
+    Remove the player's participation and hand a freed slot to the waitlist.
+    Returns (deleted participation or None, promoted participations).
+    """
+    part = MatchParticipation.objects.select_for_update().filter(match=match, player=profile).first()
+    if part is None:
+        return None, []
+    part_id = part.pk
+    part.delete()
+
+    promoted = []
+    if part.status == "waiting":
+        adjust_counters(match.pk, "waiting", None)
+    elif part.status == "going":
+        release_slot(match.pk)
+        promoted = promote_waitlist(match.pk)
+    events.roster_changed(match.pk, promoted, left_ids=[part_id])
+    return part, promoted
+
+
+@transaction.atomic
+def set_lineup(match, participations, statuses_changed=False):
+    """
+    Save the team (and status) of already-updated participations of `match`
+    with one bulk_update. When statuses moved, the stored counters are
+    recounted and freed slots go to the waitlist; MatchFull rolls everything
+    back if the result would overfill the match.
+    Returns the promoted participations.
+    """
+    fields = ["team", "status", "waitlisted_at"] if statuses_changed else ["team"]
+    MatchParticipation.objects.bulk_update(participations, fields)
+
+    promoted = []
+    if statuses_changed:
+        recount_matches(Match.objects.filter(pk=match.pk))
+        if Match.objects.filter(pk=match.pk, going_count__gt=F("max_players")).exists():
+            raise MatchFull
+        promoted = promote_waitlist(match.pk)
+    else:
+        Match.objects.filter(pk=match.pk).touch()
+    events.roster_changed(match.pk, [*participations, *promoted])
+    return promoted
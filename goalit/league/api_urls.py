@@ -1,9 +1,13 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .api_views import MatchViewSet
+from .api_views import LedgerViewSet, MatchViewSet, PlayerViewSet, SearchViewSet, StandingViewSet
 
 router = DefaultRouter()
 router.register("matches", MatchViewSet, basename="match")
+router.register("players", PlayerViewSet, basename="player")
+router.register("ledger", LedgerViewSet, basename="ledger")
+router.register("standings", StandingViewSet, basename="standing")
+router.register("search", SearchViewSet, basename="search")
 
 urlpatterns = [
     path("", include(router.urls)),
@@ -1,16 +1,117 @@
-from rest_framework import viewsets, status
+import hashlib
+import math
+import time
+from functools import partial
+
+from rest_framework import mixins, viewsets, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.generics import get_object_or_404
+from django.db.models import Q
+from django.http import Http404
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_date
+from django.utils.http import http_date
 from rest_framework.response import Response
-import random
-from rest_framework.permissions import IsAuthenticated
-from .models import Match, MatchParticipation
-from .serializers import MatchSerializer, MatchParticipationSerializer
+from rest_framework.parsers import JSONParser, MultiPartParser
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from .models import LedgerEntry, Match, MatchComment, MatchHighlight, MatchParticipation, PlayerProfil, PlayerStats
+from django_filters.rest_framework import DjangoFilterBackend
+from . import admission, balancing, events, highlights, ledger, player_import, player_stats, search, standings
+from .filters import MatchFilter
+from .pagination import (
+    CommentPagination, DebtorsPagination, HighlightPagination, LedgerPagination, MatchCursorPagination,
+    StandingsPagination,
+)
+from .serializers import (
+    BalanceSerializer,
+    CommentHitSerializer,
+    CommentSerializer,
+    FinalizeMatchSerializer,
+    HighlightSerializer,
+    HighlightUploadSerializer,
+    LedgerEntrySerializer,
+    LineupSerializer,
+    MarkPaidSerializer,
+    MatchHitSerializer,
+    MatchPaymentsSerializer,
+    MatchParticipationSerializer,
+    MatchSerializer,
+    PlayerBalanceSerializer,
+    PlayerImportSerializer,
+    PlayerProfilSerializer,
+    PlayerStatsSerializer,
+    StandingSerializer,
+)
+
+
+def not_modified(request, etag, last_modified):
+    """The 304 (or 412) response when the client's copy is current, else None."""
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    return get_conditional_response(request, etag=etag, last_modified=timestamp)
+
+
+def set_validators(request, response, etag, last_modified):
+    if request.method in ("GET", "HEAD"):
+        response["ETag"] = etag
+        if last_modified is not None:
+            response["Last-Modified"] = http_date(int(last_modified.timestamp()))
+    return response
+
+
+def conditional_response(request, etag, last_modified, build):
+    """
+    Answer 304 Not Modified from the validators alone; only call build()
+    (and so the serializer and its queries) when the client's copy is stale.
+    """
+    response = not_modified(request, etag, last_modified)
+    if response is None:
+        response = build()
+    return set_validators(request, response, etag, last_modified)
+
+
+COMMENTS_MAX_WAIT = 25
+
+
+def comment_poll_params(params):
+    """(since, wait) of a comments poll, wait clamped to 0..COMMENTS_MAX_WAIT seconds; ValidationError if malformed."""
+    try:
+        since = int(params["since"])
+        wait = float(params.get("wait", 0))
+    except ValueError:
+        raise ValidationError({"since": "Expected a comment id (and wait in seconds)."})
+    if not math.isfinite(wait):
+        raise ValidationError({"wait": "Expected a number of seconds."})
+    return since, min(max(wait, 0.0), COMMENTS_MAX_WAIT)
+
+
+def comments_after(thread, since, last):
+    """
+    The comments of `thread` posted after comment `since`, whose sort key
+    (created_at, id) is `last` if it still exists: continuing from that key
+    keeps the poll a range scan of the thread index.
+    """
+    paginator = CommentPagination()
+    return thread.filter(paginator.after(last) if last else Q(pk__gt=since)).order_by(*paginator.ordering)
+
+
+def comments_since_data(comments, since):
+    return {"since": comments[-1].pk if comments else since, "results": CommentSerializer(comments, many=True).data}
 
 
 class MatchViewSet(viewsets.ModelViewSet):
-    queryset = Match.objects.all().order_by("-date", "-time")
+    # going_count is a stored column, so a page costs one query plus the teams prefetch
+    queryset = (
+        Match.objects
+        .select_related("created_by__user")
+        .prefetch_related("teams")
+        .order_by("-date", "-time", "id")
+    )
     serializer_class = MatchSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = MatchCursorPagination
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = MatchFilter
 
     def perform_create(self, serializer):
         # the logged-in user becomes created_by
@@ -18,6 +119,11 @@ class MatchViewSet(viewsets.ModelViewSet):
     
     @action(detail=True, methods=["post"], url_path="randomize-teams")
     def randomize_teams(self, request, pk=None):
+        """
+        Split the confirmed players over all of the match's teams, balancing
+        historical points and spreading goalkeepers.
+        Optional JSON body: {"preview": true} returns the split without saving it.
+        """
         match = self.get_object()
 
         if match.final_score:
@@ -32,88 +138,429 @@ class MatchViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
 
-        teams = list(match.teams.all())
-        if len(teams) < 2:
+        if len(match.teams.all()) < 2:
             return Response(
                 {"detail": "Create at least two teams first."},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        players = list(
-            match.participations
-            .filter(status="going")
-            .select_related("player")
-        )
-
-        if not players:
+        split = balancing.balance_match(match)
+        participations = [p for _, members in split for p in members]
+        if not participations:
             return Response(
                 {"detail": "No confirmed players to assign."},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        random.shuffle(players)
+        preview = str(request.data.get("preview", request.query_params.get("preview", ""))).lower() in ("1", "true")
+        if not preview:
+            for team, members in split:
+                for p in members:
+                    p.team = team
+            MatchParticipation.objects.bulk_update(participations, ["team"])
+            Match.objects.filter(pk=match.pk).touch()
+            events.roster_changed(match.pk, participations)
 
-        team_a, team_b = teams[0], teams[1]
+        return Response({
+            "detail": "Proposed teams." if preview else "Teams randomized successfully.",
+            "preview": preview,
+            "teams": [
+                {
+                    "id": team.id,
+                    "name": team.name,
+                    "rating": round(sum(p.rating for p in members), 1),
+                    "players": [
+                        {
+                            "id": p.id,
+                            "player": p.player_id,
+                            "name": p.player.nickname or p.player.user.username,
+                            "position": p.player.preferred_position,
+                            "rating": round(p.rating, 1),
+                        }
+                        for p in members
+                    ],
+                }
+                for team, members in split
+            ],
+        })
 
-        for i, p in enumerate(players):
-            p.team = team_a if i % 2 == 0 else team_b
-            p.save(update_fields=["team"])
+    @action(detail=True, methods=["post"])
+    def finalize(self, request, pk=None):
+        """
+        Organizer records the result and locks the match, see FinalizeMatchSerializer
+        for the document format. Everything is validated before anything is written.
+        """
+        match = self.get_object()
+
+        if match.final_score:
+            return Response({"detail": "Match is finalized."}, status=status.HTTP_400_BAD_REQUEST)
+
+        if not match.created_by or match.created_by != request.user.profile:
+            return Response(
+                {"detail": "Only the organizer can finalize the match."},
+                status=status.HTTP_403_FORBIDDEN
+            )
 
-        return Response({"detail": "Teams randomized successfully."})
+        serializer = FinalizeMatchSerializer(data=request.data, context={"match": match})
+        serializer.is_valid(raise_exception=True)
+        if not serializer.save():
+            return Response({"detail": "Match is finalized."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(MatchSerializer(match).data)
+
+    @action(detail=True, methods=["put"])
+    def lineup(self, request, pk=None):
+        """
+        Organizer sets the whole team assignment (and optionally statuses) in
+        one request, see LineupSerializer. Returns the updated roster.
+        """
+        match = self.get_object()
+
+        if match.final_score:
+            return Response({"detail": "Match is finalized."}, status=status.HTTP_400_BAD_REQUEST)
+
+        if not match.created_by or match.created_by_id != request.user.profile.pk:
+            return Response(
+                {"detail": "Only the organizer can set the lineup."},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        serializer = LineupSerializer(data=request.data, context={"match": match})
+        serializer.is_valid(raise_exception=True)
+        try:
+            serializer.save()
+        except admission.MatchFull:
+            return Response(
+                {"detail": f"Only {match.max_players} players can be going."},
+                status=status.HTTP_409_CONFLICT
+            )
+        participations = match.participations.select_related("player__user", "team")
+        return Response(MatchParticipationSerializer(participations, many=True).data)
+
+    def _stamp(self, pk):
+        """(version, updated_at) of one match, without loading the match itself."""
+        return get_object_or_404(Match.objects.values_list("version", "updated_at"), pk=pk)
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = kwargs[self.lookup_field]
+        version, updated_at = self._stamp(pk)
+        etag = f'"match-{pk}-v{version}-{request.accepted_renderer.format}"'
+        return conditional_response(request, etag, updated_at, partial(super().retrieve, request, *args, **kwargs))
+
+    def list(self, request, *args, **kwargs):
+        # validators of the requested page only: the same index range scan as the page itself.
+        # Every write bumps a version, and a match entering or leaving the page changes the ids.
+        matches = self.filter_queryset(self.get_queryset()).values_list("pk", "version", "updated_at")
+        stamp = list(self.paginator.window(matches, request))
+        rows = ",".join(f"{pk}.{version}" for pk, version, _ in stamp)
+        key = f"{rows}:{request.get_full_path()}:{request.accepted_renderer.format}"
+        etag = f'"matches-{hashlib.md5(key.encode()).hexdigest()}"'
+        modified = max((updated_at for _, _, updated_at in stamp), default=None)
+        return conditional_response(request, etag, modified, partial(super().list, request, *args, **kwargs))
 
     @action(detail=True, methods=["get"])
     def participants(self, request, pk=None):
-        match = self.get_object()
-        participations = match.participations.select_related("player", "team")
-        serializer = MatchParticipationSerializer(participations, many=True)
-        return Response(serializer.data)
+        version, updated_at = self._stamp(pk)
+        etag = f'"participants-{pk}-v{version}-{request.accepted_renderer.format}"'
+
+        def build():
+            participations = MatchParticipation.objects.filter(match_id=pk).select_related("player__user", "team")
+            serializer = MatchParticipationSerializer(participations, many=True)
+            return Response(serializer.data)
+
+        return conditional_response(request, etag, updated_at, build)
 
     @action(detail=True, methods=["post"])
     def join(self, request, pk=None):
         """
         Current user joins the match.
         Optional JSON body: {"status": "going" | "maybe" | "not_going"}
-        Capacity is applied for status="going".
+        Capacity is applied for status="going": a full match puts the user
+        on the waiting list and the response carries their waitlist_position.
         """
         match = self.get_object()
         profile = request.user.profile  # PlayerProfil
 
+        if match.final_score:
+            return Response(
+                {"detail": "Match is finalized."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
         desired_status = request.data.get("status", "going")
-        if desired_status not in ["going", "maybe", "not_going"]:
+        if desired_status not in admission.SELF_SERVICE_STATUSES:
             return Response(
                 {"detail": "Invalid status."},
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        part, created = MatchParticipation.objects.get_or_create(
-            match=match,
-            player=profile,
-        )
-
-        # capacity check only if status=going
-        if desired_status == "going":
-            confirmed_count = match.participations.filter(status="going").exclude(id=part.id).count()
-            if confirmed_count >= match.max_players:
-                part.status = "waiting"
-            else:
-                part.status = "going"
-        else:
-            part.status = desired_status
-
-        part.save()
+        part, _ = admission.set_status(match, profile, desired_status)
         serializer = MatchParticipationSerializer(part)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        data = dict(serializer.data, waitlist_position=admission.waitlist_position(part))
+        return Response(data, status=status.HTTP_200_OK)
 
     @action(detail=True, methods=["post"])
     def leave(self, request, pk=None):
         """
         Current user leaves the match.
+        A freed slot goes to the head of the waiting list.
         """
         match = self.get_object()
+        if match.final_score:
+            # the participation carries the stats and the fee of a finalized match
+            return Response(
+                {"detail": "Match is finalized."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         profile = request.user.profile
-        deleted, _ = MatchParticipation.objects.filter(match=match, player=profile).delete()
-        if deleted:
-            return Response(status=status.HTTP_204_NO_CONTENT)
-        return Response({"detail": "You were not registered for this match."}, status=status.HTTP_400_BAD_REQUEST)
-    
-    
\ No newline at end of file
+        part, _ = admission.leave(match, profile)
+        if part is None:
+            return Response({"detail": "You were not registered for this match."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    # seconds between checks of a ?wait= poll (WSGI only)
+    COMMENTS_POLL_INTERVAL = 1
+
+    @action(detail=True, methods=["get", "post"])
+    def comments(self, request, pk=None):
+        """
+        GET: the thread, oldest first, in keyset pages (?cursor=, ?page_size=).
+        GET ?since=<comment id>: only the comments posted after that one; add
+        ?wait=<seconds> (max 25) to hold the request until one arrives.
+        Either way "since" in the response is the id to poll from next.
+        POST {"text": ...}: comment as the current user.
+        """
+        if not Match.objects.filter(pk=pk).exists():
+            raise Http404("No Match matches the given query.")
+
+        if request.method == "POST":
+            serializer = CommentSerializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            serializer.save(match_id=pk, author=request.user.profile)  # wakes waiting polls, see signals
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+        thread = MatchComment.objects.filter(match_id=pk).select_related("author__user")
+        since = request.query_params.get("since")
+        if since is None:
+            paginator = CommentPagination()
+            page = paginator.paginate_queryset(thread, request, view=self)
+            return paginator.get_paginated_response(CommentSerializer(page, many=True).data)
+
+        since, wait = comment_poll_params(request.query_params)
+        last = thread.filter(pk=since).values("created_at", "id").first()
+        new = comments_after(thread, since, last)
+        # Under ASGI, waiting polls are served by league.async_api.comments off
+        # the event broker instead; this loop only runs on WSGI deployments.
+        deadline = time.monotonic() + wait
+        while True:
+            comments = list(new[:CommentPagination.max_page_size])
+            if comments or time.monotonic() >= deadline:
+                break
+            time.sleep(min(self.COMMENTS_POLL_INTERVAL, max(deadline - time.monotonic(), 0)))
+        return Response(comments_since_data(comments, since))
+
+    @action(detail=True, methods=["get", "post"], url_path="highlights")
+    def gallery(self, request, pk=None):
+        """
+        GET: the match's highlight photos, newest first, in keyset pages, with
+        the URLs of their thumbnail and web-sized variants.
+        POST (multipart: image, description): upload one. 202 while its
+        variants are generated in the background, 201 if the same image was
+        uploaded before and they already exist.
+        """
+        match = Match.objects.filter(pk=pk).first()
+        if match is None:
+            raise Http404("No Match matches the given query.")
+
+        if request.method == "POST":
+            serializer = HighlightUploadSerializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            highlight = highlights.accept(
+                match, serializer.validated_data["image"], request.user.profile, serializer.validated_data["description"]
+            )
+            code = status.HTTP_201_CREATED if highlight.status == "ready" else status.HTTP_202_ACCEPTED
+            return Response(HighlightSerializer(highlight).data, status=code)
+
+        paginator = HighlightPagination()
+        page = paginator.paginate_queryset(
+            MatchHighlight.objects.filter(match=match).select_related("added_by__user"), request, view=self
+        )
+        return paginator.get_paginated_response(HighlightSerializer(page, many=True).data)
+
+    def _manages_money(self, match):
+        return self.request.user.is_staff or (match.created_by_id and match.created_by_id == self.request.user.profile.pk)
+
+    @action(detail=True, methods=["get"])
+    def payments(self, request, pk=None):
+        """Organizer/staff: fees charged, paid and still outstanding for this match."""
+        match = self.get_object()
+        if not self._manages_money(match):
+            return Response({"detail": "Only the organizer can see the payments."}, status=status.HTTP_403_FORBIDDEN)
+        summary = ledger.match_summary(match)
+        summary["unpaid"] = [{"player": player, "owed": owed} for player, owed in summary["unpaid"].items()]
+        return Response(MatchPaymentsSerializer(summary).data)
+
+    @action(detail=True, methods=["post"], url_path="mark-paid")
+    def mark_paid(self, request, pk=None):
+        """
+        Organizer/staff: record payment of the match fee for several players at once.
+        Body: {"participations": [ids], "note": ""}.
+        """
+        match = self.get_object()
+        if not self._manages_money(match):
+            return Response({"detail": "Only the organizer can record payments."}, status=status.HTTP_403_FORBIDDEN)
+        if not match.price_per_player:
+            return Response({"detail": "This match has no fee."}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = MarkPaidSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        entries = ledger.mark_paid(
+            match,
+            serializer.validated_data["participations"],
+            recorded_by=request.user.profile,
+            note=serializer.validated_data["note"],
+        )
+        return Response({"paid": len(entries), "entries": LedgerEntrySerializer(entries, many=True).data})
+
+
+class StandingViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
+    """
+    Season leaderboard.
+    Optional query params: date_from, date_to (YYYY-MM-DD, inclusive).
+    """
+    serializer_class = StandingSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = StandingsPagination
+
+    def _date_param(self, name):
+        value = self.request.query_params.get(name)
+        if not value:
+            return None
+        try:
+            day = parse_date(value)
+        except ValueError:
+            day = None
+        if day is None:
+            raise ValidationError({name: "Use the YYYY-MM-DD format."})
+        return day
+
+    def get_queryset(self):
+        return standings.leaderboard(self._date_param("date_from"), self._date_param("date_to"))
+
+
+class PlayerViewSet(mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    queryset = PlayerProfil.objects.select_related("user")
+    serializer_class = PlayerProfilSerializer
+    permission_classes = [IsAuthenticated]
+
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="import",
+        permission_classes=[IsAdminUser],
+        parser_classes=[JSONParser, MultiPartParser],
+    )
+    def import_players(self, request):
+        """
+        Create players in bulk (admins only). Send the JSON document of
+        PlayerImportSerializer, or upload a .csv/.json roster as `file`.
+        """
+        upload = request.FILES.get("file")
+        if upload is not None:
+            fmt = "csv" if upload.name.lower().endswith(".csv") else "json"
+            try:
+                rows = player_import.parse(upload.read().decode("utf-8-sig"), fmt)
+            except (UnicodeDecodeError, ValueError) as exc:
+                return Response({"detail": f"Unreadable {fmt} file: {exc}"}, status=status.HTTP_400_BAD_REQUEST)
+            data = {"players": rows}
+        else:
+            data = request.data
+
+        serializer = PlayerImportSerializer(data=data)
+        serializer.is_valid(raise_exception=True)
+        profiles = serializer.save()
+        return Response({"created": len(profiles)}, status=status.HTTP_201_CREATED)
+
+    # at most this many players per compare request
+    COMPARE_LIMIT = 10
+
+    @action(detail=True, methods=["get"])
+    def stats(self, request, pk=None):
+        """Career totals and rates over finalized matches, read from the PlayerStats rollup."""
+        stats = PlayerStats.objects.select_related("player__user").filter(player_id=pk).first()
+        if stats is None:
+            stats = PlayerStats(player=self.get_object())  # hasn't played a finalized match yet
+        return Response(PlayerStatsSerializer(stats).data)
+
+    @action(detail=False, methods=["get"])
+    def compare(self, request):
+        """Side-by-side career stats: ?ids=3,7,12 (in that order)."""
+        try:
+            ids = list(dict.fromkeys(int(x) for x in request.query_params.get("ids", "").split(",") if x.strip()))
+        except ValueError:
+            raise ValidationError({"ids": "Comma-separated player ids."})
+        if not 1 <= len(ids) <= self.COMPARE_LIMIT:
+            raise ValidationError({"ids": f"Give between 1 and {self.COMPARE_LIMIT} player ids."})
+        return Response(PlayerStatsSerializer(player_stats.compare(ids), many=True).data)
+
+    @action(detail=True, methods=["get"])
+    def balance(self, request, pk=None):
+        """What the player owes (negative: in credit). Own balance, or any for staff."""
+        player = self.get_object()
+        if player.user_id != request.user.pk and not request.user.is_staff:
+            return Response({"detail": "You can only see your own balance."}, status=status.HTTP_403_FORBIDDEN)
+        return Response(BalanceSerializer({"player": player.pk, "balance": ledger.balance(player)}).data)
+
+    @action(detail=False, methods=["get"], permission_classes=[IsAdminUser], pagination_class=DebtorsPagination)
+    def debtors(self, request):
+        """Staff: players who owe money, biggest debt first."""
+        page = self.paginate_queryset(ledger.debtors())
+        return self.get_paginated_response(PlayerBalanceSerializer(page, many=True).data)
+
+
+class LedgerViewSet(mixins.ListModelMixin, mixins.CreateModelMixin, viewsets.GenericViewSet):
+    """
+    Staff: the append-only money ledger, newest first.
+    Optional query params: player, match. POST records a payment, refund or adjustment.
+    """
+    serializer_class = LedgerEntrySerializer
+    permission_classes = [IsAdminUser]
+    pagination_class = LedgerPagination
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ["player", "match", "kind"]
+    queryset = LedgerEntry.objects.all()
+
+    def perform_create(self, serializer):
+        serializer.save(recorded_by=self.request.user.profile)
+
+
+class SearchViewSet(viewsets.ViewSet):
+    """
+    Ranked full-text search: ?q=words (each matched as a prefix), optional
+    type=matches|comments and limit (default 20, max 50).
+    """
+    permission_classes = [IsAuthenticated]
+    MAX_LIMIT = 50
+    KINDS = {
+        "matches": (Match.objects.all(), MatchHitSerializer),
+        "comments": (MatchComment.objects.select_related("match", "author__user"), CommentHitSerializer),
+    }
+
+    def list(self, request):
+        words = search.terms(request.query_params.get("q"))
+        if not words:
+            raise ValidationError({"q": "Enter at least one word to search for."})
+        kind = request.query_params.get("type")
+        if kind and kind not in self.KINDS:
+            raise ValidationError({"type": f"One of: {', '.join(self.KINDS)}."})
+        try:
+            limit = int(request.query_params.get("limit", search.LIMIT))
+        except ValueError:
+            limit = 0
+        if not 1 <= limit <= self.MAX_LIMIT:
+            raise ValidationError({"limit": f"Between 1 and {self.MAX_LIMIT}."})
+
+        data = {"query": " ".join(words), "ranked": search.available()}
+        for name, (queryset, serializer) in self.KINDS.items():
+            if kind in (None, name):
+                data[name] = serializer(search.search(name, words, queryset, limit), many=True).data
+        return Response(data)
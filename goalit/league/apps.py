@@ -5,4 +5,4 @@ class LeagueConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'league'
     def ready(self):
-        from . import signals
+        from . import finalization, highlights, signals, sqlite  # finalization and highlights register jobs
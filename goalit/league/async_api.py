@@ -0,0 +1,187 @@
+"""
+Async versions of the signup hot paths of the match API: participants,
+join and leave; and of the comment thread's long poll.
+
+goalit/asgi.py routes /api/matches/<pk>/{participants,join,leave,comments}/ here
+(goalit/asgi_urls.py), so under an ASGI server a request waiting on the
+database doesn't hold a worker thread. The responses, status codes and
+ETags are the same as MatchViewSet's.
+
+Reads use the async ORM. The join/leave write stays one transaction of
+league.admission (same capacity and waitlist rules, select_for_update and
+all), run through sync_to_async because Django doesn't run transactions
+on the async ORM yet. Authentication is MatchViewSet's: its DRF
+authenticators (session, with DRF's CSRF check for unsafe methods, and
+HTTP Basic) run on the request, and like DRF views these are exempt from
+Django's CSRF middleware, so Basic-auth clients work the same under ASGI.
+"""
+import json
+import time
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+
+from rest_framework.exceptions import AuthenticationFailed, NotAuthenticated, PermissionDenied, ValidationError
+from rest_framework.request import Request
+
+from . import admission, events
+from .api_views import (
+    MatchViewSet, comment_poll_params, comments_after, comments_since_data, not_modified, set_validators,
+)
+from .models import Match, MatchComment, MatchParticipation, PlayerProfil
+from .pagination import CommentPagination
+from .serializers import MatchParticipationSerializer
+
+NOT_FOUND = {"detail": "No Match matches the given query."}
+
+
+def _error(detail, status):
+    return JsonResponse(detail if isinstance(detail, dict) else {"detail": detail}, status=status)
+
+
+def _authenticate(request):
+    """
+    Run MatchViewSet's authenticators on the request: (profile, None), or
+    (None, error response) with DRF's status code for the failure.
+    """
+    drf_request = Request(request, authenticators=[auth() for auth in MatchViewSet.authentication_classes])
+    try:
+        user = drf_request.user
+        if not user.is_authenticated:
+            raise NotAuthenticated()
+    except (AuthenticationFailed, NotAuthenticated, PermissionDenied) as exc:
+        response = _error(str(exc.detail), exc.status_code)
+        if isinstance(exc, (AuthenticationFailed, NotAuthenticated)):
+            # as APIView.handle_exception: 401 if the first authenticator can challenge, else 403
+            header = drf_request.authenticators[0].authenticate_header(drf_request)
+            response.status_code = 401 if header else 403
+            if header:
+                response["WWW-Authenticate"] = header
+        return None, response
+    return PlayerProfil.objects.select_related("user").get(user=user), None
+
+
+def _body(request):
+    """The request data, JSON or form encoded, as a dict; ValueError on malformed JSON."""
+    if request.content_type == "application/json":
+        data = json.loads(request.body or b"{}")
+        if not isinstance(data, dict):
+            raise ValueError("Expected a JSON object.")
+        return data
+    return request.POST
+
+
+async def _participation_data(part):
+    part = await MatchParticipation.objects.select_related("player__user", "team").aget(pk=part.pk)
+    return MatchParticipationSerializer(part).data
+
+
+@csrf_exempt
+@require_GET
+async def participants(request, pk):
+    _, denied = await sync_to_async(_authenticate)(request)
+    if denied:
+        return denied
+    stamp = await Match.objects.filter(pk=pk).values_list("version", "updated_at").afirst()
+    if stamp is None:
+        return _error(NOT_FOUND, 404)
+    version, updated_at = stamp
+    etag = f'"participants-{pk}-v{version}-json"'
+
+    response = not_modified(request, etag, updated_at)
+    if response is None:
+        parts = MatchParticipation.objects.filter(match_id=pk).select_related("player__user", "team")
+        data = MatchParticipationSerializer([p async for p in parts], many=True).data
+        response = JsonResponse(data, safe=False)
+    return set_validators(request, response, etag, updated_at)
+
+
+@csrf_exempt
+@require_POST
+async def join(request, pk):
+    """Same contract as MatchViewSet.join."""
+    profile, denied = await sync_to_async(_authenticate)(request)
+    if denied:
+        return denied
+    match = await Match.objects.filter(pk=pk).afirst()
+    if match is None:
+        return _error(NOT_FOUND, 404)
+    if match.final_score:
+        return _error("Match is finalized.", 400)
+    try:
+        desired_status = _body(request).get("status", "going")
+    except ValueError as exc:
+        return _error(f"JSON parse error - {exc}", 400)
+    if desired_status not in admission.SELF_SERVICE_STATUSES:
+        return _error("Invalid status.", 400)
+
+    part, _ = await sync_to_async(admission.set_status)(match, profile, desired_status)
+    data = dict(await _participation_data(part), waitlist_position=await admission.awaitlist_position(part))
+    return JsonResponse(data)
+
+
+@csrf_exempt
+@require_POST
+async def leave(request, pk):
+    """Same contract as MatchViewSet.leave."""
+    profile, denied = await sync_to_async(_authenticate)(request)
+    if denied:
+        return denied
+    match = await Match.objects.filter(pk=pk).afirst()
+    if match is None:
+        return _error(NOT_FOUND, 404)
+    if match.final_score:
+        return _error("Match is finalized.", 400)
+    part, _ = await sync_to_async(admission.leave)(match, profile)
+    if part is None:
+        return _error("You were not registered for this match.", 400)
+    return HttpResponse(status=204)
+
+
+_viewset_comments = MatchViewSet.as_view({"get": "comments", "post": "comments"}, detail=True)
+
+
+def _sync_comments(request, pk):
+    response = _viewset_comments(request, pk=pk)
+    return response.render()
+
+
+@csrf_exempt
+async def comments(request, pk):
+    """
+    GET ?since=&wait= waits for new comments on the event broker (league.signals
+    publishes each one once committed) instead of holding a thread; the
+    response is MatchViewSet.comments'. Pages, posts and polls that don't
+    wait are MatchViewSet.comments itself.
+    """
+    if request.method != "GET" or "since" not in request.GET or "wait" not in request.GET:
+        return await sync_to_async(_sync_comments)(request, pk)
+    _, denied = await sync_to_async(_authenticate)(request)
+    if denied:
+        return denied
+    try:
+        since, wait = comment_poll_params(request.GET)
+    except ValidationError as exc:
+        return JsonResponse(exc.detail, status=400)
+    if not await Match.objects.filter(pk=pk).aexists():
+        return _error(NOT_FOUND, 404)
+
+    thread = MatchComment.objects.filter(match_id=pk).select_related("author__user")
+    last = await thread.filter(pk=since).values("created_at", "id").afirst()
+    new = comments_after(thread, since, last)
+    # subscribe before the first read, so a comment committed in between still wakes us
+    subscription = events.get_broker().subscribe(events.comments_channel(pk))
+    try:
+        deadline = time.monotonic() + wait
+        while True:
+            comments = [c async for c in new[:CommentPagination.max_page_size]]
+            remaining = deadline - time.monotonic()
+            if comments or remaining <= 0:
+                break
+            await subscription.get(timeout=remaining)
+    finally:
+        subscription.close()
+    return JsonResponse(comments_since_data(comments, since))
+
@@ -0,0 +1,194 @@
+import calendar
+import datetime
+import operator
+from functools import reduce
+
+from django.db import transaction
+from django.db.models import Max, OuterRef, Q, Subquery
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+from .models import Badge, BadgeRun, BadgeType, Job, Match, MatchParticipation, Standing
+
+BADGE_TYPES = {
+    "top_scorer": ("Top Scorer", "Most goals in a month."),
+    "most_assists": ("Playmaker", "Most assists in a month."),
+    "perfect_attendance": ("Perfect Attendance", "Played at least 3 matches in a month without a single no-show."),
+    "serial_no_show": ("Serial No-Show", "Skipped 3 or more confirmed matches in a month."),
+    "hat_trick": ("Hat-Trick", "Scored 3 or more goals in a match."),
+}
+
+PERFECT_ATTENDANCE_MIN_MATCHES = 3
+SERIAL_NO_SHOW_MIN = 3
+
+# re-read this much before the previous watermark, so a finalize that committed
+# late is still picked up; match badges are unique, so the overlap is harmless
+WATERMARK_OVERLAP = datetime.timedelta(minutes=5)
+
+
+# --- Period rules: Standing queryset over a set of months -> (player_id, period) pairs
+
+def _leaders(field, periods):
+    best = (
+        Standing.objects.filter(period=OuterRef("period"))
+        .order_by()
+        .values("period")
+        .annotate(best=Max(field))
+        .values("best")
+    )
+    return Standing.objects.filter(period__in=periods, **{f"{field}__gt": 0}).filter(**{field: Subquery(best)})
+
+
+def top_scorer(periods):
+    return _leaders("goals", periods)
+
+
+def most_assists(periods):
+    return _leaders("assists", periods)
+
+
+def perfect_attendance(periods):
+    return Standing.objects.filter(
+        period__in=periods, matches_played__gte=PERFECT_ATTENDANCE_MIN_MATCHES, no_shows=0
+    )
+
+
+def serial_no_show(periods):
+    return Standing.objects.filter(period__in=periods, no_shows__gte=SERIAL_NO_SHOW_MIN)
+
+
+PERIOD_RULES = {
+    "top_scorer": top_scorer,
+    "most_assists": most_assists,
+    "perfect_attendance": perfect_attendance,
+    "serial_no_show": serial_no_show,
+}
+
+
+# --- Match rules: finalized matches -> participations that earn the badge
+
+def hat_trick(matches):
+    return MatchParticipation.objects.filter(match__in=matches, actually_played=True, goals__gte=3)
+
+
+MATCH_RULES = {
+    "hat_trick": hat_trick,
+}
+
+
+def month_end(period):
+    return period.replace(day=calendar.monthrange(period.year, period.month)[1])
+
+
+def ensure_badge_types():
+    BadgeType.objects.bulk_create(
+        [BadgeType(code=code, name=name, description=desc) for code, (name, desc) in BADGE_TYPES.items()],
+        ignore_conflicts=True,
+    )
+    return dict(BadgeType.objects.filter(code__in=BADGE_TYPES).values_list("code", "pk"))
+
+
+def closed_periods(periods, today):
+    """Only finished months get period badges, so a winner can't change under an award."""
+    return sorted(p for p in periods if month_end(p) < today)
+
+
+def award_period_badges(type_ids, periods):
+    """
+    Make the period badges of `periods` match the rules exactly.
+    Returns (awarded, revoked).
+    """
+    awarded = revoked = 0
+    for code, rule in PERIOD_RULES.items():
+        type_id = type_ids[code]
+        winners = set(rule(periods).values_list("player_id", "period"))
+        existing_qs = Badge.objects.filter(badge_type_id=type_id, match__isnull=True, period_start__in=periods)
+        existing = set(existing_qs.values_list("player_id", "period_start"))
+
+        stale = existing - winners
+        if stale:
+            revoked += existing_qs.filter(
+                reduce(operator.or_, (Q(player_id=player_id, period_start=period) for player_id, period in stale))
+            ).delete()[0]
+        new = [
+            Badge(player_id=player_id, badge_type_id=type_id, period_start=period, period_end=month_end(period))
+            for player_id, period in winners - existing
+        ]
+        # bulk_create returns every object passed in, inserted or not: count the new ones
+        Badge.objects.bulk_create(new, ignore_conflicts=True)
+        awarded += len(new)
+    return awarded, revoked
+
+
+def award_match_badges(type_ids, matches):
+    """Award the match badges `matches` earn and don't have yet. Returns how many were awarded."""
+    awarded = 0
+    for code, rule in MATCH_RULES.items():
+        type_id = type_ids[code]
+        # the watermark overlap re-reads matches: skip the awards they already got
+        existing = set(
+            Badge.objects.filter(badge_type_id=type_id, match__in=matches).values_list("player_id", "match_id")
+        )
+        new = [
+            Badge(player_id=player_id, badge_type_id=type_id, match_id=match_id, period_start=day, period_end=day)
+            for player_id, match_id, day in rule(matches).values_list("player_id", "match_id", "match__date")
+            if (player_id, match_id) not in existing
+        ]
+        Badge.objects.bulk_create(new, ignore_conflicts=True)
+        awarded += len(new)
+    return awarded
+
+
+def rolled_up_matches(since, until):
+    """
+    Matches whose standings the match_rollups job applied in (since, until].
+    The job runs after the finalize commits, so a run can see a match before
+    its standings: their months are evaluated again once the job is done.
+    """
+    payloads = Job.objects.filter(
+        kind="match_rollups", status="done", finished_at__gt=since, finished_at__lte=until
+    ).values_list("payload", flat=True)
+    return Match.objects.filter(pk__in=[payload["match_id"] for payload in payloads])
+
+
+@transaction.atomic
+def run(full=False, now=None):
+    """
+    Award badges for matches finalized since the previous run.
+
+    Match badges are evaluated for the new matches only. Period badges are
+    (re)evaluated for months touched by those matches, for months of matches
+    whose standings were rolled up since the previous run, and for months
+    that closed since the previous run. Reruns never duplicate awards.
+    """
+    now = now or timezone.now()
+    today = timezone.localdate(now)
+    last = None if full else BadgeRun.objects.order_by("-watermark").first()
+
+    if last is None:
+        # first (or full) run: also pick up matches finalized before finalized_at was tracked
+        matches = Match.objects.filter(Q(finalized_at__lte=now) | Q(finalized_at__isnull=True), final_score=True)
+        periods = set(Standing.objects.values_list("period", flat=True).distinct())
+    else:
+        matches = Match.objects.filter(
+            final_score=True, finalized_at__gt=last.watermark - WATERMARK_OVERLAP, finalized_at__lte=now
+        )
+        # standings are applied by the match_rollups job, possibly after the previous run saw the match
+        rolled_up = rolled_up_matches(last.watermark - WATERMARK_OVERLAP, now)
+        periods = set(rolled_up.annotate(period=TruncMonth("date")).values_list("period", flat=True).distinct())
+        # months that ended since the last run still need their period badges
+        month = timezone.localdate(last.watermark).replace(day=1)
+        while month_end(month) < today:
+            periods.add(month)
+            month = month_end(month) + datetime.timedelta(days=1)
+    periods |= set(matches.annotate(period=TruncMonth("date")).values_list("period", flat=True).distinct())
+
+    type_ids = ensure_badge_types()
+    awarded = award_match_badges(type_ids, matches)
+    period_awarded, revoked = award_period_badges(type_ids, closed_periods(periods, today))
+
+    return BadgeRun.objects.create(
+        watermark=now,
+        matches_processed=matches.count(),
+        badges_awarded=awarded + period_awarded,
+        badges_revoked=revoked,
+    )
@@ -0,0 +1,125 @@
+import random
+from dataclasses import dataclass, field
+
+from django.db.models import Sum
+from .models import Standing
+
+GOALKEEPER = "GK"
+DEFAULT_RATING = 100  # what a player earns for just showing up
+MAX_SWAP_ROUNDS = 500
+
+
+@dataclass
+class Candidate:
+    key: object  # whatever the caller uses to identify the player (e.g. a MatchParticipation)
+    rating: float
+    position: str = "ANY"
+
+
+@dataclass
+class Side:
+    capacity: int
+    members: list = field(default_factory=list)
+    total: float = 0
+
+    @property
+    def goalkeepers(self):
+        return sum(1 for c in self.members if c.position == GOALKEEPER)
+
+    def add(self, candidate):
+        self.members.append(candidate)
+        self.total += candidate.rating
+
+
+def player_ratings(player_ids):
+    """Average historical points per played match, from the Standing table (one query)."""
+    rows = (
+        Standing.objects.filter(player_id__in=player_ids)
+        .values("player")
+        .annotate(points=Sum("points"), played=Sum("matches_played"))
+        .order_by()
+    )
+    return {row["player"]: row["points"] / row["played"] for row in rows if row["played"]}
+
+
+def _capacities(n_players, n_teams):
+    size, extra = divmod(n_players, n_teams)
+    return [size + (1 if i < extra else 0) for i in range(n_teams)]
+
+
+def _best_swap(high, low):
+    """Swap between the strongest and weakest side that shrinks their gap the most."""
+    gap = high.total - low.total
+    best, best_gap = None, gap
+    for i, a in enumerate(high.members):
+        for j, b in enumerate(low.members):
+            if (a.position == GOALKEEPER) != (b.position == GOALKEEPER):
+                continue  # keep goalkeepers spread
+            delta = a.rating - b.rating
+            if 0 < delta < gap:
+                new_gap = abs(gap - 2 * delta)
+                if new_gap < best_gap:
+                    best, best_gap = (i, j), new_gap
+    return best
+
+
+def partition(candidates, n_teams, seed=None):
+    """
+    Split candidates into n_teams sides of equal size (±1) with close rating totals.
+
+    Goalkeepers are dealt round-robin first, everybody else goes greedily
+    (strongest first) to the weakest side with room, then pairwise swaps
+    between the strongest and weakest side narrow the gap. Ties are broken
+    randomly so repeated calls don't always return the same split.
+    """
+    rng = random.Random(seed)
+    pool = list(candidates)
+    rng.shuffle(pool)
+    pool.sort(key=lambda c: c.rating, reverse=True)  # stable: equal ratings stay shuffled
+
+    sides = [Side(capacity) for capacity in _capacities(len(pool), n_teams)]
+    keepers = [c for c in pool if c.position == GOALKEEPER]
+    outfield = [c for c in pool if c.position != GOALKEEPER]
+
+    for c in keepers:
+        open_sides = [s for s in sides if len(s.members) < s.capacity]
+        min(open_sides, key=lambda s: (s.goalkeepers, s.total)).add(c)
+    for c in outfield:
+        open_sides = [s for s in sides if len(s.members) < s.capacity]
+        min(open_sides, key=lambda s: (s.total, len(s.members))).add(c)
+
+    for _ in range(MAX_SWAP_ROUNDS):
+        high = max(sides, key=lambda s: s.total)
+        low = min(sides, key=lambda s: s.total)
+        swap = _best_swap(high, low)
+        if swap is None:
+            break
+        i, j = swap
+        a, b = high.members[i], low.members[j]
+        high.members[i], low.members[j] = b, a
+        high.total += b.rating - a.rating
+        low.total += a.rating - b.rating
+
+    return [side.members for side in sides]
+
+
+def balance_match(match, seed=None):
+    """
+    Proposed split of the match's confirmed players over all of its teams.
+    Returns a list of (team, [participations]) without writing anything.
+    """
+    teams = sorted(match.teams.all(), key=lambda t: t.pk)  # reuses a teams prefetch
+    participations = list(match.participations.filter(status="going").select_related("player__user"))
+    ratings = player_ratings([p.player_id for p in participations])
+    default = sum(ratings.values()) / len(ratings) if ratings else DEFAULT_RATING
+
+    candidates = [
+        Candidate(p, ratings.get(p.player_id, default), p.player.preferred_position) for p in participations
+    ]
+    sides = partition(candidates, len(teams), seed=seed)
+    split = []
+    for team, members in zip(teams, sides):
+        for c in members:
+            c.key.rating = c.rating
+        split.append((team, [c.key for c in members]))
+    return split
@@ -0,0 +1,218 @@
+"""
+Request-level benchmarks of the league pages and the match API.
+
+Every endpoint has a query budget: the number of SQL queries it may issue
+no matter how large the league is. Going over it almost always means an
+N+1 crept in, so run() reports it as a failure next to the latencies.
+Write requests run inside a rolled-back transaction, so the data the suite
+is pointed at is left as it was.
+"""
+import json
+import statistics
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+
+from .models import Match, MatchParticipation, PlayerProfil
+
+# the suite gets a private cache so its renders (some inside rolled-back
+# transactions) never land in the cache the site is using
+BENCHMARK_SETTINGS = {
+    "ALLOWED_HOSTS": ["testserver"],
+    "CACHES": {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "benchmark"}},
+    "LEAGUE_CACHE": "default",
+}
+
+
+@dataclass
+class Endpoint:
+    name: str
+    method: str
+    path: str  # formatted with the Fixtures fields
+    budget: int  # max SQL queries per request
+    user: str = "organizer"  # Fixtures attribute of the profile making the request
+    data: Optional[Callable] = None  # fixtures -> request body
+    content_type: str = "application/json"
+    expect: tuple = (200,)
+    revalidate: bool = False  # send back the ETag of a first, unmeasured GET
+
+
+@dataclass
+class Fixtures:
+    """The rows the endpoints are exercised on, picked from existing data."""
+    open: Match
+    final: Match
+    organizer: PlayerProfil
+    player: PlayerProfil  # going in `open`
+    outsider: PlayerProfil  # not in `open`
+    staff: PlayerProfil
+    teams: list = field(default_factory=list)
+    participations: list = field(default_factory=list)
+
+
+def pick_fixtures():
+    """The busiest open match that has teams, an organizer and a fee, plus a finalized one."""
+    open_match = (
+        Match.objects.filter(
+            final_score=False, created_by__isnull=False, teams__isnull=False, price_per_player__isnull=False
+        )
+        .select_related("created_by__user")
+        .order_by("-going_count", "id")
+        .first()
+    )
+    final_match = Match.objects.filter(final_score=True, price_per_player__isnull=False).order_by("-date", "id").first()
+    if open_match is None or final_match is None:
+        return None
+    parts = list(open_match.participations.filter(status="going").exclude(player=open_match.created_by))
+    outsider = PlayerProfil.objects.exclude(participations__match=open_match).order_by("id").first()
+    staff = PlayerProfil.objects.filter(user__is_staff=True).order_by("id").first()
+    if not parts or outsider is None or staff is None:
+        return None
+    return Fixtures(
+        open=open_match,
+        final=final_match,
+        organizer=open_match.created_by,
+        player=parts[0].player,
+        outsider=outsider,
+        staff=staff,
+        teams=list(open_match.teams.order_by("id")),
+        participations=list(open_match.participations.filter(status="going").order_by("id")),
+    )
+
+
+def _finalize_form(f):
+    data = {f"score_{team.pk}": str(n) for n, team in enumerate(f.teams)}
+    data.update({f"played_{p.pk}": "on" for p in f.participations})
+    return data
+
+
+def _finalize_json(f):
+    return {
+        "teams": [{"id": team.pk, "score": n} for n, team in enumerate(f.teams)],
+        "players": [
+            {"id": p.pk, "played": True, "goals": n % 3, "assists": n % 2, "is_mvp": n == 0, "has_paid": True}
+            for n, p in enumerate(f.participations)
+        ],
+    }
+
+
+def _lineup_json(f):
+    return {"players": [
+        {"id": p.pk, "team": f.teams[n % len(f.teams)].pk} for n, p in enumerate(f.participations)
+    ]}
+
+
+def _mark_paid_json(f):
+    return {"participations": [p.pk for p in f.participations]}
+
+
+def _match_json(f):
+    return {"title": "Benchmark", "date": str(timezone.localdate()), "time": "19:00", "location": "Arena"}
+
+
+FORM = "application/x-www-form-urlencoded"
+
+ENDPOINTS = [
+    Endpoint("match_list", "get", "/", 5),
+    Endpoint("match_detail", "get", "/{open.pk}/", 9),
+    Endpoint("finalize_match_form", "get", "/{open.pk}/finalize/", 8),
+    Endpoint("finalize_match", "post", "/{open.pk}/finalize/", 12, data=_finalize_form, content_type=FORM, expect=(302,)),
+    Endpoint("api_list", "get", "/api/matches/", 5),
+    Endpoint("api_list_not_modified", "get", "/api/matches/", 3, revalidate=True, expect=(304,)),
+    Endpoint("api_retrieve", "get", "/api/matches/{open.pk}/", 5),
+    Endpoint("api_participants", "get", "/api/matches/{open.pk}/participants/", 4),
+    Endpoint("api_create", "post", "/api/matches/", 7, data=_match_json, expect=(201,)),
+    Endpoint("api_update", "put", "/api/matches/{open.pk}/", 8, data=_match_json),
+    Endpoint("api_partial_update", "patch", "/api/matches/{open.pk}/", 8, data=lambda f: {"notes": "bench"}),
+    Endpoint("api_destroy", "delete", "/api/matches/{final.pk}/", 16, expect=(204,)),
+    Endpoint("api_join", "post", "/api/matches/{open.pk}/join/", 13, user="outsider", data=lambda f: {"status": "going"}),
+    Endpoint("api_leave", "post", "/api/matches/{open.pk}/leave/", 17, user="player", expect=(204,)),
+    Endpoint("api_lineup", "put", "/api/matches/{open.pk}/lineup/", 11, data=_lineup_json),
+    Endpoint("api_randomize_teams", "post", "/api/matches/{open.pk}/randomize-teams/", 9),
+    Endpoint("api_finalize", "post", "/api/matches/{open.pk}/finalize/", 13, data=_finalize_json),
+    Endpoint("api_comments", "get", "/api/matches/{open.pk}/comments/", 4, user="player"),
+    Endpoint("api_comments_since", "get", "/api/matches/{open.pk}/comments/?since=0", 5, user="player"),
+    Endpoint("api_post_comment", "post", "/api/matches/{open.pk}/comments/", 6, user="player",
+             data=lambda f: {"text": "Count me in"}, expect=(201,)),
+    Endpoint("api_highlights", "get", "/api/matches/{final.pk}/highlights/", 4, user="player"),
+    Endpoint("api_payments", "get", "/api/matches/{final.pk}/payments/", 6, user="staff"),
+    Endpoint("api_mark_paid", "post", "/api/matches/{open.pk}/mark-paid/", 16, data=_mark_paid_json),
+    Endpoint("api_player_stats", "get", "/api/players/{player.pk}/stats/", 3, user="player"),
+    Endpoint("api_player_compare", "get", "/api/players/compare/?ids={player.pk},{organizer.pk},{outsider.pk}", 4,
+             user="player"),
+    Endpoint("api_search", "get", "/api/search/?q=riv", 6, user="player"),
+    Endpoint("api_player_balance", "get", "/api/players/{player.pk}/balance/", 4, user="player"),
+    Endpoint("api_debtors", "get", "/api/players/debtors/", 3, user="staff"),
+]
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    rank = max(1, round(pct / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def _request(client, endpoint, fixtures):
+    path = endpoint.path.format(**vars(fixtures))
+    kwargs = {}
+    if endpoint.data is not None:
+        body = endpoint.data(fixtures)
+        kwargs["data"] = json.dumps(body) if endpoint.content_type == "application/json" else body
+        kwargs["content_type"] = endpoint.content_type
+    elif endpoint.method != "get":
+        kwargs["content_type"] = endpoint.content_type
+    if endpoint.revalidate:
+        kwargs["headers"] = {"If-None-Match": client.get(path)["ETag"]}
+    with transaction.atomic():
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = getattr(client, endpoint.method)(path, **kwargs)
+            elapsed = (time.perf_counter() - start) * 1000
+        transaction.set_rollback(True)
+    return response.status_code, len(queries), elapsed
+
+
+def run(endpoints=ENDPOINTS, repeat=20, fixtures=None):
+    """
+    Time each endpoint `repeat` times. Returns one result dict per endpoint:
+    name, method, path, status, queries (max seen), budget, over_budget,
+    p50_ms, p95_ms, runs.
+    """
+    fixtures = fixtures or pick_fixtures()
+    if fixtures is None:
+        raise ValueError("No suitable data: run seed_league first (and have a staff user).")
+
+    results = []
+    with override_settings(**BENCHMARK_SETTINGS):
+        clients = {}
+        for endpoint in endpoints:
+            if endpoint.user not in clients:
+                clients[endpoint.user] = Client()
+                clients[endpoint.user].force_login(getattr(fixtures, endpoint.user).user)
+            client = clients[endpoint.user]
+            statuses, counts, timings = set(), [], []
+            for _ in range(repeat):
+                status, queries, elapsed = _request(client, endpoint, fixtures)
+                statuses.add(status)
+                counts.append(queries)
+                timings.append(elapsed)
+            results.append({
+                "name": endpoint.name,
+                "method": endpoint.method.upper(),
+                "path": endpoint.path.format(**vars(fixtures)),
+                "status": sorted(statuses),
+                "unexpected_status": not statuses <= set(endpoint.expect),
+                "queries": max(counts),
+                "budget": endpoint.budget,
+                "over_budget": max(counts) > endpoint.budget,
+                "p50_ms": round(statistics.median(timings), 3),
+                "p95_ms": round(percentile(timings, 95), 3),
+                "runs": repeat,
+            })
+    return results
@@ -0,0 +1,126 @@
+"""
+Rendered-fragment cache for the match list and match detail pages.
+
+Keys embed Match.version, which the post_save/post_delete receivers in
+league.signals (and MatchQuerySet.touch() for bulk writes) bump on every
+change to a match, its teams or its participations, so a write simply
+makes the old fragments unreachable; they age out after
+LEAGUE_FRAGMENT_TIMEOUT. Only match-wide markup is cached, per-user bits
+(the viewer's status, organizer actions, CSRF token) stay in the page
+templates.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Prefetch, prefetch_related_objects
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+from .models import MatchParticipation
+
+FRAGMENT_TIMEOUT = getattr(settings, "LEAGUE_FRAGMENT_TIMEOUT", 60 * 60)
+# confirmed players named on a list card; the rest is summed up from going_count
+CARD_PLAYERS = 6
+STATS_KEYS = {"hits": "league:stats:hits", "misses": "league:stats:misses"}
+
+
+def get_cache():
+    return caches[getattr(settings, "LEAGUE_CACHE", "default")]
+
+
+def fragment_key(kind, match_id, version):
+    return f"league:{kind}:{match_id}:v{version}"
+
+
+def _count(hits, misses):
+    cache = get_cache()
+    for name, amount in (("hits", hits), ("misses", misses)):
+        if not amount:
+            continue
+        key = STATS_KEYS[name]
+        cache.add(key, 0, timeout=None)
+        try:
+            cache.incr(key, amount)
+        except ValueError:  # evicted between add and incr
+            cache.set(key, amount, timeout=None)
+
+
+def stats():
+    values = get_cache().get_many(STATS_KEYS.values())
+    hits = values.get(STATS_KEYS["hits"], 0)
+    misses = values.get(STATS_KEYS["misses"], 0)
+    lookups = hits + misses
+    return {"hits": hits, "misses": misses, "hit_rate": hits / lookups if lookups else None}
+
+
+def reset_stats():
+    get_cache().delete_many(STATS_KEYS.values())
+
+
+def card_players():
+    """
+    The first CARD_PLAYERS going players of each match, in join order, as
+    `match.card_players`. The slice is applied per match in SQL.
+    """
+    going = (
+        MatchParticipation.objects.filter(status="going")
+        .select_related("player__user")
+        .order_by("id")
+    )
+    return Prefetch("participations", queryset=going[:CARD_PLAYERS], to_attr="card_players")
+
+
+def match_cards(matches):
+    """
+    Rendered list-page cards for `matches`, in order. Participants are only
+    loaded for the matches whose card isn't cached yet, and then only the
+    few the card shows.
+    """
+    cache = get_cache()
+    keys = {m.pk: fragment_key("card", m.pk, m.version) for m in matches}
+    found = cache.get_many(keys.values())
+    missing = [m for m in matches if keys[m.pk] not in found]
+    if missing:
+        prefetch_related_objects(missing, card_players())
+        rendered = {
+            keys[m.pk]: render_to_string(
+                "league/fragments/match_card.html",
+                {"m": m, "more_players": max(m.going_count - CARD_PLAYERS, 0)},
+            )
+            for m in missing
+        }
+        cache.set_many(rendered, FRAGMENT_TIMEOUT)
+        found.update(rendered)
+    _count(len(matches) - len(missing), len(missing))
+    return [mark_safe(found[keys[m.pk]]) for m in matches]
+
+
+def match_detail_fragments(match):
+    """
+    Cached summary/info markup of the detail page, plus the team count the
+    organizer controls need: {"summary", "info", "team_count"}.
+    """
+    cache = get_cache()
+    key = fragment_key("detail", match.pk, match.version)
+    fragments = cache.get(key)
+    if fragments is not None:
+        _count(1, 0)
+    else:
+        teams = list(match.teams.order_by("id"))
+        going = match.participations.filter(status="going").select_related("player__user")
+        context = {"match": match, "teams": teams, "going": going, "organizer": match.created_by}
+        fragments = {
+            "summary": render_to_string("league/fragments/match_summary.html", context),
+            "info": render_to_string("league/fragments/match_info.html", context),
+            "team_count": len(teams),
+        }
+        cache.set(key, fragments, FRAGMENT_TIMEOUT)
+        _count(0, 1)
+    return {
+        "summary": mark_safe(fragments["summary"]),
+        "info": mark_safe(fragments["info"]),
+        "team_count": fragments["team_count"],
+    }
+
+
+def forget_match(match_id, version):
+    """Drop a match's current fragments right away (e.g. when it is deleted)."""
+    get_cache().delete_many([fragment_key(kind, match_id, version) for kind in ("card", "detail")])
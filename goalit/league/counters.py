@@ -0,0 +1,53 @@
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from .models import Match, MatchParticipation
+
+# participation status -> Match counter column
+COUNTER_FIELDS = {
+    "going": "going_count",
+    "waiting": "waiting_count",
+}
+
+
+def adjust_counters(match_id, old_status=None, new_status=None):
+    """
+    Move one participation from old_status to new_status in the stored counters.
+    Use old_status=None for a new participation and new_status=None for a deleted one.
+    """
+    if old_status == new_status:
+        return
+    changes = {}
+    old_field = COUNTER_FIELDS.get(old_status)
+    new_field = COUNTER_FIELDS.get(new_status)
+    if old_field:
+        changes[old_field] = F(old_field) - 1
+    if new_field:
+        changes[new_field] = F(new_field) + 1
+    if changes:
+        Match.objects.filter(pk=match_id).update(**changes)
+
+
+def _status_count(status):
+    return Coalesce(
+        Subquery(
+            MatchParticipation.objects.filter(match=OuterRef("pk"), status=status)
+            .order_by()
+            .values("match")
+            .annotate(c=Count("pk"))
+            .values("c"),
+            output_field=IntegerField(),
+        ),
+        Value(0),
+    )
+
+
+def recount_matches(queryset=None):
+    """
+    Recompute the stored counters from MatchParticipation in a single UPDATE.
+    Returns the number of matches updated.
+    """
+    if queryset is None:
+        queryset = Match.objects.all()
+    return queryset.touch(**{
+        field: _status_count(status) for status, field in COUNTER_FIELDS.items()
+    })
@@ -0,0 +1,141 @@
+"""
+Roster change notifications for match pages.
+
+Writes publish small JSON deltas on transaction commit; the match_events
+view streams them to browsers as Server-Sent Events. The default broker
+fans out in-process, which is enough for a single ASGI worker; point
+settings.LEAGUE_EVENT_BROKER at another class with the same
+publish/has_subscribers/subscribe interface (e.g. backed by Redis pub/sub)
+to go multi-process.
+"""
+import asyncio
+import json
+import threading
+from collections import defaultdict
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+
+def match_channel(match_id):
+    return f"match:{match_id}"
+
+
+def comments_channel(match_id):
+    return f"match:{match_id}:comments"
+
+
+class Subscription:
+    def __init__(self, broker, channel, maxsize):
+        self.broker = broker
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=maxsize)
+
+    def offer(self, message):
+        # runs on the subscriber's loop; a client that stopped reading loses messages, not memory
+        if not self.queue.full():
+            self.queue.put_nowait(message)
+
+    async def get(self, timeout=None):
+        """Next message, or None if nothing arrived within `timeout` seconds."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InProcessBroker:
+    def __init__(self, maxsize=100):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def has_subscribers(self, channel):
+        return bool(self._subscribers.get(channel))
+
+    def subscribe(self, channel):
+        """Must be called from a running event loop."""
+        subscription = Subscription(self, channel, self.maxsize)
+        with self._lock:
+            self._subscribers[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.channel]
+
+    def publish(self, channel, message):
+        """Thread-safe: callable from sync views as well as from the event loop."""
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.offer, message)
+            except RuntimeError:
+                self.unsubscribe(subscription)  # its loop is gone
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    path = getattr(settings, "LEAGUE_EVENT_BROKER", "league.events.InProcessBroker")
+    return import_string(path)()
+
+
+def _publish_roster(match_id, changed_ids, left):
+    from .models import Match, MatchParticipation
+    from .serializers import MatchParticipationSerializer
+
+    broker = get_broker()
+    channel = match_channel(match_id)
+    if not broker.has_subscribers(channel):
+        return  # nobody watching, skip the queries
+    counts = Match.objects.filter(pk=match_id).values("going_count", "waiting_count").first()
+    if counts is None:
+        return
+    changed = MatchParticipation.objects.filter(pk__in=changed_ids).select_related("player__user", "team")
+    message = {
+        "type": "roster",
+        "match": match_id,
+        **counts,
+        "changes": MatchParticipationSerializer(changed, many=True).data,
+        "left": list(left),
+    }
+    broker.publish(channel, json.dumps(message, cls=DjangoJSONEncoder))
+
+
+def roster_changed(match_id, participations=(), left_ids=()):
+    """
+    Tell everyone watching the match that these participations changed
+    (or, for `left_ids`, were deleted). Sent once the current transaction commits.
+    """
+    changed_ids = [p.pk for p in participations]
+    left_ids = list(left_ids)
+    if changed_ids or left_ids:
+        transaction.on_commit(lambda: _publish_roster(match_id, changed_ids, left_ids))
+
+
+def match_finalized(match_id):
+    message = json.dumps({"type": "finalized", "match": match_id})
+    transaction.on_commit(lambda: get_broker().publish(match_channel(match_id), message))
+
+
+def comment_posted(match_id, comment_id):
+    """Wake the comment polls waiting on the match (league.async_api.comments) once the transaction commits."""
+    def publish():
+        broker = get_broker()
+        channel = comments_channel(match_id)
+        if broker.has_subscribers(channel):
+            broker.publish(channel, json.dumps({"type": "comment", "match": match_id, "id": comment_id}))
+    transaction.on_commit(publish)
+
@@ -0,0 +1,174 @@
+"""
+Flat CSV / JSON Lines dumps of the match history for accounting.
+
+Rows come from .values() projections read with QuerySet.iterator(), so
+no model instances are built and memory stays flat whatever the size of
+the history. Each export hands back a cursor (the time it started);
+passing it as `since` next time returns only the matches changed since,
+using Match.updated_at, which every write to a match, its teams or its
+participations bumps. touch() stamps updated_at inside its transaction,
+so a write stamped just before the cursor may commit after the export read
+its snapshot: `since` reaches SINCE_OVERLAP back to pick it up next time.
+Rows changed around a cursor therefore show up in both dumps, consumers
+should upsert by id.
+"""
+import csv
+import datetime
+import json
+from dataclasses import dataclass
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from . import standings
+from .models import Match, MatchParticipation
+
+CHUNK_SIZE = 2000
+FORMATS = {"csv": "text/csv", "jsonl": "application/x-ndjson"}
+
+# longer than any write transaction runs, like badges.WATERMARK_OVERLAP
+SINCE_OVERLAP = datetime.timedelta(minutes=5)
+
+
+@dataclass
+class Export:
+    queryset: object
+    columns: dict  # output column -> field path or expression
+    date_field: str
+    player_field: str
+    updated_field: str
+
+    def values(self):
+        fields = [name for name, path in self.columns.items() if name == path]
+        renamed = {
+            name: F(path) if isinstance(path, str) else path
+            for name, path in self.columns.items()
+            if name != path
+        }
+        return self.queryset.order_by("pk").values(*fields, **renamed)
+
+
+EXPORTS = {
+    "matches": Export(
+        queryset=Match.objects.all(),
+        columns={
+            "match_id": "id",
+            "title": "title",
+            "date": "date",
+            "time": "time",
+            "location": "location",
+            "price_per_player": "price_per_player",
+            "max_players": "max_players",
+            "going": "going_count",
+            "waiting": "waiting_count",
+            "organizer": "created_by__user__username",
+            "finalized": "final_score",
+            "finalized_at": "finalized_at",
+            "updated_at": "updated_at",
+        },
+        date_field="date",
+        player_field="participations__player",
+        updated_field="updated_at",
+    ),
+    "participations": Export(
+        queryset=MatchParticipation.objects.all(),
+        columns={
+            "participation_id": "id",
+            "match_id": "match_id",
+            "match_date": "match__date",
+            "match_title": "match__title",
+            "player_id": "player_id",
+            "username": "player__user__username",
+            "nickname": "player__nickname",
+            "team_name": "team__name",
+            "status": "status",
+            "played": "actually_played",
+            "no_show": "no_show",
+            "goals": "goals",
+            "assists": "assists",
+            "mvp": "is_mvp",
+            "points": standings.POINTS,
+            "price": "match__price_per_player",
+            "has_paid": "has_paid",
+        },
+        date_field="match__date",
+        player_field="player",
+        updated_field="match__updated_at",
+    ),
+}
+
+
+def parse_filters(params):
+    """
+    Validate date_from/date_to (YYYY-MM-DD), player (profile id) and since
+    (a cursor from an earlier export) from a query-dict-like mapping.
+    Raises ValueError naming the bad parameter.
+    """
+    filters = {}
+    for name in ("date_from", "date_to"):
+        if params.get(name):
+            try:
+                filters[name] = parse_date(params[name])
+            except ValueError:
+                filters[name] = None
+            if filters[name] is None:
+                raise ValueError(f"{name}: use the YYYY-MM-DD format.")
+    if params.get("player"):
+        try:
+            filters["player"] = int(params["player"])
+        except (TypeError, ValueError):
+            raise ValueError("player: expected a player id.")
+    if params.get("since"):
+        since = parse_datetime(params["since"])
+        if since is None:
+            raise ValueError("since: expected the cursor of an earlier export.")
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since, datetime.timezone.utc)
+        filters["since"] = since
+    return filters
+
+
+def rows(kind, date_from=None, date_to=None, player=None, since=None, chunk_size=CHUNK_SIZE):
+    """Dicts of one export, oldest id first, read in chunks."""
+    export = EXPORTS[kind]
+    lookups = {}
+    if date_from:
+        lookups[f"{export.date_field}__gte"] = date_from
+    if date_to:
+        lookups[f"{export.date_field}__lte"] = date_to
+    if player:
+        lookups[export.player_field] = player
+    if since:
+        lookups[f"{export.updated_field}__gte"] = since - SINCE_OVERLAP
+    queryset = export.values().filter(**lookups)
+    if player and kind == "matches":
+        queryset = queryset.distinct()
+    return queryset.iterator(chunk_size=chunk_size)
+
+
+class _Echo:
+    """File-like object whose write() returns the line, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def render(kind, fmt, rows):
+    """Encode rows as a stream of CSV (with a header line) or JSON Lines strings."""
+    columns = list(EXPORTS[kind].columns)
+    if fmt == "csv":
+        writer = csv.writer(_Echo())
+        yield writer.writerow(columns)
+        for row in rows:
+            yield writer.writerow([row[c] for c in columns])
+    else:
+        for row in rows:
+            yield json.dumps({c: row[c] for c in columns}, cls=DjangoJSONEncoder) + "\n"
+
+
+def new_cursor():
+    """Cursor for the export about to run: rows changed from now on belong to the next one."""
+    # UTC with a "Z" suffix, so it survives a query string unquoted
+    return timezone.now().astimezone(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
@@ -0,0 +1,11 @@
+import django_filters
+from .models import Match
+
+
+class MatchFilter(django_filters.FilterSet):
+    date_from = django_filters.DateFilter(field_name="date", lookup_expr="gte")
+    date_to = django_filters.DateFilter(field_name="date", lookup_expr="lte")
+
+    class Meta:
+        model = Match
+        fields = ["final_score", "date_from", "date_to"]
@@ -0,0 +1,57 @@
+from django.db import transaction
+from django.utils import timezone
+from . import badges, events, jobs, ledger, player_stats, standings
+from .models import Match, MatchParticipation, Team
+
+# per-player result fields a finalize may write
+RESULT_FIELDS = ["actually_played", "no_show", "goals", "assists", "is_mvp", "has_paid"]
+
+
+@transaction.atomic
+def finalize(match, teams=(), participations=(), fields=RESULT_FIELDS):
+    """
+    Persist already-updated Team and MatchParticipation instances of `match`
+    with one bulk_update each and lock the match. The derived work (standings,
+    career stats, match fees, badges) is queued as jobs in the same
+    transaction and runs in the background once it commits, see league.jobs.
+
+    Returns False (and writes nothing) if the match was finalized meanwhile.
+    """
+    finalized_at = timezone.now()
+    # conditional UPDATE, so two organizers clicking at once can't both finalize
+    if not Match.objects.filter(pk=match.pk, final_score=False).touch(final_score=True, finalized_at=finalized_at):
+        return False
+    match.final_score = True
+    match.finalized_at = finalized_at
+
+    if teams:
+        Team.objects.bulk_update(teams, ["score"])
+    if participations:
+        MatchParticipation.objects.bulk_update(participations, fields)
+
+    jobs.enqueue("match_rollups", {"match_id": match.pk})
+    jobs.enqueue("charge_match", {"match_id": match.pk})
+    events.match_finalized(match.pk)
+    return True
+
+
+# --- Jobs queued by finalize(); each runs in its own transaction, exactly once
+
+@jobs.handler("match_rollups")
+def apply_rollups(match_id):
+    """Add the match to the monthly standings and career stats, then re-run the badges."""
+    match = Match.objects.get(pk=match_id)
+    totals = standings.match_totals(match)
+    standings.apply_match(match, totals)
+    player_stats.apply_match(match, totals)
+    jobs.enqueue("award_badges", unique=True)  # badges read the standings, so only after them
+
+
+@jobs.handler("charge_match")
+def charge_match(match_id):
+    ledger.charge_match(Match.objects.get(pk=match_id))
+
+
+@jobs.handler("award_badges")
+def award_badges():
+    badges.run()
@@ -7,6 +7,13 @@ class ParticipationStatusForm(forms.ModelForm):
         model = MatchParticipation
         fields = ["status"]
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # the waiting list is assigned by the admission engine, not picked by players
+        self.fields["status"].choices = [
+            (value, label) for value, label in MatchParticipation.STATUS_CHOICES if value != "waiting"
+        ]
+
 class SetTeamForm(forms.Form):
     player_participation_id = forms.IntegerField(widget=forms.HiddenInput)
     team = forms.ModelChoiceField(queryset=Team.objects.none(), required=False)
@@ -0,0 +1,194 @@
+"""
+Upload pipeline of match highlight photos.
+
+accept() stores the original under its content hash
+(highlights/ab/abcdef....jpg). An upload identical to an earlier one
+reuses its file and its derivatives instead of storing and processing
+the photo again. New originals are processed by a "process_highlight"
+job of league.jobs once the transaction commits, so the work survives a
+restart and is retried. process() writes a square thumbnail plus WebP
+and JPEG renditions at a couple of widths to highlights/derived/<hash>/,
+skipping those already stored, then records their URLs and dimensions on
+the highlight. Derivative names depend only on the content, so they
+never change and can be cached forever (see views.highlight_derivative).
+"""
+import hashlib
+import io
+import logging
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from . import jobs
+from .models import MatchHighlight
+
+logger = logging.getLogger(__name__)
+
+DERIVED_DIR = "highlights/derived"
+
+
+@dataclass(frozen=True)
+class Variant:
+    name: str
+    width: int
+    height: Optional[int]  # set: cropped to exactly width x height; None: keeps the aspect ratio
+    format: str
+    options: tuple = ()
+
+    @property
+    def key(self):
+        return f"{self.name}.{EXTENSIONS[self.format]}"
+
+
+EXTENSIONS = {"WEBP": "webp", "JPEG": "jpg"}
+WEBP = (("quality", 80), ("method", 4))
+JPEG = (("quality", 82), ("optimize", True), ("progressive", True))
+
+VARIANTS = [
+    Variant("thumb", 256, 256, "WEBP", WEBP),
+    Variant("w640", 640, None, "WEBP", WEBP),
+    Variant("w640", 640, None, "JPEG", JPEG),
+    Variant("w1280", 1280, None, "WEBP", WEBP),
+    Variant("w1280", 1280, None, "JPEG", JPEG),
+]
+
+
+def content_hash(upload):
+    digest = hashlib.sha256()
+    for chunk in upload.chunks():
+        digest.update(chunk)
+    upload.seek(0)
+    return digest.hexdigest()
+
+
+def original_name(digest, filename):
+    extension = os.path.splitext(filename)[1].lower() or ".img"
+    return f"highlights/{digest[:2]}/{digest}{extension}"
+
+
+def accept(match, upload, added_by=None, description=""):
+    """
+    Create a highlight for an uploaded image (already validated as one).
+    Returns it, "ready" straight away when the same image was processed before.
+    """
+    digest = content_hash(upload)
+    twin = (
+        MatchHighlight.objects.filter(content_hash=digest)
+        .exclude(image="")
+        .order_by("-status", "id")  # a "ready" one if there is any
+        .first()
+    )
+    highlight = MatchHighlight(match=match, added_by=added_by, description=description, content_hash=digest)
+    if twin is not None:
+        highlight.image.name = twin.image.name
+        if twin.status == "ready":
+            highlight.width, highlight.height = twin.width, twin.height
+            highlight.derivatives = twin.derivatives
+            highlight.status = "ready"
+            highlight.processed_at = timezone.now()
+    else:
+        name = original_name(digest, upload.name)
+        if not default_storage.exists(name):
+            name = default_storage.save(name, upload)
+        highlight.image.name = name
+    highlight.save()
+    if highlight.status != "ready":
+        enqueue(highlight.pk)
+    return highlight
+
+
+def render(image, variant):
+    """One derivative of an (already oriented) image: (bytes, width, height)."""
+    if variant.height:
+        image = ImageOps.fit(image, (variant.width, variant.height), Image.LANCZOS)
+    elif image.width > variant.width:  # never upscale
+        image = image.resize((variant.width, round(image.height * variant.width / image.width)), Image.LANCZOS)
+    if variant.format == "JPEG" and image.mode != "RGB":
+        image = image.convert("RGB")
+    buffer = io.BytesIO()
+    image.save(buffer, variant.format, **dict(variant.options))
+    return buffer.getvalue(), image.width, image.height
+
+
+# EXIF orientations that turn the picture by 90 degrees
+TRANSPOSED = {5, 6, 7, 8}
+
+
+def _oriented_size(image):
+    """Size of the image once EXIF-rotated, from its header only."""
+    width, height = image.size
+    if image.getexif().get(0x0112) in TRANSPOSED:
+        return height, width
+    return width, height
+
+
+def _stored(name):
+    """Record of a derivative already in storage, reading only its header."""
+    with default_storage.open(name) as f:
+        w, h = Image.open(f).size
+    return {
+        "name": name, "url": default_storage.url(name), "width": w, "height": h, "bytes": default_storage.size(name),
+    }
+
+
+def process(highlight_id, force=False):
+    """
+    Generate the missing derivatives of one highlight (all of them with
+    `force`) and record them. Returns the status, None for nothing to do.
+    """
+    highlight = MatchHighlight.objects.filter(pk=highlight_id).first()
+    if highlight is None or not highlight.image:
+        return None
+    try:
+        with default_storage.open(highlight.image.name) as f:
+            if not highlight.content_hash:  # uploaded before the pipeline existed
+                highlight.content_hash = content_hash(f)
+                highlight.save(update_fields=["content_hash"])
+            image = Image.open(f)  # lazy: only the header is read until a variant has to be rendered
+            width, height = _oriented_size(image)
+            oriented = None
+
+            derivatives = {}
+            for variant in VARIANTS:
+                name = f"{DERIVED_DIR}/{highlight.content_hash}/{variant.key}"
+                if default_storage.exists(name):
+                    if not force:
+                        derivatives[variant.key] = _stored(name)
+                        continue
+                    default_storage.delete(name)
+                if oriented is None:
+                    oriented = ImageOps.exif_transpose(image)  # phone photos are often stored sideways
+                    if oriented.mode not in ("RGB", "RGBA"):
+                        oriented = oriented.convert("RGBA" if "transparency" in oriented.info else "RGB")
+                data, w, h = render(oriented, variant)
+                name = default_storage.save(name, ContentFile(data))
+                derivatives[variant.key] = {
+                    "name": name, "url": default_storage.url(name), "width": w, "height": h, "bytes": len(data),
+                }
+    except (OSError, Image.DecompressionBombError, ValueError):
+        logger.exception("Could not process highlight %s", highlight_id)
+        MatchHighlight.objects.filter(pk=highlight_id).update(status="failed", processed_at=timezone.now())
+        return "failed"
+
+    # every pending upload of the same image is done by this one
+    MatchHighlight.objects.filter(content_hash=highlight.content_hash).exclude(status="ready").update(
+        width=width, height=height, derivatives=derivatives, status="ready", processed_at=timezone.now()
+    )
+    return "ready"
+
+
+# not atomic: rendering takes a while, and process() is idempotent
+@jobs.handler("process_highlight", atomic=False)
+def process_job(highlight_id):
+    if process(highlight_id) == "failed":
+        raise RuntimeError(f"Highlight {highlight_id} could not be processed")  # retried with backoff
+
+
+def enqueue(highlight_id):
+    """Process the highlight in the background once the current transaction commits."""
+    jobs.enqueue("process_highlight", {"highlight_id": highlight_id}, unique=True, max_attempts=3)
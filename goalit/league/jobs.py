@@ -0,0 +1,279 @@
+"""
+A small durable job queue on the league database.
+
+enqueue() inserts a Job row in the caller's transaction, so a job exists if
+and only if the work that queued it committed (a rolled back finalize
+queues nothing). Once the transaction commits, one of the web process's
+LEAGUE_JOB_WORKERS threads is woken to run it; `manage.py run_jobs` is the
+standalone worker that also runs retries and anything left behind by a
+process that died.
+
+Each handler runs in one transaction together with the update marking its
+job done, so its database writes are applied exactly once: a failure rolls
+them back, a crash leaves the job "running" until it is requeued after
+LEAGUE_JOB_TIMEOUT. Failed attempts are retried with exponential backoff
+up to the job's max_attempts, then left "failed" with the traceback.
+
+Handlers are plain functions registered with @handler("kind"), called with
+the job's JSON payload as keyword arguments. A long handler that is
+idempotent by itself (e.g. image processing) can be registered with
+atomic=False: a transaction open that long would hold SQLite's write lock.
+"""
+import logging
+import os
+import random
+import socket
+import threading
+import traceback
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Count, F, Min
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+HANDLERS = {}
+NON_ATOMIC = set()  # kinds whose handler runs outside the job's transaction
+
+BACKOFF_BASE = 2  # seconds before the first retry, doubled for each further one
+BACKOFF_MAX = 60 * 60
+# finished jobs the latency metrics are computed over
+METRICS_WINDOW = 1000
+
+
+def handler(kind, atomic=True):
+    """Register the decorated function as the handler of `kind` jobs."""
+    def register(func):
+        HANDLERS[kind] = func
+        if not atomic:
+            NON_ATOMIC.add(kind)
+        return func
+    return register
+
+
+def worker_name(suffix=""):
+    return f"{socket.gethostname()}:{os.getpid()}{suffix}"
+
+
+def enqueue(kind, payload=None, delay=None, max_attempts=None, unique=False):
+    """
+    Queue a `kind` job in the current transaction. With `unique`, nothing is
+    added if the same job is already waiting to run. Returns the Job.
+    """
+    if kind not in HANDLERS:
+        raise ValueError(f"Unknown job kind: {kind!r}")
+    payload = payload or {}
+    if unique:
+        waiting = Job.objects.filter(kind=kind, payload=payload, status="queued").first()
+        if waiting is not None:
+            return waiting
+    job = Job(kind=kind, payload=payload, run_after=timezone.now() + (delay or timedelta()))
+    if max_attempts:
+        job.max_attempts = max_attempts
+    job.save()
+    # robust: the job is committed by then, a failed wake-up must not look like a failed transaction
+    transaction.on_commit(wake, robust=True)
+    return job
+
+
+def backoff(attempts):
+    """Seconds before retrying a job that failed its `attempts`-th attempt (with some jitter)."""
+    return min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX) * random.uniform(1, 1.25)
+
+
+def claim(limit=1, worker=""):
+    """
+    Mark up to `limit` due jobs as running for `worker` and return them.
+    The write lock is taken up front (BEGIN IMMEDIATE on SQLite, SKIP LOCKED
+    rows elsewhere), so concurrent workers never claim the same job. Each
+    claim gets its own locked_by token, see execute().
+    """
+    now = timezone.now()
+    token = f"{worker[:80]}/{uuid.uuid4().hex[:12]}"
+    with transaction.atomic():
+        ids = list(
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(status="queued", run_after__lte=now)
+            .order_by("run_after", "id")
+            .values_list("id", flat=True)[:limit]
+        )
+        if not ids:
+            return []
+        Job.objects.filter(id__in=ids).update(
+            status="running", started_at=now, attempts=F("attempts") + 1, locked_by=token
+        )
+    return list(Job.objects.filter(id__in=ids).order_by("run_after", "id"))
+
+
+class LostClaim(Exception):
+    """The job was requeued (and maybe claimed again) while this worker ran it."""
+
+
+def _settle(job, **fields):
+    """Record the outcome of `job` if this claim still holds it. Returns whether it did."""
+    return bool(Job.objects.filter(pk=job.pk, status="running", locked_by=job.locked_by).update(**fields))
+
+
+def execute(job):
+    """
+    Run one claimed job and record the outcome: "done", "queued" (to retry),
+    "failed", or "lost" when requeue_stale() took the job away meanwhile; the
+    handler's writes are then rolled back, as the new claimer applies them
+    (non-atomic handlers are idempotent, there is nothing to roll back).
+    """
+    try:
+        func = HANDLERS.get(job.kind)
+        if func is None:
+            raise LookupError(f"No handler for job kind {job.kind!r}")
+        if job.kind in NON_ATOMIC:
+            func(**job.payload)
+            if not _settle(job, status="done", finished_at=timezone.now(), last_error=""):
+                raise LostClaim(job.pk)
+            return "done"
+        with transaction.atomic():
+            func(**job.payload)
+            if not _settle(job, status="done", finished_at=timezone.now(), last_error=""):
+                raise LostClaim(job.pk)
+        return "done"
+    except LostClaim:
+        logger.warning("Job %s was requeued while running, its writes were rolled back", job)
+        return "lost"
+    except Exception:
+        error = traceback.format_exc()
+        now = timezone.now()
+        if job.attempts < job.max_attempts:
+            delay = backoff(job.attempts)
+            if not _settle(job, status="queued", run_after=now + timedelta(seconds=delay), last_error=error):
+                return "lost"
+            logger.warning("Job %s failed (attempt %s), retrying in %.0fs", job, job.attempts, delay)
+            return "queued"
+        if not _settle(job, status="failed", finished_at=now, last_error=error):
+            return "lost"
+        logger.error("Job %s failed for good after %s attempts", job, job.attempts)
+        return "failed"
+
+
+def run_pending(worker=None, limit=None):
+    """Run due jobs one at a time in this thread until there are none (or `limit` ran). Returns the outcomes."""
+    worker = worker or worker_name()
+    outcomes = Counter()
+    while limit is None or sum(outcomes.values()) < limit:
+        jobs = claim(1, worker)
+        if not jobs:
+            break
+        outcomes[execute(jobs[0])] += 1
+    return outcomes
+
+
+def requeue_stale(timeout=None):
+    """Put back jobs whose worker vanished while running them. Returns how many."""
+    timeout = timeout if timeout is not None else settings.LEAGUE_JOB_TIMEOUT
+    cutoff = timezone.now() - timedelta(seconds=timeout)
+    return Job.objects.filter(status="running", started_at__lt=cutoff).update(
+        status="queued", run_after=timezone.now(), locked_by=""
+    )
+
+
+def _drain(worker):
+    try:
+        run_pending(worker)
+    except Exception:
+        logger.exception("Job worker thread crashed")
+    finally:
+        close_old_connections()
+
+
+def work(threads=2, poll=1.0, once=False, stop=None):
+    """
+    The run_jobs loop: claim due jobs in batches and run them on `threads`
+    threads, sleeping `poll` seconds when the queue is empty. Returns the
+    outcome counts when `stop` is set (or, with `once`, the queue is empty).
+    """
+    stop = stop or threading.Event()
+    worker = worker_name()
+    outcomes = Counter()
+    with ThreadPoolExecutor(max_workers=threads, thread_name_prefix="jobs") as pool:
+        while not stop.is_set():
+            jobs = claim(threads, worker)
+            if jobs:
+                for outcome in pool.map(_execute_in_thread, jobs):
+                    outcomes[outcome] += 1
+                continue
+            if once:
+                break
+            requeue_stale()
+            stop.wait(poll)
+    return outcomes
+
+
+def _execute_in_thread(job):
+    try:
+        return execute(job)
+    finally:
+        close_old_connections()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def wake():
+    """Have a thread of this process run the jobs that just became due (no-op with LEAGUE_JOB_WORKERS = 0)."""
+    global _pool
+    threads = getattr(settings, "LEAGUE_JOB_WORKERS", 0)
+    if threads <= 0:
+        return
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="jobs")
+    try:
+        _pool.submit(_drain, worker_name(":web"))
+    except RuntimeError:  # interpreter shutting down; run_jobs will pick the job up
+        logger.info("Job pool unavailable, leaving the jobs to run_jobs")
+
+
+def metrics(now=None):
+    """
+    Queue depth and latency, for job_stats and monitoring: jobs per status
+    and per kind, the age of the oldest due job, and over the last
+    METRICS_WINDOW finished jobs the wait (queued -> started) and run
+    (started -> finished) times in seconds, p50/p95/max.
+    """
+    now = now or timezone.now()
+    by_status = dict(Job.objects.order_by().values_list("status").annotate(n=Count("id")))
+    queued_by_kind = dict(
+        Job.objects.filter(status="queued").order_by().values_list("kind").annotate(n=Count("id"))
+    )
+    oldest = Job.objects.filter(status="queued", run_after__lte=now).aggregate(oldest=Min("run_after"))["oldest"]
+    finished = list(
+        Job.objects.filter(status="done").order_by("-finished_at")
+        .values_list("created_at", "started_at", "finished_at")[:METRICS_WINDOW]
+    )
+    waits = sorted((started - created).total_seconds() for created, started, _ in finished)
+    runs = sorted((done - started).total_seconds() for _, started, done in finished)
+    return {
+        "depth": by_status.get("queued", 0),
+        "by_status": {status: by_status.get(status, 0) for status, _ in Job.STATUS_CHOICES},
+        "queued_by_kind": queued_by_kind,
+        "oldest_due_seconds": (now - oldest).total_seconds() if oldest else 0.0,
+        "wait_seconds": _distribution(waits),
+        "run_seconds": _distribution(runs),
+    }
+
+
+def _distribution(values):
+    if not values:
+        return {"count": 0, "p50": None, "p95": None, "max": None}
+    return {
+        "count": len(values),
+        "p50": values[len(values) // 2],
+        "p95": values[max(1, round(0.95 * len(values))) - 1],  # nearest rank
+        "max": values[-1],
+    }
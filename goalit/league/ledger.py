@@ -0,0 +1,162 @@
+"""
+Match fees as an append-only ledger.
+
+Finalizing a match charges its price to everyone who played or didn't
+show up; payments, refunds and adjustments are further LedgerEntry rows.
+PlayerBalance keeps each player's running total, moved by the same
+transaction that appends the entries, so "what does X owe" and the
+debtor list are single-row / index reads instead of sums over history.
+MatchParticipation.has_paid stays as the per-match "settled" flag.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, Q, Sum, Value, When
+from django.utils import timezone
+
+from .models import LedgerEntry, Match, MatchParticipation, PlayerBalance
+
+ZERO = Decimal("0.00")
+
+# participations that owe the match fee
+CHARGEABLE = Q(actually_played=True) | Q(no_show=True)
+
+
+def _apply(entries):
+    """Move PlayerBalance by the entries' amounts: one INSERT for new rows, one UPDATE."""
+    deltas = defaultdict(Decimal)
+    for entry in entries:
+        deltas[entry.player_id] += entry.amount
+    deltas = {player: delta for player, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    PlayerBalance.objects.bulk_create(
+        [PlayerBalance(player_id=player) for player in deltas], ignore_conflicts=True
+    )
+    PlayerBalance.objects.filter(player_id__in=deltas).update(
+        updated_at=timezone.now(),
+        balance=F("balance") + Case(
+            *[When(player_id=player, then=Value(delta)) for player, delta in deltas.items()],
+            output_field=DecimalField(max_digits=10, decimal_places=2),
+        )
+    )
+
+
+@transaction.atomic
+def post(entries):
+    """Append LedgerEntry instances (unsaved) and update the balances. Returns them."""
+    entries = LedgerEntry.objects.bulk_create(entries)
+    _apply(entries)
+    return entries
+
+
+def _match_totals(match, player_ids=None):
+    """player_id -> sum of the player's entries for this match (positive: still owed)."""
+    entries = LedgerEntry.objects.filter(match=match)
+    if player_ids is not None:
+        entries = entries.filter(player_id__in=player_ids)
+    return dict(entries.values("player_id").annotate(total=Sum("amount")).values_list("player_id", "total"))
+
+
+def charge_match(match, recorded_by=None):
+    """
+    Charge the match price to each participation that played or no-showed.
+    Those flagged has_paid get a payment for whatever they haven't prepaid.
+    Called once, when the match is finalized. Returns the entries.
+    """
+    if not match.price_per_player:
+        return []
+    price = match.price_per_player
+    chargeable = dict(
+        MatchParticipation.objects.filter(CHARGEABLE, match=match).values_list("player_id", "has_paid")
+    )
+    prepaid = _match_totals(match, chargeable)
+    entries = []
+    for player_id, has_paid in chargeable.items():
+        entries.append(LedgerEntry(player_id=player_id, match=match, kind="charge", amount=price,
+                                   recorded_by=recorded_by))
+        owed = price + prepaid.get(player_id, ZERO)
+        if has_paid and owed > 0:
+            entries.append(LedgerEntry(player_id=player_id, match=match, kind="payment", amount=-owed,
+                                       recorded_by=recorded_by))
+    return post(entries)
+
+
+@transaction.atomic
+def mark_paid(match, participation_ids, recorded_by=None, note=""):
+    """
+    Record one payment per participation for what it owes on this match and
+    flag it has_paid. Before the match is finalized that is a prepayment of
+    the price, which the charge at finalize then nets out. Participations
+    with nothing to pay are skipped. Returns the payment entries.
+    """
+    parts = dict(
+        MatchParticipation.objects.select_for_update()
+        .filter(match=match, pk__in=participation_ids)
+        .values_list("player_id", "pk")
+    )
+    totals = _match_totals(match, parts)
+    upcoming_fee = match.price_per_player if not match.final_score and match.price_per_player else ZERO
+    owed = {player_id: totals.get(player_id, ZERO) + upcoming_fee for player_id in parts}
+    entries = post([
+        LedgerEntry(player_id=player_id, match=match, kind="payment", amount=-amount,
+                    recorded_by=recorded_by, note=note)
+        for player_id, amount in owed.items()
+        if amount > 0
+    ])
+    settled = [parts[entry.player_id] for entry in entries]
+    if settled:
+        MatchParticipation.objects.filter(pk__in=settled).update(has_paid=True)
+        Match.objects.filter(pk=match.pk).touch()  # has_paid is part of the roster payload
+    return entries
+
+
+def record(player, kind, amount, match=None, recorded_by=None, note=""):
+    """
+    Append a single payment (amount received), refund (amount paid back) or
+    adjustment (signed). Returns the entry.
+    """
+    amount = Decimal(amount)
+    if kind == "payment":
+        amount = -amount
+    elif kind not in ("refund", "adjustment"):
+        raise ValueError(f"Unknown ledger entry kind: {kind}")
+    entry = LedgerEntry(player=player, match=match, kind=kind, amount=amount, recorded_by=recorded_by, note=note)
+    return post([entry])[0]
+
+
+def balance(player):
+    """What the player owes (negative: in credit)."""
+    row = PlayerBalance.objects.filter(player=player).values_list("balance", flat=True).first()
+    return row if row is not None else ZERO
+
+
+def debtors():
+    """Players who owe money, biggest debt first (a scan of the partial index)."""
+    return PlayerBalance.objects.filter(balance__gt=0).select_related("player__user").order_by("-balance", "player")
+
+
+def match_summary(match):
+    """Charged / paid / refunded / outstanding totals of one match, plus who still owes."""
+    totals = LedgerEntry.objects.filter(match=match).aggregate(
+        charged=Sum("amount", filter=Q(kind="charge"), default=ZERO),
+        paid=Sum("amount", filter=Q(kind="payment"), default=ZERO),
+        refunded=Sum("amount", filter=Q(kind="refund"), default=ZERO),
+        adjusted=Sum("amount", filter=Q(kind="adjustment"), default=ZERO),
+        outstanding=Sum("amount", default=ZERO),
+    )
+    totals["paid"] = -totals["paid"]
+    totals["unpaid"] = {player: owed for player, owed in _match_totals(match).items() if owed > 0}
+    return totals
+
+
+@transaction.atomic
+def rebuild_balances():
+    """Recompute every PlayerBalance from the ledger (repair tool). Returns the number of rows."""
+    PlayerBalance.objects.all().delete()
+    rows = LedgerEntry.objects.values("player_id").annotate(total=Sum("amount"))
+    return len(PlayerBalance.objects.bulk_create(
+        [PlayerBalance(player_id=row["player_id"], balance=row["total"]) for row in rows.iterator()],
+        batch_size=500,
+    ))
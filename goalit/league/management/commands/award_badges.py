@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from league import badges
+
+
+class Command(BaseCommand):
+    help = "Award badges for matches finalized since the previous run."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--full", action="store_true", help="Ignore the watermark and re-evaluate the whole history.")
+
+    def handle(self, *args, **options):
+        run = badges.run(full=options["full"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed {run.matches_processed} match(es): "
+            f"{run.badges_awarded} badge(s) awarded, {run.badges_revoked} revoked."
+        ))
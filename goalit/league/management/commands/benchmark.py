@@ -0,0 +1,70 @@
+import json
+import subprocess
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from league import benchmarks
+from league.models import Match, MatchParticipation, PlayerProfil
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the league pages and match API against the current data, enforce per-endpoint "
+        "query budgets and write p50/p95 latencies to a JSON report."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=20, help="Requests per endpoint.")
+        parser.add_argument("--only", default="", help="Comma-separated endpoint names.")
+        parser.add_argument("--output", default="benchmark.json", help="Report path ('-' for stdout only).")
+
+    def _revision(self):
+        try:
+            return subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def handle(self, *args, **options):
+        endpoints = benchmarks.ENDPOINTS
+        if options["only"]:
+            names = set(options["only"].split(","))
+            endpoints = [e for e in endpoints if e.name in names]
+        try:
+            results = benchmarks.run(endpoints, repeat=options["repeat"])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        self.stdout.write(f"{'endpoint':<22} {'status':>7} {'queries':>9} {'p50 ms':>8} {'p95 ms':>8}")
+        for r in results:
+            line = (
+                f"{r['name']:<22} {','.join(map(str, r['status'])):>7} "
+                f"{r['queries']:>4}/{r['budget']:<4} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f}"
+            )
+            failed = r["over_budget"] or r["unexpected_status"]
+            self.stdout.write(self.style.ERROR(line) if failed else line)
+
+        report = {
+            "revision": self._revision(),
+            "created": timezone.now().isoformat(),
+            "database": connection.vendor,
+            "rows": {
+                "players": PlayerProfil.objects.count(),
+                "matches": Match.objects.count(),
+                "participations": MatchParticipation.objects.count(),
+            },
+            "repeat": options["repeat"],
+            "endpoints": {r.pop("name"): r for r in results},
+        }
+        if options["output"] != "-":
+            with open(options["output"], "w") as fh:
+                json.dump(report, fh, indent=2)
+            self.stdout.write(f"Report written to {options['output']}.")
+
+        failures = [
+            name for name, r in report["endpoints"].items() if r["over_budget"] or r["unexpected_status"]
+        ]
+        if failures:
+            raise CommandError(f"Over query budget or unexpected status: {', '.join(failures)}")
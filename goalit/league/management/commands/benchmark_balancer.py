@@ -0,0 +1,43 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from league.balancing import GOALKEEPER, Candidate, partition
+
+
+class Command(BaseCommand):
+    help = "Time the team partitioner on synthetic player pools and report how even the splits are."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="10,14,22,50,100,200", help="Comma-separated pool sizes.")
+        parser.add_argument("--teams", default="2,3,4", help="Comma-separated team counts.")
+        parser.add_argument("--repeat", type=int, default=20, help="Runs per combination.")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        sizes = [int(x) for x in options["sizes"].split(",")]
+        team_counts = [int(x) for x in options["teams"].split(",")]
+
+        self.stdout.write(f"{'players':>7} {'teams':>5} {'median ms':>10} {'max ms':>8} {'gap':>8} {'gap %':>6}")
+        for size in sizes:
+            for n_teams in team_counts:
+                if n_teams > size:
+                    continue
+                timings, gaps, shares = [], [], []
+                for _ in range(options["repeat"]):
+                    pool = [
+                        Candidate(i, max(0.0, rng.gauss(150, 60)), GOALKEEPER if rng.random() < 0.1 else "ANY")
+                        for i in range(size)
+                    ]
+                    start = time.perf_counter()
+                    sides = partition(pool, n_teams, seed=rng.random())
+                    timings.append((time.perf_counter() - start) * 1000)
+                    totals = [sum(c.rating for c in side) for side in sides]
+                    gaps.append(max(totals) - min(totals))
+                    shares.append(100 * gaps[-1] / (sum(totals) / n_teams))
+                self.stdout.write(
+                    f"{size:>7} {n_teams:>5} {statistics.median(timings):>10.2f} {max(timings):>8.2f} "
+                    f"{statistics.median(gaps):>8.1f} {statistics.median(shares):>6.2f}"
+                )
@@ -0,0 +1,31 @@
+import json
+
+from django.core.management.base import BaseCommand
+from league import write_contention
+
+
+class Command(BaseCommand):
+    help = (
+        "Run concurrent join transactions from several processes against a scratch SQLite file, "
+        "with a plain connection and with the league.sqlite setup, and compare error rates and throughput."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", type=int, default=8)
+        parser.add_argument("--writes", type=int, default=200, help="Join transactions per process.")
+        parser.add_argument("--mode", choices=[*write_contention.MODES, "both"], default="both")
+        parser.add_argument("--json", action="store_true", help="Print the results as JSON.")
+
+    def handle(self, *args, **options):
+        modes = list(write_contention.MODES) if options["mode"] == "both" else [options["mode"]]
+        results = [write_contention.run(mode, options["processes"], options["writes"]) for mode in modes]
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(f"{'mode':<8} {'attempts':>9} {'committed':>10} {'errors':>7} {'error %':>8} {'commits/s':>10}")
+        for r in results:
+            line = (
+                f"{r['mode']:<8} {r['attempts']:>9} {r['committed']:>10} {r['errors']:>7} "
+                f"{r['error_rate'] * 100:>7.1f}% {r['commits_per_second'] or 0:>10.1f}"
+            )
+            self.stdout.write(self.style.ERROR(line) if r["errors"] or not r["consistent"] else line)
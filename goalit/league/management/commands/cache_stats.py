@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from league import cache
+
+
+class Command(BaseCommand):
+    help = "Show (or reset) the hit/miss counters of the match fragment cache."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reset", action="store_true", help="Zero the counters after printing them.")
+
+    def handle(self, *args, **options):
+        stats = cache.stats()
+        rate = "n/a" if stats["hit_rate"] is None else f"{stats['hit_rate']:.1%}"
+        self.stdout.write(f"hits={stats['hits']} misses={stats['misses']} hit_rate={rate}")
+        if options["reset"]:
+            cache.reset_stats()
+            self.stdout.write(self.style.SUCCESS("Counters reset."))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from league import query_plans
+
+
+class Command(BaseCommand):
+    help = "EXPLAIN QUERY PLAN the league's hot queries; fails on full table scans or unused indexes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--verbose-plans", action="store_true", help="Print every plan, not just failures.")
+
+    def handle(self, *args, **options):
+        try:
+            failures = query_plans.check()
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        for name, build in query_plans.CRITICAL_QUERIES.items():
+            if name in failures:
+                problems, steps = failures[name]
+                self.stdout.write(self.style.ERROR(f"{name}: {'; '.join(problems)}"))
+            elif options["verbose_plans"]:
+                self.stdout.write(self.style.SUCCESS(f"{name}: ok"))
+                steps = query_plans.plan(build())
+            else:
+                continue
+            for line in steps:
+                self.stdout.write(f"    {line}")
+        if failures:
+            raise CommandError(f"{len(failures)} query plan(s) regressed.")
+        self.stdout.write(self.style.SUCCESS(f"{len(query_plans.CRITICAL_QUERIES)} query plans use their indexes."))
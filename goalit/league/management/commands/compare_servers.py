@@ -0,0 +1,37 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from league import benchmarks, server_load
+
+
+class Command(BaseCommand):
+    help = (
+        "Send the same burst of participants requests through Django's WSGI handler (fixed thread pool) "
+        "and ASGI handler (async views), and compare throughput and latency."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=400)
+        parser.add_argument("--concurrency", type=int, default=100, help="Requests in flight at once.")
+        parser.add_argument("--workers", type=int, default=8, help="WSGI worker threads.")
+        parser.add_argument("--db-latency-ms", type=float, default=0, help="Extra latency per SQL query.")
+        parser.add_argument("--json", action="store_true", help="Print the results as JSON.")
+
+    def handle(self, *args, **options):
+        fixtures = benchmarks.pick_fixtures()
+        if fixtures is None:
+            raise CommandError("No suitable data: run seed_league first.")
+        results = server_load.compare(
+            fixtures.open, fixtures.player.user, options["requests"], options["concurrency"],
+            options["workers"], options["db_latency_ms"],
+        )
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(f"{'server':<6} {'ok':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+        for r in results:
+            line = (
+                f"{r['server']:<6} {r['ok']:>3}/{r['requests']:<3} {r['requests_per_second']:>7.1f} "
+                f"{r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['max_ms']:>8.1f}"
+            )
+            self.stdout.write(self.style.ERROR(line) if r["ok"] < r["requests"] else line)
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+from league import exports
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream matches or participations (stats and payment status) as CSV or JSON Lines. "
+        "Prints the cursor to pass as --since next time on stderr."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=list(exports.EXPORTS))
+        parser.add_argument("--format", choices=list(exports.FORMATS), default="csv")
+        parser.add_argument("--date-from", help="YYYY-MM-DD, inclusive.")
+        parser.add_argument("--date-to", help="YYYY-MM-DD, inclusive.")
+        parser.add_argument("--player", help="Player profile id.")
+        parser.add_argument("--since", help="Cursor printed by an earlier export.")
+        parser.add_argument("--output", default="-", help="File path, '-' for stdout.")
+        parser.add_argument("--chunk-size", type=int, default=exports.CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            filters = exports.parse_filters(options)
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        cursor = exports.new_cursor()
+        rows = exports.rows(options["kind"], chunk_size=options["chunk_size"], **filters)
+        chunks = exports.render(options["kind"], options["format"], rows)
+        if options["output"] == "-":
+            for chunk in chunks:
+                self.stdout.write(chunk, ending="")
+        else:
+            with open(options["output"], "w", newline="") as fh:
+                fh.writelines(chunks)
+        self.stderr.write(f"cursor: {cursor}")
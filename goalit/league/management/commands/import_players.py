@@ -0,0 +1,49 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from league import player_import
+from league.serializers import PlayerImportSerializer
+
+
+class Command(BaseCommand):
+    help = "Create players (user + profile) in bulk from a CSV or JSON roster."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Roster file, '-' for stdin.")
+        parser.add_argument("--format", choices=["csv", "json"], help="Defaults to the file extension.")
+        parser.add_argument("--batch-size", type=int, default=player_import.BATCH_SIZE)
+        parser.add_argument("--workers", type=int, help="Password hashing threads.")
+        parser.add_argument("--dry-run", action="store_true", help="Validate only.")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["format"] or ("json" if path.lower().endswith(".json") else "csv")
+        try:
+            if path == "-":
+                text = sys.stdin.read()
+            else:
+                with open(path, encoding="utf-8-sig") as fh:
+                    text = fh.read()
+            rows = player_import.parse(text, fmt)
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"Can't read {path}: {exc}")
+
+        serializer = PlayerImportSerializer(data={"players": rows})
+        if not serializer.is_valid():
+            errors = serializer.errors.get("players")
+            if not isinstance(errors, list):
+                raise CommandError(str(serializer.errors))
+            for line, row_errors in enumerate(errors, start=1):
+                for field, messages in (row_errors or {}).items():
+                    self.stderr.write(f"row {line}: {field}: {' '.join(map(str, messages))}")
+            raise CommandError("Nothing imported.")
+        if options["dry_run"]:
+            self.stdout.write(f"{len(rows)} row(s) valid.")
+            return
+
+        start = time.perf_counter()
+        profiles = serializer.save(batch_size=options["batch_size"], workers=options["workers"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {len(profiles)} player(s) in {time.perf_counter() - start:.1f}s."
+        ))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from league import jobs
+
+
+class Command(BaseCommand):
+    help = "Show the depth of the background job queue and how long jobs wait and run."
+
+    def handle(self, *args, **options):
+        stats = jobs.metrics()
+        self.stdout.write(" ".join(f"{status}={n}" for status, n in stats["by_status"].items()))
+        for kind, n in sorted(stats["queued_by_kind"].items()):
+            self.stdout.write(f"  queued {kind}: {n}")
+        self.stdout.write(f"oldest due job waiting: {stats['oldest_due_seconds']:.1f}s")
+        for name in ("wait_seconds", "run_seconds"):
+            d = stats[name]
+            if d["count"]:
+                self.stdout.write(
+                    f"{name}: p50={d['p50']:.3f} p95={d['p95']:.3f} max={d['max']:.3f} (last {d['count']} jobs)"
+                )
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from league import highlights
+from league.models import MatchHighlight
+
+
+class Command(BaseCommand):
+    help = "Generate the thumbnails and variants of highlights left pending or failed (or of all with --all)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true",
+                            help="Reprocess ready highlights too, re-rendering every variant.")
+
+    def handle(self, *args, **options):
+        queryset = MatchHighlight.objects.exclude(image="").exclude(image__isnull=True)
+        if not options["all"]:
+            queryset = queryset.exclude(status="ready")
+        else:
+            queryset.update(status="pending")
+        outcomes = {}
+        # one per image: process() updates every highlight sharing the content hash
+        for pk in queryset.order_by("content_hash", "id").values_list("pk", flat=True):
+            if MatchHighlight.objects.filter(pk=pk, status="ready").exists():
+                continue
+            result = highlights.process(pk, force=options["all"])
+            outcomes[result] = outcomes.get(result, 0) + 1
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed highlights: {outcomes.get('ready', 0)} ready, {outcomes.get('failed', 0)} failed."
+        ))
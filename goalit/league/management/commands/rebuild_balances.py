@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from league import ledger
+
+
+class Command(BaseCommand):
+    help = "Recompute every player's balance from the ledger entries."
+
+    def handle(self, *args, **options):
+        count = ledger.rebuild_balances()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} balance(s)."))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from league import player_stats
+
+
+class Command(BaseCommand):
+    help = "Recompute the PlayerStats career totals from all finalized matches."
+
+    def handle(self, *args, **options):
+        created = player_stats.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {created} player stats row(s)."))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from league import search
+
+
+class Command(BaseCommand):
+    help = "Refill the full-text search tables from the matches and comments."
+
+    def handle(self, *args, **options):
+        if not search.available():
+            self.stdout.write(self.style.WARNING("FTS5 search tables are missing; search uses the icontains fallback."))
+            return
+        for kind, count in search.rebuild().items():
+            self.stdout.write(self.style.SUCCESS(f"Indexed {count} {kind}."))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from league import standings
+
+
+class Command(BaseCommand):
+    help = "Recompute the Standing table from all finalized matches."
+
+    def handle(self, *args, **options):
+        created = standings.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {created} standing row(s)."))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from league.counters import recount_matches
+from league.models import Match
+
+
+class Command(BaseCommand):
+    help = "Recompute Match.going_count / waiting_count from MatchParticipation."
+
+    def add_arguments(self, parser):
+        parser.add_argument("match_ids", nargs="*", type=int, help="Only repair these matches (default: all).")
+
+    def handle(self, *args, **options):
+        queryset = Match.objects.all()
+        if options["match_ids"]:
+            queryset = queryset.filter(pk__in=options["match_ids"])
+        updated = recount_matches(queryset)
+        self.stdout.write(self.style.SUCCESS(f"Recounted {updated} match(es)."))
@@ -0,0 +1,24 @@
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+from league import jobs
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs (finalize follow-ups, badges, ...) until stopped."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=2, help="Jobs run in parallel.")
+        parser.add_argument("--poll", type=float, default=1.0, help="Seconds to sleep when the queue is empty.")
+        parser.add_argument("--once", action="store_true", help="Exit as soon as the queue is empty.")
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: stop.set())  # finish the jobs at hand, then exit
+        outcomes = jobs.work(threads=options["threads"], poll=options["poll"], once=options["once"], stop=stop)
+        self.stdout.write(self.style.SUCCESS(
+            f"Jobs: {outcomes['done']} done, {outcomes['queued']} to retry, {outcomes['failed']} failed, "
+            f"{outcomes['lost']} lost to a requeue."
+        ))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from league import seeding
+
+
+class Command(BaseCommand):
+    help = "Fill the database with synthetic players, matches and rosters for benchmarking."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--players", type=int, default=20000)
+        parser.add_argument("--matches", type=int, default=10000)
+        parser.add_argument("--finalized", type=float, default=0.7, help="Share of matches to finalize.")
+        parser.add_argument("--days", type=int, default=365, help="Spread matches over this many days.")
+        parser.add_argument("--prefix", default="seed", help="Username prefix of the generated players.")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        players = seeding.seed_players(options["players"], prefix=options["prefix"])
+        self.stdout.write(f"Created {len(players)} player(s).")
+        if len(players) < options["players"]:
+            # a rerun with the same prefix: the rosters draw on the players seeded before as well
+            players = list(
+                seeding.PlayerProfil.objects.filter(user__username__startswith=options["prefix"]).order_by("id")
+            )
+        matches, participations = seeding.seed_matches(
+            options["matches"],
+            players,
+            finalized_share=options["finalized"],
+            days=options["days"],
+            seed=options["seed"],
+            batch_size=options["batch_size"],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {matches} match(es) with {participations} participation(s)."
+        ))
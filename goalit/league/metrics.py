@@ -0,0 +1,204 @@
+"""
+In-process request and SQL metrics, exposed in the Prometheus text format.
+
+league.middleware.RequestMetricsMiddleware times every request and files
+it under its view name (the URL name, e.g. "league:match_detail" or
+"match-join"). It also wraps the database connection with a QueryRecorder,
+which counts the queries and their total time and remembers the slowest
+statement (a couple of perf_counter() calls per query). Requests slower
+than LEAGUE_SLOW_REQUEST_SECONDS are logged to "league.slow_requests"
+along with that statement; the query histograms only take a sampled share
+of requests (LEAGUE_METRICS_SAMPLE_RATE), which keeps their locking off
+most requests.
+
+Histograms live in the memory of each process: with several worker
+processes, scrape each of them, or run one per container. render() is
+served at /metrics (see views.prometheus_metrics) and also reports the
+fragment cache counters and the job queue.
+"""
+import bisect
+import threading
+import time
+from dataclasses import dataclass, field
+
+from django.conf import settings
+
+from . import cache, jobs
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+# the slowest statement is kept per view, cut to this many characters
+SQL_PREVIEW = 500
+
+
+def sample_rate():
+    return getattr(settings, "LEAGUE_METRICS_SAMPLE_RATE", 1.0)
+
+
+def slow_request_seconds():
+    return getattr(settings, "LEAGUE_SLOW_REQUEST_SECONDS", 1.0)
+
+
+class Histogram:
+    """A labelled Prometheus histogram: per set of label values, bucket counts, sum and count."""
+
+    def __init__(self, name, help, labels, buckets):
+        self.name, self.help, self.labels, self.buckets = name, help, tuple(labels), tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)  # first bucket with value <= bound
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {labels: (list(counts), total, n) for labels, (counts, total, n) in self._series.items()}
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    def lines(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for label_values, (counts, total, n) in sorted(self.snapshot().items()):
+            labels = _labels(zip(self.labels, label_values))
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                yield f"{self.name}_bucket{_labels(zip(self.labels, label_values), le=_number(bound))} {cumulative}"
+            yield f"{self.name}_sum{labels} {_number(total)}"
+            yield f"{self.name}_count{labels} {n}"
+
+
+REQUEST_SECONDS = Histogram(
+    "league_request_duration_seconds", "Time to produce the response, per view.",
+    ["view", "method", "status"], DURATION_BUCKETS,
+)
+QUERY_COUNT = Histogram(
+    "league_request_queries", "SQL queries per request (sampled requests).", ["view"], QUERY_BUCKETS,
+)
+SQL_SECONDS = Histogram(
+    "league_request_sql_seconds", "Time spent in SQL per request (sampled requests).", ["view"], DURATION_BUCKETS,
+)
+HISTOGRAMS = [REQUEST_SECONDS, QUERY_COUNT, SQL_SECONDS]
+
+
+@dataclass
+class Statement:
+    seconds: float
+    sql: str
+
+
+_slowest = {}  # view -> Statement, the slowest query seen per view
+_slowest_lock = threading.Lock()
+
+
+@dataclass
+class QueryRecorder:
+    """A connection.execute_wrapper() that tallies the queries of one request."""
+    count: int = 0
+    seconds: float = 0.0
+    slowest: Statement = field(default_factory=lambda: Statement(0.0, ""))
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.seconds += elapsed
+            if elapsed > self.slowest.seconds:
+                self.slowest = Statement(elapsed, sql)
+
+
+def record(view, method, status, seconds, queries=None):
+    """File one finished request; `queries` is its QueryRecorder if it was sampled."""
+    REQUEST_SECONDS.observe(seconds, view, method, str(status))
+    if queries is None:
+        return
+    QUERY_COUNT.observe(queries.count, view)
+    SQL_SECONDS.observe(queries.seconds, view)
+    if queries.slowest.sql:
+        with _slowest_lock:
+            current = _slowest.get(view)
+            if current is None or queries.slowest.seconds > current.seconds:
+                _slowest[view] = Statement(queries.slowest.seconds, queries.slowest.sql[:SQL_PREVIEW])
+
+
+def slowest_statements():
+    with _slowest_lock:
+        return dict(_slowest)
+
+
+def reset():
+    for histogram in HISTOGRAMS:
+        histogram.reset()
+    with _slowest_lock:
+        _slowest.clear()
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def _labels(pairs, **extra):
+    pairs = list(pairs) + list(extra.items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _gauge(name, help, samples, kind="gauge"):
+    """samples: (labels dict, value) pairs."""
+    yield f"# HELP {name} {help}"
+    yield f"# TYPE {name} {kind}"
+    for labels, value in samples:
+        yield f"{name}{_labels(labels.items())} {_number(value)}"
+
+
+def _app_lines():
+    for histogram in HISTOGRAMS:
+        yield from histogram.lines()
+    yield from _gauge(
+        "league_view_slowest_query_seconds", "Slowest SQL statement seen per view (sampled requests).",
+        [({"view": view}, s.seconds) for view, s in sorted(slowest_statements().items())],
+    )
+
+    stats = cache.stats()
+    yield from _gauge(
+        "league_fragment_cache_lookups_total", "Fragment cache lookups.",
+        [({"result": "hit"}, stats["hits"]), ({"result": "miss"}, stats["misses"])], kind="counter",
+    )
+
+    queue = jobs.metrics()
+    yield from _gauge(
+        "league_jobs", "Background jobs per status.",
+        [({"status": status}, n) for status, n in queue["by_status"].items()],
+    )
+    yield from _gauge("league_jobs_oldest_due_seconds", "Age of the oldest job waiting to run.",
+                      [({}, queue["oldest_due_seconds"])])
+    for name, help in (("wait", "queued to started"), ("run", "started to finished")):
+        distribution = queue[f"{name}_seconds"]
+        yield from _gauge(
+            f"league_job_{name}_seconds", f"Job {help} time over the last finished jobs.",
+            [({"quantile": q}, distribution[key]) for q, key in (("0.5", "p50"), ("0.95", "p95"))
+             if distribution[key] is not None],
+        )
+
+
+def render():
+    """All metrics in the Prometheus text exposition format (0.0.4)."""
+    return "\n".join(_app_lines()) + "\n"
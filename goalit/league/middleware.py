@@ -0,0 +1,97 @@
+import logging
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.db import connection
+from django.utils.decorators import sync_and_async_middleware
+
+from . import metrics
+
+slow_log = logging.getLogger("league.slow_requests")
+
+
+# run through sync_to_async: the connection is that of the thread-sensitive thread
+def _install(recorder):
+    connection.execute_wrappers.append(recorder)
+
+
+def _uninstall(recorder):
+    connection.execute_wrappers.remove(recorder)
+
+
+@sync_and_async_middleware
+class RequestMetricsMiddleware:
+    """
+    Feeds league.metrics: duration of every request per view and, for the
+    LEAGUE_METRICS_SAMPLE_RATE share of requests, its query count, SQL time
+    and slowest statement. Only sampled requests pay for the per-query
+    execute_wrapper, so the slow-request log shows SQL for those alone.
+    Streaming responses are timed until the view returns, not while they stream.
+
+    Works in both handler modes, so under ASGI it doesn't push the async
+    views of league.async_api (or the SSE stream) into a thread.
+    execute_wrapper() only covers the connection of one thread. Under ASGI
+    the recorder is installed on the request's thread-sensitive thread,
+    where Django runs sync views and the async ORM (and sync_to_async
+    calls such as league.admission's writes) send their queries, so those
+    are all counted; queries made with thread_sensitive=False are not.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        queries = self.sample()
+        start = time.perf_counter()
+        if queries is None:
+            response = self.get_response(request)
+        else:
+            with connection.execute_wrapper(queries):
+                response = self.get_response(request)
+        self.record(request, response, time.perf_counter() - start, queries)
+        return response
+
+    async def __acall__(self, request):
+        queries = self.sample()
+        start = time.perf_counter()
+        if queries is None:
+            response = await self.get_response(request)
+        else:
+            await sync_to_async(_install)(queries)
+            try:
+                response = await self.get_response(request)
+            finally:
+                await sync_to_async(_uninstall)(queries)
+        self.record(request, response, time.perf_counter() - start, queries)
+        return response
+
+    def sample(self):
+        """A QueryRecorder for a sampled request, else None."""
+        return metrics.QueryRecorder() if random.random() < metrics.sample_rate() else None
+
+    def record(self, request, response, elapsed, queries):
+        match = request.resolver_match
+        if match is None:
+            view = "<unresolved>"
+        else:
+            view = match.view_name or f"{match.func.__module__}.{match.func.__qualname__}"
+        metrics.record(view, request.method, response.status_code, elapsed, queries)
+        if elapsed < metrics.slow_request_seconds():
+            return
+        if queries is None:
+            slow_log.warning(
+                "Slow request %s %s (%s) -> %s in %.0f ms (SQL not sampled)",
+                request.method, request.path, view, response.status_code, elapsed * 1000,
+            )
+        else:
+            slow_log.warning(
+                "Slow request %s %s (%s) -> %s in %.0f ms: %d queries, %.0f ms SQL; slowest (%.0f ms): %s",
+                request.method, request.path, view, response.status_code, elapsed * 1000, queries.count,
+                queries.seconds * 1000, queries.slowest.seconds * 1000, queries.slowest.sql[:metrics.SQL_PREVIEW],
+            )
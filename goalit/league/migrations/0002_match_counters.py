@@ -0,0 +1,35 @@
+# Generated by Django 5.2.5 on 2026-10-18 11:08
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def backfill_counters(apps, schema_editor):
+    Match = apps.get_model('league', 'Match')
+    matches = Match.objects.annotate(
+        going=Count('participations', filter=Q(participations__status='going')),
+        waiting=Count('participations', filter=Q(participations__status='waiting')),
+    )
+    for m in matches:
+        Match.objects.filter(pk=m.pk).update(going_count=m.going, waiting_count=m.waiting)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('league', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='match',
+            name='going_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='match',
+            name='waiting_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-18 11:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('league', '0002_match_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='matchparticipation',
+            name='waitlisted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='matchparticipation',
+            name='status',
+            field=models.CharField(choices=[('going', 'Going'), ('maybe', 'Maybe'), ('not_going', 'Not Going'), ('waiting', 'Waiting List')], default='going', max_length=20),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.5 on 2026-10-18 11:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('league', '0003_participation_waitlist'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='match',
+            index=models.Index(fields=['-date', '-time', 'id'], name='match_date_time_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='match',
+            index=models.Index(fields=['final_score', '-date', '-time'], name='match_final_date_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.5 on 2026-10-18 11:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('league', '0004_match_list_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Standing',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.DateField()),
+                ('points', models.IntegerField(default=0)),
+                ('matches_played', models.PositiveIntegerField(default=0)),
+                ('goals', models.PositiveIntegerField(default=0)),
+                ('assists', models.PositiveIntegerField(default=0)),
+                ('mvps', models.PositiveIntegerField(default=0)),
+                ('no_shows', models.PositiveIntegerField(default=0)),
+                ('player', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='standings', to='league.playerprofil')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['period'], name='standing_period_idx')],
+                'unique_together': {('player', 'period')},
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.5 on 2026-10-18 11:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('league', '0005_standing'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BadgeRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('watermark', models.DateTimeField()),
+                ('matches_processed', models.PositiveIntegerField(default=0)),
+                ('badges_awarded', models.PositiveIntegerField(default=0)),
+                ('badges_revoked', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='badge',
+            name='match',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='badges', to='league.match'),
+        ),
+        migrations.AddField(
+            model_name='match',
+            name='finalized_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='badge',
+            constraint=models.UniqueConstraint(condition=models.Q(('match__isnull', True)), fields=('player', 'badge_type', 'period_start'), name='unique_period_badge'),
+        ),
+        migrations.AddConstraint(
+            model_name='badge',
+            constraint=models.UniqueConstraint(condition=models.Q(('match__isnull', False)), fields=('player', 'badge_type', 'match'), name='unique_match_badge'),
+        ),
+    ]
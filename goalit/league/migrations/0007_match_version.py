@@ -0,0 +1,25 @@
+# Generated by Django 5.2.5 on 2026-10-18 11:31
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('league', '0006_badge_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='match',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+        migrations.AddField(
+            model_name='match',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.5 on 2026-10-18 11:30
+
+from django.conf import settings
+from django.db import migrations
+
+
+def backfill_profiles(apps, schema_editor):
+    # profiles used to be (re)provisioned on every User save; from now on only
+    # new users get one, so make sure every existing user already has it
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    PlayerProfil = apps.get_model('league', 'PlayerProfil')
+    missing = User.objects.filter(profile__isnull=True).values_list('pk', flat=True)
+    PlayerProfil.objects.bulk_create([PlayerProfil(user_id=pk) for pk in missing.iterator()], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('league', '0007_match_version'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_profiles, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.2.5 on 2026-10-18 11:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Q, Sum
+
+
+def backfill_ledger(apps, schema_editor):
+    # charge already finalized matches, and record the payments has_paid stood for
+    Match = apps.get_model('league', 'Match')
+    MatchParticipation = apps.get_model('league', 'MatchParticipation')
+    LedgerEntry = apps.get_model('league', 'LedgerEntry')
+    PlayerBalance = apps.get_model('league', 'PlayerBalance')
+
+    prices = dict(Match.objects.filter(final_score=True, price_per_player__gt=0).values_list('pk', 'price_per_player'))
+    entries = []
+    parts = MatchParticipation.objects.filter(Q(actually_played=True) | Q(no_show=True), match_id__in=list(prices))
+    for match_id, player_id, has_paid in parts.values_list('match_id', 'player_id', 'has_paid').iterator():
+        price = prices[match_id]
+        entries.append(LedgerEntry(player_id=player_id, match_id=match_id, kind='charge', amount=price))
+        if has_paid:
+            entries.append(LedgerEntry(player_id=player_id, match_id=match_id, kind='payment', amount=-price))
+    LedgerEntry.objects.bulk_create(entries, batch_size=500)
+
+    totals = LedgerEntry.objects.values('player_id').annotate(total=Sum('amount'))
+    PlayerBalance.objects.bulk_create(
+        [PlayerBalance(player_id=row['player_id'], balance=row['total']) for row in totals], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('league', '0008_backfill_profiles'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlayerBalance',
+            fields=[
+                ('player', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='balance', serialize=False, to='league.playerprofil')),
+                ('balance', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('balance__gt', 0)), fields=['-balance'], name='balance_debtors_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('charge', 'Charge'), ('payment', 'Payment'), ('refund', 'Refund'), ('adjustment', 'Adjustment')], max_length=20)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('note', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('match', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ledger_entries', to='league.match')),
+                ('player', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='ledger_entries', to='league.playerprofil')),
+                ('recorded_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='league.playerprofil')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['player', 'created_at'], name='ledger_player_idx'), models.Index(fields=['match', 'player'], name='ledger_match_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_ledger, migrations.RunPython.noop),
+    ]
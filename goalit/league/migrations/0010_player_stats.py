@@ -0,0 +1,27 @@
+# Generated by Django 5.2.5 on 2026-10-18 11:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('league', '0009_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlayerStats',
+            fields=[
+                ('player', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='league.playerprofil')),
+                ('points', models.IntegerField(default=0)),
+                ('matches_played', models.PositiveIntegerField(default=0)),
+                ('goals', models.PositiveIntegerField(default=0)),
+                ('assists', models.PositiveIntegerField(default=0)),
+                ('mvps', models.PositiveIntegerField(default=0)),
+                ('no_shows', models.PositiveIntegerField(default=0)),
+                ('last_played', models.DateField(blank=True, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,44 @@
+from django.db import migrations, transaction
+from django.db.utils import OperationalError
+
+# FTS5 tables of league.search, with their own copy of the text (rowid = the row's id)
+TABLES = {
+    'league_match_fts': ('league_match', 'title, location, notes'),
+    'league_matchcomment_fts': ('league_matchcomment', 'text'),
+}
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return  # league.search falls back to icontains
+    with connection.cursor() as cursor:
+        for table, (source, columns) in TABLES.items():
+            try:
+                with transaction.atomic(using=connection.alias):
+                    cursor.execute(
+                        f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5({columns}, "
+                        f"tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+                    )
+            except OperationalError:
+                return  # SQLite built without FTS5
+            cursor.execute(f"INSERT INTO {table} (rowid, {columns}) SELECT id, {columns} FROM {source}")
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for table in TABLES:
+            cursor.execute(f"DROP TABLE IF EXISTS {table}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('league', '0010_player_stats'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.5 on 2026-10-18 11:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('league', '0011_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='matchparticipation',
+            index=models.Index(fields=['match', 'status', 'id'], name='part_match_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='matchparticipation',
+            index=models.Index(condition=models.Q(('status', 'waiting')), fields=['match', 'waitlisted_at', 'id'], name='part_waitlist_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='matchparticipation',
+            index=models.Index(condition=models.Q(('has_paid', False)), fields=['-id'], name='part_unpaid_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('league', '0012_participation_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='matchcomment',
+            index=models.Index(fields=['match', 'created_at', 'id'], name='comment_match_created_idx'),
+        ),
+    ]
@@ -1,5 +1,7 @@
 from django.db import models
+from django.db.models import F, Q
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 class PlayerProfil(models.Model):
     position_choices = [('GK', 'Goalkeeper'),('DEF', 'Defender'),('MID', 'Midfielder'),('FW', 'Forward'),('ANY', 'Any'),]
@@ -13,6 +15,12 @@ class PlayerProfil(models.Model):
         return self.nickname or self.user.username
     
 
+class MatchQuerySet(models.QuerySet):
+    def touch(self, **changes):
+        """UPDATE these matches (with optional extra `changes`) and bump their version stamp."""
+        return self.update(version=F('version') + 1, updated_at=timezone.now(), **changes)
+
+
 class Match (models.Model):
     title = models.CharField(max_length=500, default='FRIENDLY MATCH')
     date = models.DateField()
@@ -23,17 +31,45 @@ class Match (models.Model):
     max_players = models.PositiveIntegerField(default=14)
     created_by = models.ForeignKey(PlayerProfil, on_delete=models.SET_NULL, null=True, related_name='created_matches')
     final_score = models.BooleanField(default=False)
+    finalized_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    # Denormalized counters, kept in sync by league.counters
+    going_count = models.PositiveIntegerField(default=0, editable=False)
+    waiting_count = models.PositiveIntegerField(default=0, editable=False)
+
+    # Bumped on every write to the match, its teams or its participations (drives ETags)
+    version = models.PositiveIntegerField(default=1, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = MatchQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # keyset pagination order of the match list API
+            models.Index(fields=["-date", "-time", "id"], name="match_date_time_id_idx"),
+            models.Index(fields=["final_score", "-date", "-time"], name="match_final_date_idx"),
+        ]
 
     def __str__(self):
         return f"{self.title} - {self.date} @ {self.time}"
-    
+
+    def save(self, *args, **kwargs):
+        # version only ever moves through touch() (see signals.bump_match_version):
+        # writing back the loaded value of a stale instance would reissue old ETags
+        if not self._state.adding and not kwargs.get("force_insert"):
+            fields = kwargs.get("update_fields")
+            if fields is None:
+                fields = [f.name for f in self._meta.concrete_fields if not f.primary_key]
+            kwargs["update_fields"] = [name for name in fields if name != "version"]
+        super().save(*args, **kwargs)
+
     @property
     def participants(self):
         return self.participations.filter(status='going')
 
     @property
     def confirmed_count(self):
-        return self.participants.count()
+        return self.going_count
     @property
     def status_label(self):
         return "Finalized" if self.final_score else "Open"
@@ -48,7 +84,7 @@ class Team(models.Model):
         return f"{self.name} ({self.match})"
     
 class MatchParticipation(models.Model):
-    STATUS_CHOICES = [('going', 'Going'),('maybe', 'Maybe'),('not_going', 'Not Going'),]
+    STATUS_CHOICES = [('going', 'Going'),('maybe', 'Maybe'),('not_going', 'Not Going'),('waiting', 'Waiting List'),]
 
     match = models.ForeignKey(Match, on_delete=models.CASCADE, related_name='participations')
     player = models.ForeignKey(PlayerProfil, on_delete=models.CASCADE, related_name='participations')
@@ -56,6 +92,7 @@ class MatchParticipation(models.Model):
 
     # Availability
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='going')
+    waitlisted_at = models.DateTimeField(null=True, blank=True)  # FIFO key while status is 'waiting'
     actually_played = models.BooleanField(default=False)  # checked after the match
     no_show = models.BooleanField(default=False)         # confirmed but didn’t come
 
@@ -69,11 +106,21 @@ class MatchParticipation(models.Model):
 
     class Meta:
         unique_together = ('match', 'player')
+        indexes = [
+            # a match's players by status (rosters, card prefetch, counters), in join order
+            models.Index(fields=['match', 'status', 'id'], name='part_match_status_idx'),
+            # a match's waitlist in FIFO order; only waiting rows are indexed
+            models.Index(fields=['match', 'waitlisted_at', 'id'], name='part_waitlist_idx',
+                         condition=Q(status='waiting')),
+            # unsettled fees, newest first (the admin's has_paid filter)
+            models.Index(fields=['-id'], name='part_unpaid_idx', condition=Q(has_paid=False)),
+        ]
 
     def __str__(self):
         return f"{self.player} @ {self.match}"
 
     def points_earned(self):
+        # SQL twin: league.standings.POINTS, keep both in sync
         if not self.actually_played:
             return -50 if self.no_show else 0  # penalty for no-show
 
@@ -88,6 +135,53 @@ class MatchParticipation(models.Model):
         return points
     
 
+class Standing(models.Model):
+    """Per-player, per-month totals of finalized matches, maintained by league.standings."""
+    player = models.ForeignKey(PlayerProfil, on_delete=models.CASCADE, related_name='standings')
+    period = models.DateField()  # first day of the month
+    points = models.IntegerField(default=0)
+    matches_played = models.PositiveIntegerField(default=0)
+    goals = models.PositiveIntegerField(default=0)
+    assists = models.PositiveIntegerField(default=0)
+    mvps = models.PositiveIntegerField(default=0)
+    no_shows = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('player', 'period')
+        indexes = [models.Index(fields=['period'], name='standing_period_idx')]
+
+    def __str__(self):
+        return f"{self.player} {self.period:%Y-%m}: {self.points}"
+
+
+class PlayerStats(models.Model):
+    """Career totals of a player over finalized matches, maintained by league.player_stats."""
+    player = models.OneToOneField(PlayerProfil, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    points = models.IntegerField(default=0)
+    matches_played = models.PositiveIntegerField(default=0)
+    goals = models.PositiveIntegerField(default=0)
+    assists = models.PositiveIntegerField(default=0)
+    mvps = models.PositiveIntegerField(default=0)
+    no_shows = models.PositiveIntegerField(default=0)
+    last_played = models.DateField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.player}: {self.matches_played} played, {self.points} pts"
+
+    @property
+    def committed(self):
+        """Finalized matches the player was expected at: played or no-show."""
+        return self.matches_played + self.no_shows
+
+    @property
+    def attendance_rate(self):
+        return self.matches_played / self.committed if self.committed else None
+
+    @property
+    def no_show_rate(self):
+        return self.no_shows / self.committed if self.committed else None
+
+
 class BadgeType(models.Model):
     code = models.CharField(max_length=50, unique=True)  
     name = models.CharField(max_length=100)              
@@ -102,25 +196,145 @@ class Badge(models.Model):
     awarded_at = models.DateTimeField(auto_now_add=True)
     period_start = models.DateField(null=True, blank=True)
     period_end = models.DateField(null=True, blank=True)
+    match = models.ForeignKey(Match, on_delete=models.CASCADE, null=True, blank=True, related_name='badges')  # single-match badges
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['player', 'badge_type', 'period_start'],
+                condition=models.Q(match__isnull=True),
+                name='unique_period_badge',
+            ),
+            models.UniqueConstraint(
+                fields=['player', 'badge_type', 'match'],
+                condition=models.Q(match__isnull=False),
+                name='unique_match_badge',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.badge_type} -> {self.player}"
 
+
+class BadgeRun(models.Model):
+    """One execution of the badge job; matches finalized up to `watermark` have been processed."""
+    watermark = models.DateTimeField()
+    matches_processed = models.PositiveIntegerField(default=0)
+    badges_awarded = models.PositiveIntegerField(default=0)
+    badges_revoked = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Badge run up to {self.watermark}"
+
+class LedgerEntry(models.Model):
+    """
+    One money movement, append-only: mistakes are corrected with a new
+    entry. `amount` is what it adds to the player's debt, so charges and
+    refunds are positive and payments negative. Maintained by league.ledger.
+    """
+    KIND_CHOICES = [('charge', 'Charge'), ('payment', 'Payment'), ('refund', 'Refund'), ('adjustment', 'Adjustment')]
+    player = models.ForeignKey(PlayerProfil, on_delete=models.PROTECT, related_name='ledger_entries')
+    match = models.ForeignKey(Match, on_delete=models.SET_NULL, null=True, blank=True, related_name='ledger_entries')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    note = models.CharField(max_length=255, blank=True)
+    recorded_by = models.ForeignKey(PlayerProfil, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['player', 'created_at'], name='ledger_player_idx'),
+            models.Index(fields=['match', 'player'], name='ledger_match_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Ledger entries are append-only.")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("Ledger entries are append-only.")
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.amount} for {self.player}"
+
+
+class PlayerBalance(models.Model):
+    """Running sum of a player's LedgerEntry amounts (positive: the player owes)."""
+    player = models.OneToOneField(PlayerProfil, on_delete=models.CASCADE, primary_key=True, related_name='balance')
+    balance = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['-balance'], name='balance_debtors_idx', condition=models.Q(balance__gt=0))]
+
+    def __str__(self):
+        return f"{self.player}: {self.balance}"
+
+
 class MatchComment(models.Model):
     match = models.ForeignKey(Match, on_delete=models.CASCADE, related_name='comments')
     author = models.ForeignKey(PlayerProfil, on_delete=models.SET_NULL, null=True, related_name='comments')
     text = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # a match's thread in posting order: keyset pages and "new since" polls are range scans
+            models.Index(fields=['match', 'created_at', 'id'], name='comment_match_created_idx'),
+        ]
+
     def __str__(self):
         return f"Comment by {self.author} on {self.match}"
 
 class MatchHighlight(models.Model):
+    STATUS_CHOICES = [('pending', 'Pending'), ('ready', 'Ready'), ('failed', 'Failed')]
+
     match = models.ForeignKey(Match, on_delete=models.CASCADE, related_name='highlights')
     added_by = models.ForeignKey(PlayerProfil, on_delete=models.SET_NULL, null=True, related_name='highlights')
     image = models.ImageField(upload_to='highlights/', blank=True, null=True)
     description = models.CharField(max_length=255, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Filled in by league.highlights: identical uploads share the original and its derivatives
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True)  # sha256 of the upload
+    width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending', editable=False)
+    # variant ("thumb.webp", "w640.jpg", ...) -> {"name", "url", "width", "height", "bytes"}
+    derivatives = models.JSONField(default=dict, blank=True, editable=False)
+    processed_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    def __str__(self):
+        return f"Highlight for {self.match}"
+
+
+class Job(models.Model):
+    """
+    A unit of deferred work, run by league.jobs after the transaction that
+    queued it commits. Rows outlive the process, so nothing queued is lost
+    on a restart; finished ones are kept for the queue metrics.
+    """
+    STATUS_CHOICES = [('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')]
+
+    kind = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            # the claim query: due jobs in order, without reading the finished ones
+            models.Index(fields=['run_after', 'id'], name='job_due_idx', condition=Q(status='queued')),
+            models.Index(fields=['status', 'finished_at'], name='job_status_idx'),
+        ]
+
     def __str__(self):
-        return f"Highlight for {self.match}"
\ No newline at end of file
+        return f"{self.kind} #{self.pk} ({self.status})"
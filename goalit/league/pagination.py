@@ -0,0 +1,139 @@
+import base64
+import datetime
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    # DjangoJSONEncoder cuts datetimes to milliseconds, a cursor needs the exact key
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Forward-only cursor pagination on a composite key.
+
+    Unlike DRF's CursorPagination (which positions on the first ordering
+    field and skips ties with an OFFSET), the cursor holds the full key of
+    the last row, so every page is a single range scan on an index that
+    matches `ordering`.
+    """
+    ordering = ("-id",)
+    page_size = 20
+    max_page_size = 100
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        rows = list(self.window(queryset, request))
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[: self.page_size]
+        return self.page
+
+    def window(self, queryset, request):
+        """The rows of the requested page, plus the one that tells whether there is a next page."""
+        queryset = queryset.order_by(*self.ordering)
+        cursor = self.decode_cursor(request)
+        if cursor is not None:
+            queryset = queryset.filter(self.after(cursor))
+        return queryset[: self.get_page_size(request) + 1]
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def after(self, cursor):
+        """Rows strictly after `cursor` in `ordering`, as a lexicographic Q."""
+        condition = Q()
+        equal = Q()
+        for field in self.ordering:
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            condition |= equal & Q(**{f"{name}__{lookup}": cursor[name]})
+            equal &= Q(**{name: cursor[name]})
+        return condition
+
+    def key(self, obj):
+        names = [field.lstrip("-") for field in self.ordering]
+        if isinstance(obj, dict):  # .values() querysets
+            return {name: obj[name] for name in names}
+        return {name: getattr(obj, name) for name in names}
+
+    def encode_cursor(self, obj):
+        raw = json.dumps(self.key(obj), cls=CursorEncoder)
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+        except (TypeError, ValueError):
+            raise NotFound("Invalid cursor.")
+        if not isinstance(cursor, dict) or set(cursor) != {f.lstrip("-") for f in self.ordering}:
+            raise NotFound("Invalid cursor.")
+        return cursor
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+
+class MatchCursorPagination(KeysetPagination):
+    ordering = ("-date", "-time", "id")
+
+
+class StandingsPagination(KeysetPagination):
+    ordering = ("-points", "player")
+    page_size = 50
+
+
+class DebtorsPagination(KeysetPagination):
+    ordering = ("-balance", "player_id")
+    page_size = 50
+
+
+class LedgerPagination(KeysetPagination):
+    ordering = ("-id",)
+    page_size = 50
+
+
+class CommentPagination(KeysetPagination):
+    # oldest first, the order a thread is read in
+    ordering = ("created_at", "id")
+    page_size = 50
+
+
+class HighlightPagination(KeysetPagination):
+    ordering = ("-id",)
+    page_size = 24
@@ -0,0 +1,73 @@
+"""
+Bulk creation of players (User + PlayerProfil) from a club roster.
+
+Rows are inserted with bulk_create in batches, so the User post_save
+receiver doesn't run and the profiles are created here instead. Password
+hashing is the expensive part of onboarding (hundreds of ms per password
+by design), so it is spread over a thread pool: the default PBKDF2 hasher
+runs in OpenSSL with the GIL released.
+"""
+import csv
+import io
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from .models import PlayerProfil
+
+USER_FIELDS = ["username", "email", "first_name", "last_name"]
+PROFILE_FIELDS = ["nickname", "preferred_position", "bio"]
+BATCH_SIZE = 500
+
+
+def parse(text, fmt):
+    """
+    Rows of a CSV (with a header line) or JSON (a list, or {"players": [...]})
+    roster as dicts. Blank CSV cells are dropped so defaults apply.
+    """
+    if fmt == "csv":
+        reader = csv.DictReader(io.StringIO(text))
+        return [
+            {key.strip(): value.strip() for key, value in row.items() if key and value and value.strip()}
+            for row in reader
+        ]
+    data = json.loads(text)
+    if isinstance(data, dict):
+        data = data.get("players", [])
+    if not isinstance(data, list):
+        raise ValueError("Expected a list of players.")
+    return data
+
+
+def hash_passwords(passwords, workers=None):
+    """make_password() for each entry, in parallel; None gives an unusable password."""
+    workers = workers or getattr(settings, "LEAGUE_IMPORT_HASH_WORKERS", None)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(make_password, passwords))
+
+
+@transaction.atomic
+def create_players(rows, batch_size=BATCH_SIZE, workers=None):
+    """
+    Create a user and a profile for each validated row (see
+    PlayerImportSerializer). Returns the new profiles.
+    """
+    hashed = hash_passwords([row.get("password") or None for row in rows], workers)
+    users = User.objects.bulk_create(
+        [
+            User(password=password, **{f: row[f] for f in USER_FIELDS if f in row})
+            for row, password in zip(rows, hashed)
+        ],
+        batch_size=batch_size,
+    )
+    return PlayerProfil.objects.bulk_create(
+        [
+            PlayerProfil(user=user, **{f: row[f] for f in PROFILE_FIELDS if f in row})
+            for row, user in zip(rows, users)
+        ],
+        batch_size=batch_size,
+    )
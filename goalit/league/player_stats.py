@@ -0,0 +1,71 @@
+"""
+Career totals per player (PlayerStats), so a profile costs one row read.
+
+Kept in step incrementally: finalizing a match adds that match's per-player
+totals (the same league.standings.TOTALS the monthly standings use).
+rebuild() recomputes everything from the finalized participations.
+"""
+from django.db import transaction
+from django.db.models import Max, Q
+
+from . import standings
+from .models import MatchParticipation, PlayerProfil, PlayerStats
+
+FIELDS = standings.FIELDS
+
+
+@transaction.atomic
+def apply_match(match, deltas=None):
+    """Add a just-finalized match to its players' career totals."""
+    if deltas is None:
+        deltas = standings.match_totals(match)
+    if not deltas:
+        return
+
+    existing = PlayerStats.objects.select_for_update().in_bulk(list(deltas))
+    to_create = []
+    for player_id, delta in deltas.items():
+        stats = existing.get(player_id)
+        if stats is None:
+            stats = PlayerStats(player_id=player_id, **delta)
+            to_create.append(stats)
+        else:
+            for field, value in delta.items():
+                setattr(stats, field, getattr(stats, field) + value)
+        if delta["matches_played"] and (stats.last_played is None or stats.last_played < match.date):
+            stats.last_played = match.date
+    if existing:
+        PlayerStats.objects.bulk_update(existing.values(), [*FIELDS, "last_played"])
+    if to_create:
+        PlayerStats.objects.bulk_create(to_create)
+
+
+@transaction.atomic
+def rebuild():
+    """Recompute every PlayerStats row from the finalized matches. Returns the row count."""
+    rows = (
+        MatchParticipation.objects.filter(match__final_score=True)
+        .values("player")
+        .annotate(last_played=Max("match__date", filter=Q(actually_played=True)), **standings.TOTALS)
+        .order_by()
+    )
+    PlayerStats.objects.all().delete()
+    created = PlayerStats.objects.bulk_create(
+        [
+            PlayerStats(player_id=row["player"], last_played=row["last_played"], **{f: row[f] for f in FIELDS})
+            for row in rows.iterator()
+        ],
+        batch_size=1000,
+    )
+    return len(created)
+
+
+def compare(player_ids):
+    """Stats of several players in the given order; players without finalized matches get zeros."""
+    found = PlayerStats.objects.select_related("player__user").in_bulk(player_ids)
+    missing = [pk for pk in player_ids if pk not in found]
+    if missing:
+        # only players who never played cost a second query
+        for player in PlayerProfil.objects.select_related("user").filter(pk__in=missing):
+            found[player.pk] = PlayerStats(player=player)
+    return [found[pk] for pk in player_ids if pk in found]
@@ -0,0 +1,100 @@
+"""
+EXPLAIN QUERY PLAN checks of the league's hot queries.
+
+Each entry of CRITICAL_QUERIES builds one ORM query the way the app runs
+it. check() reads SQLite's plan of each and reports the tables it would
+read end to end, and the queries no longer using the index built for
+them. Either means an index went missing or stopped matching its query,
+which the test suite and `check_query_plans` catch long before the table
+is big enough to feel it.
+"""
+import datetime
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from . import admission, ledger, standings
+from .models import LedgerEntry, Match, MatchComment, MatchParticipation
+
+# "SCAN league_match" is a full scan; "SCAN league_match USING INDEX ..." walks an index
+FULL_SCAN = re.compile(r"\bSCAN (\w+)(?! USING)\s*$")
+
+DAY = datetime.date(2025, 6, 1)
+
+
+CRITICAL_QUERIES = {
+    "match_list": lambda: Match.objects.order_by("-date", "-time", "id")[:20],
+    "open_matches": lambda: Match.objects.filter(final_score=False).order_by("-date", "-time")[:20],
+    "going_roster": lambda: MatchParticipation.objects.filter(match_id=1, status="going").order_by("id"),
+    # the list page's card prefetch, for a page of matches
+    "going_cards": lambda: MatchParticipation.objects.filter(match_id__in=[1, 2, 3], status="going").order_by("id"),
+    "participation_lookup": lambda: MatchParticipation.objects.filter(match_id=1, player_id=1),
+    "waitlist_head": lambda: admission.waitlist(1)[:1],
+    "player_history": lambda: MatchParticipation.objects.filter(player_id=1).order_by("-match__date"),
+    "admin_unpaid": lambda: MatchParticipation.objects.filter(has_paid=False).order_by("-pk")[:100],
+    "admin_match_date": lambda: MatchParticipation.objects.filter(
+        match__date__gte=DAY, match__date__lt=DAY + datetime.timedelta(days=7)
+    ).order_by("-pk")[:100],
+    "unpaid_of_match": lambda: MatchParticipation.objects.filter(match_id=1, has_paid=False),
+    "month_leaderboard": lambda: standings.leaderboard(DAY, DAY.replace(day=30)),
+    # windows that aren't whole months can't use Standing: the window's finalized matches, then their rows
+    "window_leaderboard": lambda: standings.leaderboard(DAY.replace(day=3), DAY.replace(day=17)),
+    "debtors": lambda: ledger.debtors()[:50],
+    "player_ledger": lambda: LedgerEntry.objects.filter(player_id=1).order_by("-id")[:50],
+    "comment_page": lambda: MatchComment.objects.filter(match_id=1).order_by("created_at", "id")[:51],
+    "comments_since": lambda: MatchComment.objects.filter(
+        Q(created_at__gt=DAY) | Q(created_at=DAY, id__gt=1), match_id=1
+    ).order_by("created_at", "id")[:100],
+}
+
+
+# queries that must keep using the index built for them (or one of several, as SQLite's statistics decide)
+EXPECTED_INDEXES = {
+    "match_list": "match_date_time_id_idx",
+    "going_roster": "part_match_status_idx",
+    "going_cards": "part_match_status_idx",
+    "participation_lookup": "league_matchparticipation_match_id_player_id",
+    "waitlist_head": "part_waitlist_idx",
+    "admin_unpaid": "part_unpaid_idx",
+    "window_leaderboard": ("match_date_time_id_idx", "match_final_date_idx"),
+    "debtors": "balance_debtors_idx",
+    "comment_page": "comment_match_created_idx",
+    "comments_since": "comment_match_created_idx",
+}
+
+
+def plan(queryset):
+    """SQLite's EXPLAIN QUERY PLAN of a queryset, one step per line."""
+    return queryset.explain().splitlines()
+
+
+def _full_scan(line):
+    match = FULL_SCAN.search(line)
+    return match.group(1) if match else None
+
+
+def full_scans(queryset):
+    """Tables the query reads end to end (empty when every table is reached through an index)."""
+    return [table for line in plan(queryset) if (table := _full_scan(line))]
+
+
+def check(queries=None):
+    """
+    name -> (problems, plan) of every critical query that does a full table
+    scan or no longer uses its EXPECTED_INDEXES entry.
+    """
+    if connection.vendor != "sqlite":
+        raise ValueError("Query plan checks read SQLite's EXPLAIN QUERY PLAN output.")
+    failures = {}
+    for name, build in (queries or CRITICAL_QUERIES).items():
+        steps = plan(build())
+        problems = [f"full scan of {table}" for line in steps if (table := _full_scan(line))]
+        expected = EXPECTED_INDEXES.get(name)
+        if isinstance(expected, str):
+            expected = (expected,)
+        if expected and not any(index in line for index in expected for line in steps):
+            problems.append(f"not using {' or '.join(expected)}")
+        if problems:
+            failures[name] = (problems, steps)
+    return failures
@@ -0,0 +1,167 @@
+"""
+Full-text search over matches and comments, backed by SQLite FTS5.
+
+Each searchable model has an FTS5 table keyed by the row's id (created by
+migration 0011 when the SQLite build has FTS5). The signals in
+league.signals keep it in step on save/delete; bulk writes (seeding)
+call rebuild() once at the end instead. Queries are ranked with bm25 and
+every term matches as a prefix, so "riv par" finds "Riverside Park".
+
+Without FTS5 (another database, an SQLite built without it, or
+LEAGUE_SEARCH_FTS = False) search falls back to icontains filters: same
+results for whole words, unranked and a table scan.
+"""
+import re
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Match, MatchComment
+
+MAX_TERMS = 10
+LIMIT = 20
+
+
+@dataclass
+class Index:
+    table: str
+    columns: tuple  # indexed model fields, in FTS column order
+    weights: tuple  # bm25 weight of each column
+    model: object
+    ordering: tuple  # order of the icontains fallback
+
+    def document(self, instance):
+        return [instance.pk, *(getattr(instance, column) or "" for column in self.columns)]
+
+
+INDEXES = {
+    "matches": Index("league_match_fts", ("title", "location", "notes"), (10.0, 4.0, 1.0), Match, ("-date", "-time")),
+    "comments": Index("league_matchcomment_fts", ("text",), (1.0,), MatchComment, ("-created_at",)),
+}
+BY_MODEL = {index.model: index for index in INDEXES.values()}
+
+_available = {}
+
+
+def available():
+    """True when the FTS5 tables exist in the default database."""
+    if not getattr(settings, "LEAGUE_SEARCH_FTS", True) or connection.vendor != "sqlite":
+        return False
+    name = connection.settings_dict["NAME"]
+    if name not in _available:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT count(*) FROM sqlite_master WHERE type = 'table' AND name IN (%s, %s)",
+                [index.table for index in INDEXES.values()],
+            )
+            _available[name] = cursor.fetchone()[0] == len(INDEXES)
+    return _available[name]
+
+
+def terms(text):
+    """The words of a search box input (at most MAX_TERMS)."""
+    return re.findall(r"\w+", text or "")[:MAX_TERMS]
+
+
+def fts_query(words):
+    """An FTS5 MATCH expression requiring every word as a prefix; the words are quoted, never parsed."""
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def index(instance):
+    """Add or refresh one row in its FTS table."""
+    if not available():
+        return
+    idx = BY_MODEL[type(instance)]
+    placeholders = ", ".join(["%s"] * (len(idx.columns) + 1))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT OR REPLACE INTO {idx.table} (rowid, {', '.join(idx.columns)}) VALUES ({placeholders})",
+            idx.document(instance),
+        )
+
+
+def unindex(instance):
+    """Drop one row from its FTS table; a match takes its comments along (call it before the delete)."""
+    if not available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {BY_MODEL[type(instance)].table} WHERE rowid = %s", [instance.pk])
+        if isinstance(instance, Match):
+            comments = INDEXES["comments"]
+            cursor.execute(
+                f"DELETE FROM {comments.table} WHERE rowid IN "
+                f"(SELECT id FROM {comments.model._meta.db_table} WHERE match_id = %s)",
+                [instance.pk],
+            )
+
+
+def rebuild():
+    """Refill every FTS table from its model table. Returns {kind: rows indexed}."""
+    counts = {}
+    if not available():
+        return counts
+    with connection.cursor() as cursor:
+        for kind, idx in INDEXES.items():
+            columns = ", ".join(idx.columns)
+            cursor.execute(f"DELETE FROM {idx.table}")
+            cursor.execute(
+                f"INSERT INTO {idx.table} (rowid, {columns}) SELECT id, {columns} FROM {idx.model._meta.db_table}"
+            )
+            counts[kind] = cursor.rowcount
+            cursor.execute(f"INSERT INTO {idx.table} ({idx.table}) VALUES ('optimize')")
+    return counts
+
+
+def matching(kind, words):
+    """
+    Filter for `kind`: a Q selecting the rows that contain
+    every word (FTS5 when available, else icontains on each column).
+    """
+    idx = INDEXES[kind]
+    if available():
+        return Q(pk__in=RawSQL(f"SELECT rowid FROM {idx.table} WHERE {idx.table} MATCH %s", [fts_query(words)]))
+    condition = Q()
+    for word in words:
+        any_column = Q()
+        for column in idx.columns:
+            any_column |= Q(**{f"{column}__icontains": word})
+        condition &= any_column
+    return condition
+
+
+def search(kind, words, queryset=None, limit=LIMIT):
+    """
+    Best `limit` rows of `kind` containing every word, as instances from
+    `queryset` with a `snippet` attribute (the matching text, hits in
+    [brackets]; None on the fallback path). Ranked by bm25, or newest first
+    on the fallback.
+    """
+    idx = INDEXES[kind]
+    queryset = idx.model.objects.all() if queryset is None else queryset
+    if not words:
+        return []
+    if not available():
+        hits = list(queryset.filter(matching(kind, words)).order_by(*idx.ordering)[:limit])
+        for hit in hits:
+            hit.snippet = None
+        return hits
+
+    weights = ", ".join(str(w) for w in idx.weights)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid, snippet({idx.table}, -1, '[', ']', '…', 12) FROM {idx.table} "
+            f"WHERE {idx.table} MATCH %s ORDER BY bm25({idx.table}, {weights}) LIMIT %s",
+            [fts_query(words), limit],
+        )
+        ranked = cursor.fetchall()
+    found = queryset.in_bulk([pk for pk, _ in ranked])
+    hits = []
+    for pk, snippet in ranked:
+        if pk in found:
+            found[pk].snippet = snippet
+            hits.append(found[pk])
+    return hits
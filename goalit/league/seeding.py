@@ -0,0 +1,151 @@
+"""
+Synthetic league data for benchmarks and local load testing.
+
+Everything is written with bulk_create in batches, so neither the model
+signals nor the per-row counter/version bookkeeping run; the stored
+counters, the standings and the search index are rebuilt once at the end instead.
+"""
+import datetime
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from . import ledger, player_stats, search, standings
+from .counters import recount_matches
+from .models import LedgerEntry, Match, MatchParticipation, PlayerProfil, Team
+
+POSITIONS = ["GK", "DEF", "MID", "FW", "ANY"]
+LOCATIONS = ["Arena", "City Park", "North Field", "Riverside", "Indoor Hall"]
+TEAM_NAMES = ["Red", "Blue"]
+
+
+def _batches(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def seed_players(count, prefix="seed", password="benchmark", batch_size=1000):
+    """
+    Create `count` users with profiles. Usernames taken by an earlier run
+    with the same prefix are skipped. Returns the new profiles.
+    """
+    hashed = make_password(password)  # hashing is the slow part, do it once
+    taken = set(User.objects.filter(username__startswith=prefix).values_list("username", flat=True))
+    names = [(i, f"{prefix}{i:06d}") for i in range(count)]
+    names = [(i, name) for i, name in names if name not in taken]
+    for batch in _batches(names, batch_size):
+        User.objects.bulk_create(
+            # the first one doubles as the club treasurer (staff), for the staff-only endpoints
+            [User(username=name, password=hashed, is_staff=i == 0) for i, name in batch],
+            batch_size=batch_size,
+        )
+    users = User.objects.filter(username__startswith=prefix, profile__isnull=True).order_by("id")
+    rng = random.Random(count)
+    return PlayerProfil.objects.bulk_create(
+        [PlayerProfil(user=user, preferred_position=rng.choice(POSITIONS)) for user in users.iterator()],
+        batch_size=batch_size,
+    )
+
+
+def _roster(rng, match, players, finalized):
+    """Participations (unsaved) for one match: a full or partial roster, a waitlist and a few undecided."""
+    size = rng.randint(match.max_players // 2, match.max_players + 4)
+    picked = rng.sample(players, min(size + 3, len(players)))
+    now = timezone.now()
+    parts = []
+    for n, player in enumerate(picked):
+        if n < match.max_players and n < size:
+            status = "going"
+        elif n < size:
+            status = "waiting"
+        else:
+            status = rng.choice(["maybe", "not_going"])
+        part = MatchParticipation(match=match, player=player, status=status)
+        if status == "waiting":
+            part.waitlisted_at = now + datetime.timedelta(microseconds=n)
+        if finalized and status == "going":
+            part.actually_played = rng.random() > 0.1
+            part.no_show = not part.actually_played
+            if part.actually_played:
+                part.goals = rng.choices(range(5), weights=[50, 25, 13, 8, 4])[0]
+                part.assists = rng.choices(range(4), weights=[55, 30, 10, 5])[0]
+            part.has_paid = rng.random() > 0.2
+        parts.append(part)
+    return parts
+
+
+def _fees(parts):
+    """Charges (and payments, for has_paid) of finalized matches, as ledger.charge_match would post them."""
+    entries = []
+    for part in parts:
+        match = part.match
+        if not (match.final_score and match.price_per_player and (part.actually_played or part.no_show)):
+            continue
+        price = match.price_per_player
+        entries.append(LedgerEntry(player=part.player, match=match, kind="charge", amount=price))
+        if part.has_paid:
+            entries.append(LedgerEntry(player=part.player, match=match, kind="payment", amount=-price))
+    return entries
+
+
+@transaction.atomic
+def seed_matches(count, players, finalized_share=0.7, days=365, seed=0, batch_size=500):
+    """
+    Create `count` matches spread over the last `days` days (plus a few
+    upcoming ones), each with two teams and a roster drawn from `players`.
+    The oldest `finalized_share` of them are finalized with random results.
+    Returns (matches, participations) created.
+    """
+    rng = random.Random(seed)
+    today = timezone.localdate()
+    created_matches = created_parts = 0
+
+    for batch in _batches(range(count), batch_size):
+        matches = []
+        for i in batch:
+            age = days * (count - i) // count - days // 10  # the newest tenth lies in the future
+            finalized = i < count * finalized_share and age > 0
+            matches.append(Match(
+                date=today - datetime.timedelta(days=age),
+                time=datetime.time(rng.choice([18, 19, 20, 21]), rng.choice([0, 30])),
+                location=rng.choice(LOCATIONS),
+                price_per_player=rng.choice([None, 5, 8, 10]),
+                max_players=rng.choice([10, 12, 14]),
+                created_by=rng.choice(players),
+                final_score=finalized,
+                finalized_at=timezone.now() if finalized else None,
+            ))
+        matches = Match.objects.bulk_create(matches)
+
+        teams = Team.objects.bulk_create([
+            Team(match=match, name=name, score=rng.randint(0, 8) if match.final_score else 0)
+            for match in matches for name in TEAM_NAMES
+        ])
+        teams_by_match = {}
+        for team in teams:
+            teams_by_match.setdefault(team.match_id, []).append(team)
+
+        parts = []
+        for match in matches:
+            roster = _roster(rng, match, players, match.final_score)
+            for n, part in enumerate(p for p in roster if p.status == "going"):
+                part.team = teams_by_match[match.pk][n % len(TEAM_NAMES)]
+            played = [p for p in roster if p.actually_played]
+            if played:
+                rng.choice(played).is_mvp = True
+            parts.extend(roster)
+        MatchParticipation.objects.bulk_create(parts, batch_size=batch_size)
+        LedgerEntry.objects.bulk_create(_fees(parts), batch_size=batch_size)
+
+        created_matches += len(matches)
+        created_parts += len(parts)
+
+    recount_matches()
+    standings.rebuild()
+    player_stats.rebuild()
+    ledger.rebuild_balances()
+    search.rebuild()
+    return created_matches, created_parts
@@ -1,5 +1,9 @@
+from django.conf import settings
+from django.contrib.auth.models import User
 from rest_framework import serializers
-from .models import PlayerProfil, Match, Team, MatchParticipation
+from rest_framework.settings import api_settings
+from .models import PlayerProfil, Match, Team, MatchParticipation, LedgerEntry, MatchComment, MatchHighlight, PlayerBalance, PlayerStats
+from . import admission, finalization, ledger, player_import
 
 
 class PlayerProfilSerializer(serializers.ModelSerializer):
@@ -18,7 +22,7 @@ class TeamSerializer(serializers.ModelSerializer):
 
 class MatchSerializer(serializers.ModelSerializer):
     created_by = PlayerProfilSerializer(read_only=True)
-    confirmed_count = serializers.SerializerMethodField()
+    confirmed_count = serializers.IntegerField(source="going_count", read_only=True)
     teams = TeamSerializer(many=True, read_only=True)
 
     class Meta:
@@ -35,13 +39,10 @@ class MatchSerializer(serializers.ModelSerializer):
             "final_score",
             "created_by",
             "confirmed_count",
+            "waiting_count",
             "teams",
         ]
 
-    def get_confirmed_count(self, obj):
-        return obj.confirmed_count
-   
-
 
 
 class MatchParticipationSerializer(serializers.ModelSerializer):
@@ -56,6 +57,7 @@ class MatchParticipationSerializer(serializers.ModelSerializer):
             "player",
             "team",
             "status",
+            "waitlisted_at",
             "actually_played",
             "no_show",
             "goals",
@@ -63,8 +65,351 @@ class MatchParticipationSerializer(serializers.ModelSerializer):
             "is_mvp",
             "has_paid",
         ]
-        read_only_fields = ["match", "player", "team"]
+        read_only_fields = ["match", "player", "team", "waitlisted_at"]
 
 status = serializers.SerializerMethodField()
 def get_status(self, obj):
     return "finalized" if obj.final_score else "open"
+
+
+class StandingSerializer(serializers.Serializer):
+    player = serializers.IntegerField()
+    username = serializers.CharField()
+    nickname = serializers.CharField()
+    points = serializers.IntegerField()
+    matches_played = serializers.IntegerField()
+    goals = serializers.IntegerField()
+    assists = serializers.IntegerField()
+    mvps = serializers.IntegerField()
+    no_shows = serializers.IntegerField()
+
+
+class PlayerStatsSerializer(serializers.ModelSerializer):
+    username = serializers.CharField(source="player.user.username", read_only=True)
+    nickname = serializers.CharField(source="player.nickname", read_only=True)
+    committed = serializers.IntegerField(read_only=True)
+    attendance_rate = serializers.FloatField(read_only=True)
+    no_show_rate = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = PlayerStats
+        fields = [
+            "player", "username", "nickname", "points", "matches_played", "goals", "assists", "mvps",
+            "no_shows", "committed", "attendance_rate", "no_show_rate", "last_played",
+        ]
+
+
+class MatchHitSerializer(serializers.ModelSerializer):
+    snippet = serializers.CharField(read_only=True, allow_null=True)
+
+    class Meta:
+        model = Match
+        fields = ["id", "title", "date", "time", "location", "final_score", "snippet"]
+
+
+class CommentHitSerializer(serializers.ModelSerializer):
+    author = serializers.CharField(source="author.user.username", read_only=True, default=None)
+    match_title = serializers.CharField(source="match.title", read_only=True)
+    snippet = serializers.CharField(read_only=True, allow_null=True)
+
+    class Meta:
+        model = MatchComment
+        fields = ["id", "match", "match_title", "author", "created_at", "snippet"]
+
+
+class CommentSerializer(serializers.ModelSerializer):
+    author = serializers.CharField(source="author.user.username", read_only=True, default=None)
+    nickname = serializers.CharField(source="author.nickname", read_only=True, default=None)
+    text = serializers.CharField(max_length=2000, trim_whitespace=True)
+
+    class Meta:
+        model = MatchComment
+        fields = ["id", "match", "author", "nickname", "text", "created_at"]
+        read_only_fields = ["match", "created_at"]
+
+
+class HighlightSerializer(serializers.ModelSerializer):
+    added_by = serializers.CharField(source="added_by.user.username", read_only=True, default=None)
+    thumb = serializers.SerializerMethodField()
+    variants = serializers.SerializerMethodField()
+    original = serializers.SerializerMethodField()
+
+    class Meta:
+        model = MatchHighlight
+        fields = [
+            "id", "match", "added_by", "description", "created_at", "status", "width", "height",
+            "thumb", "variants", "original",
+        ]
+
+    @staticmethod
+    def _public(key, derivative):
+        return {"variant": key, **{k: v for k, v in derivative.items() if k != "name"}}
+
+    def get_thumb(self, obj):
+        thumb = obj.derivatives.get("thumb.webp")
+        return self._public("thumb.webp", thumb) if thumb else None
+
+    def get_variants(self, obj):
+        return [self._public(key, d) for key, d in obj.derivatives.items() if not key.startswith("thumb.")]
+
+    def get_original(self, obj):
+        return obj.image.url if obj.image else None
+
+
+class HighlightUploadSerializer(serializers.Serializer):
+    image = serializers.ImageField()
+    description = serializers.CharField(max_length=255, required=False, allow_blank=True, default="")
+
+    def validate_image(self, image):
+        limit = getattr(settings, "LEAGUE_HIGHLIGHT_MAX_BYTES", 15 * 1024 * 1024)
+        if image.size > limit:
+            raise serializers.ValidationError(f"Images are limited to {limit // (1024 * 1024)} MB.")
+        return image
+
+
+def check_ids(items, found, label):
+    """Reject duplicate ids in `items` and ids missing from `found` (the match's own rows)."""
+    ids = [item["id"] for item in items]
+    if len(ids) != len(set(ids)):
+        raise serializers.ValidationError(f"Duplicate {label} ids.")
+    unknown = sorted(set(ids) - set(found))
+    if unknown:
+        raise serializers.ValidationError(f"Unknown {label} ids for this match: {unknown}")
+
+
+class TeamScoreSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    score = serializers.IntegerField(min_value=0)
+
+
+class PlayerResultSerializer(serializers.Serializer):
+    # no defaults: a field left out keeps the participation's current value
+    id = serializers.IntegerField(help_text="MatchParticipation id")
+    played = serializers.BooleanField(source="actually_played", required=False)
+    no_show = serializers.BooleanField(required=False)
+    goals = serializers.IntegerField(min_value=0, required=False)
+    assists = serializers.IntegerField(min_value=0, required=False)
+    is_mvp = serializers.BooleanField(required=False)
+    has_paid = serializers.BooleanField(required=False)
+
+
+def check_result(result):
+    """Consistency of one player's result (current values merged with the new ones)."""
+    if result["actually_played"] and result["no_show"]:
+        raise serializers.ValidationError("A player can't both play and be a no-show.")
+    if not result["actually_played"] and (result["goals"] or result["assists"] or result["is_mvp"]):
+        raise serializers.ValidationError("Only players who played can have goals, assists or MVP.")
+
+
+class FinalizeMatchSerializer(serializers.Serializer):
+    """
+    Whole result of a match in one document:
+    {"teams": [{"id", "score"}], "players": [{"id", "played", "no_show", "goals", "assists", "is_mvp", "has_paid"}]}
+    Players left out, and the fields left out of a player, keep their current values.
+    """
+    teams = TeamScoreSerializer(many=True, required=False, default=list)
+    players = PlayerResultSerializer(many=True, required=False, default=list)
+
+    def validate_teams(self, teams):
+        # match.teams is usually prefetched, so this reuses those instances
+        self.team_objects = {team.pk: team for team in self.context["match"].teams.all()}
+        check_ids(teams, self.team_objects, "team")
+        return teams
+
+    def validate_players(self, players):
+        self.participation_objects = self.context["match"].participations.in_bulk([p["id"] for p in players])
+        check_ids(players, self.participation_objects, "participation")
+        results, errors = [], []
+        for item in players:
+            part = self.participation_objects[item["id"]]
+            result = {field: item.get(field, getattr(part, field)) for field in finalization.RESULT_FIELDS}
+            try:
+                check_result(result)
+                errors.append({})
+            except serializers.ValidationError as exc:  # same shape as a nested serializer's validate()
+                errors.append({api_settings.NON_FIELD_ERRORS_KEY: exc.detail})
+            results.append(result)
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        if sum(r["is_mvp"] for r in results) > 1:
+            raise serializers.ValidationError("Only one MVP per match.")
+        return players
+
+    def save(self):
+        teams = []
+        for item in self.validated_data["teams"]:
+            team = self.team_objects[item["id"]]
+            team.score = item["score"]
+            teams.append(team)
+
+        participations = []
+        for item in self.validated_data["players"]:
+            part = self.participation_objects[item["id"]]
+            for field in finalization.RESULT_FIELDS:
+                if field in item:
+                    setattr(part, field, item[field])
+            participations.append(part)
+
+        return finalization.finalize(self.context["match"], teams, participations)
+
+
+class LineupEntrySerializer(serializers.Serializer):
+    id = serializers.IntegerField(help_text="MatchParticipation id")
+    team = serializers.IntegerField(allow_null=True, help_text="Team id, null for no team")
+    status = serializers.ChoiceField(choices=admission.SELF_SERVICE_STATUSES, required=False)
+
+
+class LineupSerializer(serializers.Serializer):
+    """
+    Team assignment of a match as one document:
+    {"players": [{"id", "team", "status"?}]}. Players left out keep their
+    team and status.
+    """
+    players = LineupEntrySerializer(many=True, allow_empty=False)
+
+    def validate_players(self, players):
+        match = self.context["match"]
+        # match.teams is usually prefetched, so validation costs the one participations query
+        teams = {team.pk: team for team in match.teams.all()}
+        unknown = sorted({p["team"] for p in players if p["team"] is not None} - set(teams))
+        if unknown:
+            raise serializers.ValidationError(f"Unknown team ids for this match: {unknown}")
+        self.participation_objects = match.participations.in_bulk([p["id"] for p in players])
+        check_ids(players, self.participation_objects, "participation")
+
+        going = match.going_count
+        for item in players:
+            old = self.participation_objects[item["id"]].status
+            new = item.get("status", old)
+            going += (new == "going") - (old == "going")
+        if going > match.max_players:
+            raise serializers.ValidationError(f"Only {match.max_players} players can be going.")
+        self.teams = teams
+        return players
+
+    def save(self):
+        participations = []
+        statuses_changed = False
+        for item in self.validated_data["players"]:
+            part = self.participation_objects[item["id"]]
+            part.team = self.teams.get(item["team"])
+            status = item.get("status", part.status)
+            if status != part.status:
+                part.status = status
+                part.waitlisted_at = None
+                statuses_changed = True
+            participations.append(part)
+        return admission.set_lineup(self.context["match"], participations, statuses_changed)
+
+
+class PlayerRowSerializer(serializers.Serializer):
+    username = serializers.RegexField(r"^[\w.@+-]+\Z", max_length=150)
+    email = serializers.EmailField(required=False, allow_blank=True)
+    password = serializers.CharField(required=False, allow_blank=True, write_only=True)
+    first_name = serializers.CharField(required=False, allow_blank=True, max_length=150)
+    last_name = serializers.CharField(required=False, allow_blank=True, max_length=150)
+    nickname = serializers.CharField(required=False, allow_blank=True, max_length=50)
+    preferred_position = serializers.ChoiceField(choices=PlayerProfil.position_choices, required=False)
+    bio = serializers.CharField(required=False, allow_blank=True)
+
+
+class PlayerImportSerializer(serializers.Serializer):
+    """
+    A roster to create in bulk: {"players": [{"username", "email", "password", ...}]}.
+    Rows without a password get an unusable one (password reset flow).
+    Nothing is created unless every row is valid.
+    """
+    players = PlayerRowSerializer(many=True, allow_empty=False)
+
+    def validate_players(self, players):
+        usernames = [p["username"] for p in players]
+        taken = set()
+        for start in range(0, len(usernames), player_import.BATCH_SIZE):
+            taken.update(
+                User.objects.filter(username__in=usernames[start:start + player_import.BATCH_SIZE])
+                .values_list("username", flat=True)
+            )
+        seen = set()
+        errors = []
+        for name in usernames:
+            if name in taken:
+                errors.append({"username": ["A user with that username already exists."]})
+            elif name in seen:
+                errors.append({"username": ["Duplicate username in this import."]})
+            else:
+                errors.append({})
+            seen.add(name)
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return players
+
+    def save(self, **kwargs):
+        return player_import.create_players(self.validated_data["players"], **kwargs)
+
+
+class LedgerEntrySerializer(serializers.ModelSerializer):
+    """
+    Read: any entry. Write: a payment or refund (positive amount of money
+    moved) or an adjustment (signed change of the debt); charges only come
+    from finalizing a match.
+    """
+    kind = serializers.ChoiceField(choices=["payment", "refund", "adjustment"])
+
+    class Meta:
+        model = LedgerEntry
+        fields = ["id", "player", "match", "kind", "amount", "note", "recorded_by", "created_at"]
+        read_only_fields = ["recorded_by", "created_at"]
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        data["kind"] = instance.kind  # reads include charges
+        return data
+
+    def validate(self, data):
+        if data["kind"] == "adjustment":
+            if not data["amount"]:
+                raise serializers.ValidationError({"amount": "An adjustment can't be zero."})
+        elif data["amount"] <= 0:
+            raise serializers.ValidationError({"amount": "Enter the (positive) amount of money moved."})
+        return data
+
+    def create(self, validated_data):
+        return ledger.record(**validated_data)
+
+
+class MarkPaidSerializer(serializers.Serializer):
+    participations = serializers.ListField(child=serializers.IntegerField(), allow_empty=False, max_length=500)
+    note = serializers.CharField(required=False, allow_blank=True, max_length=255, default="")
+
+
+class PlayerBalanceSerializer(serializers.ModelSerializer):
+    username = serializers.CharField(source="player.user.username", read_only=True)
+    nickname = serializers.CharField(source="player.nickname", read_only=True)
+
+    class Meta:
+        model = PlayerBalance
+        fields = ["player", "username", "nickname", "balance", "updated_at"]
+
+
+def _money(**kwargs):
+    return serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True, **kwargs)
+
+
+class BalanceSerializer(serializers.Serializer):
+    player = serializers.IntegerField(read_only=True)
+    balance = _money()
+
+
+class OwedSerializer(serializers.Serializer):
+    player = serializers.IntegerField(read_only=True)
+    owed = _money()
+
+
+class MatchPaymentsSerializer(serializers.Serializer):
+    """league.ledger.match_summary() of one match."""
+    charged = _money()
+    paid = _money()
+    refunded = _money()
+    adjusted = _money()
+    outstanding = _money()
+    unpaid = OwedSerializer(many=True, read_only=True)
@@ -0,0 +1,166 @@
+"""
+Concurrent-request capacity of the match API under WSGI and ASGI.
+
+Drives Django's own handlers in process, so both runs share the same
+hardware, database and middleware:
+
+- WSGI: WSGIHandler behind a fixed pool of `workers` threads, like a
+  threaded WSGI server; requests beyond the pool queue for a free thread.
+- ASGI: ASGIHandler on one event loop with goalit.asgi_urls, so the hot
+  paths run the async views of league.async_api; all requests are in
+  flight at once.
+
+A burst of `requests` GETs of /api/matches/<pk>/participants/ is sent,
+at most `concurrency` at a time. Latency is measured from the moment a
+request is issued, so WSGI queueing shows up in it. `db_latency_ms` adds a
+sleep to each SQL query, a stand-in for a networked database; with a local
+SQLite file queries take microseconds and the comparison is CPU-bound.
+"""
+import asyncio
+import io
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test import Client
+from django.test.utils import override_settings
+
+from .benchmarks import BENCHMARK_SETTINGS, percentile
+
+PATH = "/api/matches/{pk}/participants/"
+
+
+def _session_cookie(user):
+    client = Client()
+    client.force_login(user)
+    return f"{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}"
+
+
+class _QueryDelay:
+    """Adds `seconds` to every query of the connections opened while active."""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def wrapper(self, execute, sql, params, many, context):
+        time.sleep(self.seconds)
+        return execute(sql, params, many, context)
+
+    def _install(self, sender, connection, **kwargs):
+        connection.execute_wrappers.append(self.wrapper)
+
+    def __enter__(self):
+        if self.seconds:
+            connections.close_all()
+            connection_created.connect(self._install)
+        return self
+
+    def __exit__(self, *exc):
+        if self.seconds:
+            connection_created.disconnect(self._install)
+            connections.close_all()
+
+
+def _summary(server, timings, statuses, elapsed):
+    return {
+        "server": server,
+        "requests": len(timings),
+        "ok": sum(1 for s in statuses if s == 200),
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round(len(timings) / elapsed, 1),
+        "p50_ms": round(statistics.median(timings), 2),
+        "p95_ms": round(percentile(timings, 95), 2),
+        "max_ms": round(max(timings), 2),
+    }
+
+
+def run_wsgi(path, cookie, requests, concurrency, workers):
+    handler = WSGIHandler()
+    local = threading.local()
+
+    def call(issued):
+        environ = {
+            "REQUEST_METHOD": "GET", "PATH_INFO": path, "QUERY_STRING": "", "SERVER_NAME": "testserver",
+            "SERVER_PORT": "80", "SERVER_PROTOCOL": "HTTP/1.1", "HTTP_HOST": "testserver", "HTTP_COOKIE": cookie,
+            "wsgi.input": io.BytesIO(), "wsgi.url_scheme": "http", "wsgi.errors": io.StringIO(),
+        }
+        local.status = None
+
+        def start_response(status, headers, exc_info=None):
+            local.status = int(status.split()[0])
+
+        response = handler(environ, start_response)
+        b"".join(response)
+        response.close()
+        return local.status, (time.perf_counter() - issued) * 1000
+
+    results = []
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # issue the burst `concurrency` at a time; the pool decides how many run
+        for offset in range(0, requests, concurrency):
+            issued = time.perf_counter()
+            futures = [pool.submit(call, issued) for _ in range(min(concurrency, requests - offset))]
+            results.extend(f.result() for f in futures)
+    elapsed = time.perf_counter() - start
+    return _summary("wsgi", [t for _, t in results], [s for s, _ in results], elapsed)
+
+
+def run_asgi(path, cookie, requests, concurrency):
+    handler = ASGIHandler()
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+        "headers": [(b"host", b"testserver"), (b"cookie", cookie.encode())],
+        "client": ("127.0.0.1", 50000), "server": ("testserver", 80),
+    }
+
+    async def call(issued):
+        status = None
+        messages = [{"type": "http.request", "body": b"", "more_body": False}]
+
+        async def receive():
+            if messages:
+                return messages.pop()
+            await asyncio.Event().wait()  # the client stays connected until the response is sent
+
+        async def send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+
+        await handler(dict(scope), receive, send)
+        return status, (time.perf_counter() - issued) * 1000
+
+    async def burst():
+        results = []
+        for offset in range(0, requests, concurrency):
+            issued = time.perf_counter()
+            results.extend(await asyncio.gather(*[call(issued) for _ in range(min(concurrency, requests - offset))]))
+        return results
+
+    start = time.perf_counter()
+    results = asyncio.run(burst())
+    elapsed = time.perf_counter() - start
+    return _summary("asgi", [t for _, t in results], [s for s, _ in results], elapsed)
+
+
+def compare(match, user, requests=400, concurrency=100, workers=8, db_latency_ms=0):
+    """Run the same burst under WSGI then ASGI. Returns the two result dicts."""
+    path = PATH.format(pk=match.pk)
+    cookie = _session_cookie(user)
+    results = []
+    with _QueryDelay(db_latency_ms / 1000):
+        with override_settings(**BENCHMARK_SETTINGS, ROOT_URLCONF="goalit.urls"):
+            results.append(run_wsgi(path, cookie, requests, concurrency, workers))
+        with override_settings(**BENCHMARK_SETTINGS, ROOT_URLCONF="goalit.asgi_urls"):
+            results.append(run_asgi(path, cookie, requests, concurrency))
+    for result in results:
+        result.update(concurrency=concurrency, wsgi_workers=workers, db_latency_ms=db_latency_ms)
+    return results
@@ -1,15 +1,77 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.db.models import Q
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import PlayerProfil
+from .models import PlayerProfil, Match, MatchComment, Team, MatchParticipation
+from . import cache, events, search
 
 @receiver(post_save, sender=User)
-def create_profile(sender, instance, created, **kwargs):
-    if created:
+def create_profile(sender, instance, created, raw=False, **kwargs):
+    # only on insert: logins and other user saves must not touch the profile table.
+    # bulk imports skip signals and create profiles themselves (league.player_import)
+    if created and not raw:
         PlayerProfil.objects.create(user=instance)
 
+# Rosters, cards and the organizer line show nickname|default:username, and
+# their caches are keyed on Match.version: renaming a player must touch the
+# matches they play in or organize.
+DISPLAY_NAME_FIELDS = {PlayerProfil: "nickname", User: "username"}
+
+@receiver(pre_save, sender=PlayerProfil)
+@receiver(pre_save, sender=User)
+def note_display_name_change(sender, instance, update_fields=None, raw=False, **kwargs):
+    field = DISPLAY_NAME_FIELDS[sender]
+    instance._display_name_changed = False
+    if raw or instance.pk is None or (update_fields is not None and field not in update_fields):
+        return  # e.g. the last_login save of every login
+    old = sender.objects.filter(pk=instance.pk).values_list(field, flat=True).first()
+    instance._display_name_changed = old is not None and old != getattr(instance, field)
+
+@receiver(post_save, sender=PlayerProfil)
 @receiver(post_save, sender=User)
-def save_profile(sender, instance, **kwargs):
-    # Ensure profile exists even if user was created before signals were added
-    PlayerProfil.objects.get_or_create(user=instance)
-    instance.profile.save()
\ No newline at end of file
+def touch_renamed_players_matches(sender, instance, **kwargs):
+    if getattr(instance, "_display_name_changed", False):
+        lookup = {"pk": instance.pk} if sender is PlayerProfil else {"user": instance}
+        players = PlayerProfil.objects.filter(**lookup).values("pk")
+        Match.objects.filter(
+            Q(created_by__in=players)
+            | Q(pk__in=MatchParticipation.objects.filter(player__in=players).values("match_id"))
+        ).touch()
+
+@receiver(post_save, sender=Match)
+def bump_match_version(sender, instance, **kwargs):
+    Match.objects.filter(pk=instance.pk).touch()
+
+@receiver(post_delete, sender=Match)
+def forget_match_fragments(sender, instance, **kwargs):
+    cache.forget_match(instance.pk, instance.version)
+
+@receiver(post_save, sender=Team)
+@receiver(post_delete, sender=Team)
+@receiver(post_save, sender=MatchParticipation)
+@receiver(post_delete, sender=MatchParticipation)
+def bump_parent_match_version(sender, instance, origin=None, **kwargs):
+    # queryset.update()/bulk_update() skip signals: those callers touch() the match themselves
+    if isinstance(origin, Match) or getattr(origin, "model", None) is Match:
+        return  # cascade of a match delete, nothing left to invalidate
+    Match.objects.filter(pk=instance.match_id).touch()
+
+@receiver(post_save, sender=MatchComment)
+def announce_comment(sender, instance, created=False, raw=False, **kwargs):
+    if created and not raw:
+        events.comment_posted(instance.match_id, instance.pk)
+
+@receiver(post_save, sender=Match)
+@receiver(post_save, sender=MatchComment)
+def index_for_search(sender, instance, update_fields=None, raw=False, **kwargs):
+    if raw or (update_fields and not set(update_fields) & set(search.BY_MODEL[sender].columns)):
+        return
+    search.index(instance)
+
+@receiver(pre_delete, sender=Match)
+@receiver(post_delete, sender=MatchComment)
+def unindex_for_search(sender, instance, origin=None, **kwargs):
+    # a match drops its comments from the index in one statement, while they still exist
+    if sender is MatchComment and (isinstance(origin, Match) or getattr(origin, "model", None) is Match):
+        return
+    search.unindex(instance)
@@ -0,0 +1,47 @@
+"""
+SQLite connection setup for a concurrent web workload.
+
+Every new connection gets the PRAGMAS below (merged with the
+LEAGUE_SQLITE_PRAGMAS setting) from the connection_created receiver:
+
+- WAL journaling: readers keep reading while one writer commits, instead
+  of queueing behind it.
+- synchronous=NORMAL: with WAL, commits stay atomic and the database
+  consistent; only the last transactions before a power loss can be lost.
+- busy_timeout: a writer waits this long for the lock instead of failing
+  with "database is locked" straight away.
+- cache_size / temp_store: a bigger page cache, and sorts kept in memory.
+
+Write transactions start with BEGIN IMMEDIATE (the database OPTIONS
+"transaction_mode"): the write lock is taken up front, so two transactions
+that both read and then write can't deadlock on the lock upgrade, which
+SQLite reports as an immediate "database is locked" no timeout can help.
+"""
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+PRAGMAS = {
+    "journal_mode": "wal",
+    "synchronous": "normal",
+    "busy_timeout": 5000,  # ms
+    "cache_size": -20000,  # negative: KiB, so ~20 MB per connection
+    "temp_store": "memory",
+}
+
+
+def pragmas():
+    return {**PRAGMAS, **getattr(settings, "LEAGUE_SQLITE_PRAGMAS", {})}
+
+
+def configure(cursor, values=None):
+    """Apply PRAGMAs on a DB-API cursor (Django's or a plain sqlite3 one)."""
+    for name, value in (pragmas() if values is None else values).items():
+        cursor.execute(f"PRAGMA {name} = {value}")
+
+
+@receiver(connection_created)
+def setup_connection(sender, connection, **kwargs):
+    if connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            configure(cursor)
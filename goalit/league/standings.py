@@ -0,0 +1,142 @@
+import calendar
+
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Q, Sum, Value, When
+from django.db.models.functions import TruncMonth
+from .models import Match, MatchParticipation, Standing
+
+# SQL version of MatchParticipation.points_earned()
+POINTS = Case(
+    When(
+        actually_played=True,
+        then=Value(100)
+        + F("goals") * 30
+        + F("assists") * 20
+        + Case(When(is_mvp=True, then=Value(40)), default=Value(0))
+        + Case(When(goals__gte=3, then=Value(30)), default=Value(0)),
+    ),
+    When(no_show=True, then=Value(-50)),
+    default=Value(0),
+    output_field=IntegerField(),
+)
+
+# Standing column -> aggregate over MatchParticipation rows
+TOTALS = {
+    "points": Sum(POINTS, default=0),
+    "matches_played": Count("pk", filter=Q(actually_played=True)),
+    "goals": Sum("goals", filter=Q(actually_played=True), default=0),
+    "assists": Sum("assists", filter=Q(actually_played=True), default=0),
+    "mvps": Count("pk", filter=Q(actually_played=True, is_mvp=True)),
+    "no_shows": Count("pk", filter=Q(actually_played=False, no_show=True)),
+}
+FIELDS = list(TOTALS)
+
+
+def _totals(row):
+    return {field: row[field] for field in FIELDS}
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def match_totals(match):
+    """player_id -> TOTALS of that player's participation in one match."""
+    return {
+        row["player"]: _totals(row)
+        for row in MatchParticipation.objects.filter(match=match)
+        .values("player")
+        .annotate(**TOTALS)
+        .order_by()
+    }
+
+
+@transaction.atomic
+def apply_match(match, deltas=None):
+    """
+    Add a just-finalized match to the standings of its month.
+    Only this match's rows are aggregated (or `deltas`, from match_totals(),
+    are reused); existing totals are incremented.
+    """
+    period = month_start(match.date)
+    if deltas is None:
+        deltas = match_totals(match)
+    if not deltas:
+        return
+
+    existing = {
+        s.player_id: s
+        for s in Standing.objects.select_for_update().filter(period=period, player_id__in=deltas)
+    }
+    to_create = []
+    for player_id, delta in deltas.items():
+        standing = existing.get(player_id)
+        if standing is None:
+            to_create.append(Standing(player_id=player_id, period=period, **delta))
+            continue
+        for field, value in delta.items():
+            setattr(standing, field, getattr(standing, field) + value)
+    if existing:
+        Standing.objects.bulk_update(existing.values(), FIELDS)
+    if to_create:
+        Standing.objects.bulk_create(to_create)
+
+
+@transaction.atomic
+def rebuild():
+    """Recompute every Standing row from the finalized matches. Returns the row count."""
+    rows = (
+        MatchParticipation.objects.filter(match__final_score=True)
+        .annotate(period=TruncMonth("match__date"))
+        .values("player", "period")
+        .annotate(**TOTALS)
+        .order_by()
+    )
+    Standing.objects.all().delete()
+    created = Standing.objects.bulk_create(
+        [Standing(player_id=row["player"], period=row["period"], **_totals(row)) for row in rows],
+        batch_size=1000,
+    )
+    return len(created)
+
+
+def _month_aligned(date_from, date_to):
+    starts_on_month = date_from is None or date_from.day == 1
+    ends_on_month = date_to is None or date_to.day == calendar.monthrange(date_to.year, date_to.month)[1]
+    return starts_on_month and ends_on_month
+
+
+def leaderboard(date_from=None, date_to=None):
+    """
+    Per-player totals over [date_from, date_to] (both optional), best first.
+    Month-aligned windows are summed from the Standing table; other windows
+    are aggregated from the participations of the finalized matches in the
+    window, found through the match date index (Standing has no finer grain).
+    """
+    if _month_aligned(date_from, date_to):
+        rows = Standing.objects.all()
+        if date_from:
+            rows = rows.filter(period__gte=date_from)
+        if date_to:
+            rows = rows.filter(period__lte=date_to)
+        totals = {field: Sum(field) for field in FIELDS}
+    else:
+        matches = Match.objects.filter(final_score=True)
+        if date_from:
+            matches = matches.filter(date__gte=date_from)
+        if date_to:
+            matches = matches.filter(date__lte=date_to)
+        # matches first: a range of the date index, then their participations through the match index,
+        # so the cost follows the window, not the table (query_plans "window_leaderboard")
+        rows = MatchParticipation.objects.filter(match__in=matches.values("id"))
+        totals = TOTALS
+
+    return (
+        rows.values("player")
+        .annotate(
+            username=F("player__user__username"),
+            nickname=F("player__nickname"),
+            **totals,
+        )
+        .order_by("-points", "player")
+    )
@@ -1,3 +1,1281 @@
-from django.test import TestCase
+import asyncio
+import base64
+import csv
+import datetime
+import decimal
+import io
+import json
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.contrib import admin as django_admin
+from django.contrib.auth.models import User
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.db.models import Count
+from django.http import HttpResponse
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from PIL import Image
+
+from . import admission, badges, balancing, benchmarks, events, highlights, jobs, ledger, player_stats, query_plans, search
+from . import seeding
+from . import async_api, metrics, standings, write_contention
+from . import cache as league_cache
+from .middleware import RequestMetricsMiddleware
+from .models import (
+    Badge, Job, Match, MatchComment, MatchHighlight, MatchParticipation, PlayerBalance, PlayerProfil, PlayerStats,
+    Standing,
+)
+
+
+def make_match(**kwargs):
+    kwargs.setdefault("date", datetime.date(2025, 6, 1))
+    kwargs.setdefault("time", datetime.time(18, 0))
+    kwargs.setdefault("location", "Arena")
+    return Match.objects.create(**kwargs)
+
+
+def make_players(n, prefix="player"):
+    users = User.objects.bulk_create([User(username=f"{prefix}{i}") for i in range(n)])
+    return PlayerProfil.objects.bulk_create([PlayerProfil(user=user) for user in users])
+
+
+class AdmissionTests(TestCase):
+    def setUp(self):
+        self.match = make_match(max_players=2)
+        self.players = make_players(4)
+
+    def test_full_match_queues_players_in_order(self):
+        parts = [admission.set_status(self.match, p, "going")[0] for p in self.players]
+        self.assertEqual([p.status for p in parts], ["going", "going", "waiting", "waiting"])
+        self.assertEqual([admission.waitlist_position(p) for p in parts[2:]], [1, 2])
+        self.match.refresh_from_db()
+        self.assertEqual((self.match.going_count, self.match.waiting_count), (2, 2))
+
+    def test_leaving_promotes_head_of_waitlist(self):
+        for p in self.players:
+            admission.set_status(self.match, p, "going")
+        _, promoted = admission.leave(self.match, self.players[0])
+        self.assertEqual([p.player_id for p in promoted], [self.players[2].pk])
+        _, promoted = admission.set_status(self.match, self.players[1], "maybe")
+        self.assertEqual([p.player_id for p in promoted], [self.players[3].pk])
+        self.match.refresh_from_db()
+        self.assertEqual((self.match.going_count, self.match.waiting_count), (2, 0))
+
+    def test_rejoining_keeps_waitlist_position(self):
+        for p in self.players:
+            admission.set_status(self.match, p, "going")
+        part, _ = admission.set_status(self.match, self.players[3], "going")
+        self.assertEqual(admission.waitlist_position(part), 2)
+
+    def test_free_slots_go_to_the_waitlist_first(self):
+        parts = [admission.set_status(self.match, p, "going")[0] for p in self.players[:3]]
+        Match.objects.filter(pk=self.match.pk).update(max_players=4)
+        # neither a newcomer nor the back of the queue may pass the waiting head
+        late, promoted = admission.set_status(self.match, self.players[3], "going")
+        self.assertEqual((late.status, [p.pk for p in promoted]), ("going", [parts[2].pk]))
+        self.match.refresh_from_db()
+        self.assertEqual((self.match.going_count, self.match.waiting_count), (4, 0))
+
+    def test_admin_raising_max_players_promotes_the_waitlist(self):
+        parts = [admission.set_status(self.match, p, "going")[0] for p in self.players]
+        self.match.refresh_from_db()
+        self.match.max_players = 3
+        model_admin = django_admin.site._registry[Match]
+        model_admin.save_model(None, self.match, mock.Mock(changed_data=["max_players"]), True)
+        statuses = dict(MatchParticipation.objects.values_list("pk", "status"))
+        self.assertEqual([statuses[p.pk] for p in parts], ["going", "going", "going", "waiting"])
+        self.assertEqual(admission.waitlist_position(MatchParticipation.objects.get(pk=parts[3].pk)), 1)
+
+
+class AdmissionConcurrencyTests(TransactionTestCase):
+    PLAYERS = 200
+    CAPACITY = 14
+
+    def test_parallel_joins_never_exceed_capacity(self):
+        match = make_match(max_players=self.CAPACITY)
+        players = make_players(self.PLAYERS)
+        start = threading.Barrier(16)
+
+        def join(profile):
+            try:
+                try:
+                    start.wait(timeout=5)
+                except threading.BrokenBarrierError:
+                    pass
+                deadline = time.monotonic() + 60
+                while time.monotonic() < deadline:
+                    try:
+                        return admission.set_status(match, profile, "going")[0].status
+                    except OperationalError:
+                        # SQLite lock contention: back off and retry like a client would
+                        time.sleep(random.uniform(0.001, 0.02))
+                raise AssertionError("join kept failing on lock contention")
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            results = list(pool.map(join, players))
+
+        match.refresh_from_db()
+        going = MatchParticipation.objects.filter(match=match, status="going").count()
+        waiting = MatchParticipation.objects.filter(match=match, status="waiting").count()
+        self.assertEqual(results.count("going"), self.CAPACITY)
+        self.assertEqual(going, self.CAPACITY)
+        self.assertEqual(waiting, self.PLAYERS - self.CAPACITY)
+        self.assertEqual((match.going_count, match.waiting_count), (going, waiting))
+
+
+class MatchListApiTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("viewer", password="pw")
+        self.client.force_login(self.user)
+        for day in range(1, 6):
+            for hour in (18, 20):
+                m = make_match(date=datetime.date(2025, 6, day), time=datetime.time(hour), created_by=self.user.profile)
+                m.teams.create(name="A")
+                m.teams.create(name="B")
+
+    def test_cursor_walks_every_match_once_in_order(self):
+        seen = []
+        url = "/api/matches/?page_size=3"
+        while url:
+            data = self.client.get(url).json()
+            seen.extend((r["date"], r["time"]) for r in data["results"])
+            url = data["next"]
+        self.assertEqual(len(seen), 10)
+        self.assertEqual(seen, sorted(seen, reverse=True))
+
+    def test_page_query_count_is_constant(self):
+        # session + user + ETag stamp + matches + teams prefetch
+        with self.assertNumQueries(5):
+            self.client.get("/api/matches/")
+
+    def test_date_range_and_final_score_filters(self):
+        Match.objects.filter(date=datetime.date(2025, 6, 2)).update(final_score=True)
+        data = self.client.get("/api/matches/?date_from=2025-06-02&date_to=2025-06-03&final_score=false").json()
+        self.assertEqual({r["date"] for r in data["results"]}, {"2025-06-03"})
+
+
+class StandingsTests(TestCase):
+    def setUp(self):
+        self.players = make_players(3)
+        self.stats = [
+            dict(actually_played=True, goals=3, assists=1, is_mvp=True),
+            dict(actually_played=True, goals=0, assists=2),
+            dict(actually_played=False, no_show=True),
+        ]
+
+    def finalize(self, day):
+        match = make_match(date=day, final_score=True)
+        for profile, stats in zip(self.players, self.stats):
+            MatchParticipation.objects.create(match=match, player=profile, **stats)
+        standings.apply_match(match)
+        return match
+
+    def test_sql_points_match_python_scoring(self):
+        self.finalize(datetime.date(2025, 6, 10))
+        expected = {
+            p.player_id: p.points_earned() for p in MatchParticipation.objects.all()
+        }
+        rows = standings.leaderboard()
+        self.assertEqual({r["player"]: r["points"] for r in rows}, expected)
+        self.assertEqual([r["points"] for r in rows], [280, 140, -50])
+
+    def test_incremental_updates_equal_rebuild(self):
+        self.finalize(datetime.date(2025, 6, 10))
+        self.finalize(datetime.date(2025, 6, 17))
+        self.finalize(datetime.date(2025, 7, 1))
+        incremental = list(Standing.objects.order_by("player", "period").values())
+        standings.rebuild()
+        rebuilt = list(Standing.objects.order_by("player", "period").values())
+        strip = lambda rows: [{k: v for k, v in r.items() if k != "id"} for r in rows]
+        self.assertEqual(strip(incremental), strip(rebuilt))
+
+    def test_leaderboard_api_windows(self):
+        self.finalize(datetime.date(2025, 6, 10))
+        self.finalize(datetime.date(2025, 7, 15))
+        self.client.force_login(self.players[0].user)
+        month = self.client.get("/api/standings/?date_from=2025-06-01&date_to=2025-06-30").json()
+        window = self.client.get("/api/standings/?date_from=2025-06-05&date_to=2025-07-20&page_size=2").json()
+        self.assertEqual(month["results"][0]["points"], 280)
+        self.assertEqual([r["points"] for r in window["results"]], [560, 280])
+        rest = self.client.get(window["next"]).json()
+        self.assertEqual([r["points"] for r in rest["results"]], [-100])
+        self.assertEqual(self.client.get("/api/standings/?date_from=june").status_code, 400)
+
+
+class BadgeJobTests(TestCase):
+    def setUp(self):
+        self.players = make_players(2)
+        self.now = timezone.make_aware(datetime.datetime(2025, 7, 5, 12))
+
+    def finalize(self, day, goals, finalized_at):
+        match = make_match(date=day, final_score=True, finalized_at=finalized_at)
+        for profile, g in zip(self.players, goals):
+            MatchParticipation.objects.create(match=match, player=profile, actually_played=True, goals=g)
+        standings.apply_match(match)
+        return match
+
+    def codes(self):
+        return sorted(Badge.objects.values_list("player__user__username", "badge_type__code"))
+
+    def test_awards_once_and_reruns_are_noops(self):
+        self.finalize(datetime.date(2025, 6, 10), [3, 1], self.now - datetime.timedelta(days=20))
+        first = badges.run(now=self.now)
+        self.assertEqual(self.codes(), [("player0", "hat_trick"), ("player0", "top_scorer")])
+        self.assertEqual(first.matches_processed, 1)
+
+        second = badges.run(now=self.now + datetime.timedelta(hours=1))
+        self.assertEqual(second.matches_processed, 0)
+        self.assertEqual(second.badges_awarded, 0)
+        self.assertEqual(Badge.objects.count(), 2)
+
+    def test_open_month_waits_until_it_closes(self):
+        self.finalize(datetime.date(2025, 7, 2), [0, 2], self.now - datetime.timedelta(days=1))
+        badges.run(now=self.now)
+        self.assertEqual(self.codes(), [])
+        badges.run(now=self.now + datetime.timedelta(days=30))
+        self.assertEqual(self.codes(), [("player1", "top_scorer")])
+
+    def test_late_match_moves_period_badge(self):
+        self.finalize(datetime.date(2025, 6, 10), [1, 0], self.now - datetime.timedelta(days=20))
+        badges.run(now=self.now)
+        self.finalize(datetime.date(2025, 6, 20), [0, 2], self.now + datetime.timedelta(minutes=30))
+        run = badges.run(now=self.now + datetime.timedelta(hours=1))
+        self.assertEqual(self.codes(), [("player1", "top_scorer")])
+        self.assertEqual(run.badges_revoked, 1)
+
+    def test_overlap_rereads_do_not_count_as_awards(self):
+        self.finalize(datetime.date(2025, 6, 10), [3, 0], self.now - datetime.timedelta(minutes=1))
+        self.assertEqual(badges.run(now=self.now).badges_awarded, 2)
+        rerun = badges.run(now=self.now + datetime.timedelta(minutes=1))
+        self.assertEqual((rerun.matches_processed, rerun.badges_awarded), (1, 0))
+
+    def test_standings_rolled_up_after_a_run_reopen_their_month(self):
+        match = make_match(date=datetime.date(2025, 6, 10), final_score=True, finalized_at=self.now)
+        MatchParticipation.objects.create(match=match, player=self.players[1], actually_played=True, goals=2)
+        badges.run(now=self.now)  # the match_rollups job hasn't run yet
+        self.assertEqual(self.codes(), [])
+
+        standings.apply_match(match)
+        done = self.now + datetime.timedelta(hours=2)
+        Job.objects.create(kind="match_rollups", payload={"match_id": match.pk}, status="done", finished_at=done)
+        badges.run(now=done + datetime.timedelta(minutes=1))
+        self.assertEqual(self.codes(), [("player1", "top_scorer")])
+
+
+class FinalizeApiTests(TestCase):
+    def setUp(self):
+        self.players = make_players(30)
+        self.organizer = self.players[0]
+        self.match = make_match(max_players=30, created_by=self.organizer)
+        self.teams = [self.match.teams.create(name="A"), self.match.teams.create(name="B")]
+        self.parts = [
+            MatchParticipation.objects.create(match=self.match, player=p) for p in self.players
+        ]
+        self.client.force_login(self.organizer.user)
+        self.url = f"/api/matches/{self.match.pk}/finalize/"
+
+    def payload(self, **overrides):
+        players = [{"id": p.pk, "played": True, "goals": 1, "has_paid": True} for p in self.parts]
+        players[0]["is_mvp"] = True
+        data = {"teams": [{"id": t.pk, "score": 3} for t in self.teams], "players": players}
+        data.update(overrides)
+        return data
+
+    def test_finalize_in_a_handful_of_queries(self):
+        with self.assertNumQueries(13):  # standings, stats and charges are queued, not applied
+            r = self.client.post(self.url, self.payload(), content_type="application/json")
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual([t["score"] for t in r.json()["teams"]], [3, 3])
+        self.match.refresh_from_db()
+        self.assertTrue(self.match.final_score)
+        self.assertEqual(MatchParticipation.objects.filter(goals=1, has_paid=True).count(), 30)
+        self.assertEqual(Standing.objects.count(), 0)
+        self.assertEqual(jobs.run_pending(), {"done": 3})  # rollups, charges, then badges
+        self.assertEqual(Standing.objects.count(), 30)
+
+    def test_invalid_document_writes_nothing(self):
+        players = self.payload()["players"]
+        players[1]["no_show"] = True
+        r = self.client.post(self.url, self.payload(players=players), content_type="application/json")
+        self.assertEqual(r.status_code, 400)
+        r = self.client.post(self.url, self.payload(teams=[{"id": 9999, "score": 1}]), content_type="application/json")
+        self.assertEqual(r.status_code, 400)
+        self.match.refresh_from_db()
+        self.assertFalse(self.match.final_score)
+        self.assertFalse(MatchParticipation.objects.filter(goals__gt=0).exists())
+
+    def test_omitted_fields_keep_their_values(self):
+        self.parts[1].has_paid = True
+        self.parts[1].goals = 2
+        self.parts[1].save()
+        players = [{"id": self.parts[1].pk, "played": True}, {"id": self.parts[2].pk, "no_show": True}]
+        r = self.client.post(self.url, {"players": players}, content_type="application/json")
+        self.assertEqual(r.status_code, 200)
+        self.parts[1].refresh_from_db()
+        self.assertEqual((self.parts[1].has_paid, self.parts[1].goals, self.parts[1].actually_played), (True, 2, True))
+
+    def test_results_are_checked_against_current_values(self):
+        self.parts[1].actually_played = True
+        self.parts[1].save()
+        r = self.client.post(self.url, {"players": [{"id": self.parts[1].pk, "no_show": True}]},
+                             content_type="application/json")
+        self.assertEqual(r.status_code, 400)
+        self.assertIn("non_field_errors", r.json()["players"][0])
+
+    def test_only_organizer(self):
+        self.client.force_login(self.players[1].user)
+        r = self.client.post(self.url, self.payload(), content_type="application/json")
+        self.assertEqual(r.status_code, 403)
+
+
+class TeamBalancingTests(TestCase):
+    def test_partition_spreads_goalkeepers_and_balances(self):
+        pool = [balancing.Candidate(i, 50 + 10 * i, "GK" if i < 3 else "ANY") for i in range(21)]
+        sides = balancing.partition(pool, 3, seed=1)
+        self.assertEqual([len(s) for s in sides], [7, 7, 7])
+        self.assertEqual([sum(c.position == "GK" for c in s) for s in sides], [1, 1, 1])
+        totals = [sum(c.rating for c in s) for s in sides]
+        self.assertLessEqual(max(totals) - min(totals), 20)
+
+    def test_preview_does_not_write_and_save_uses_every_team(self):
+        players = make_players(9)
+        match = make_match(created_by=players[0])
+        for name in "ABC":
+            match.teams.create(name=name)
+        for p in players:
+            admission.set_status(match, p, "going")
+        self.client.force_login(players[0].user)
+        url = f"/api/matches/{match.pk}/randomize-teams/"
+
+        preview = self.client.post(url, {"preview": True}, content_type="application/json").json()
+        self.assertEqual([len(t["players"]) for t in preview["teams"]], [3, 3, 3])
+        self.assertFalse(MatchParticipation.objects.filter(team__isnull=False).exists())
+
+        self.client.post(url, content_type="application/json")
+        counts = MatchParticipation.objects.values("team").annotate(n=Count("pk")).values_list("n", flat=True)
+        self.assertEqual(sorted(counts), [3, 3, 3])
+
+
+class RosterEventsTests(TestCase):
+    def setUp(self):
+        self.players = make_players(2)
+        self.match = make_match(max_players=1)
+
+    async def test_join_and_leave_push_deltas_to_subscribers(self):
+        subscription = events.get_broker().subscribe(events.match_channel(self.match.pk))
+        self.addCleanup(subscription.close)
+
+        def write(action, *args):
+            with self.captureOnCommitCallbacks(execute=True):
+                action(self.match, *args)
+
+        await sync_to_async(write)(admission.set_status, self.players[0], "going")
+        await sync_to_async(write)(admission.set_status, self.players[1], "going")
+        joined = json.loads(await subscription.get(timeout=1))
+        queued = json.loads(await subscription.get(timeout=1))
+        self.assertEqual([c["status"] for c in joined["changes"]], ["going"])
+        self.assertEqual((queued["going_count"], queued["waiting_count"]), (1, 1))
+
+        await sync_to_async(write)(admission.leave, self.players[0])
+        left = json.loads(await subscription.get(timeout=1))
+        self.assertEqual(left["left"], [joined["changes"][0]["id"]])
+        self.assertEqual([(c["player"]["id"], c["status"]) for c in left["changes"]], [(self.players[1].pk, "going")])
+
+    def test_stream_needs_asgi(self):
+        self.client.force_login(self.players[0].user)
+        self.assertEqual(self.client.get(f"/{self.match.pk}/events/").status_code, 204)
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.players = make_players(2)
+        self.match = make_match()
+        self.client.force_login(self.players[0].user)
+
+    def assertRevalidates(self, url):
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        # session + user + version stamp, no serializer queries
+        with self.assertNumQueries(3):
+            cached = self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached["ETag"], first["ETag"])
+        return first["ETag"]
+
+    def test_detail_participants_and_list_revalidate(self):
+        urls = [f"/api/matches/{self.match.pk}/", f"/api/matches/{self.match.pk}/participants/", "/api/matches/"]
+        etags = [self.assertRevalidates(url) for url in urls]
+
+        admission.set_status(self.match, self.players[1], "going")
+        for url, etag in zip(urls, etags):
+            fresh = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(fresh.status_code, 200)
+            self.assertNotEqual(fresh["ETag"], etag)
+
+    def test_list_etag_only_covers_the_requested_page(self):
+        # the page plus the row that tells whether there is a next one
+        make_match(date=self.match.date - datetime.timedelta(days=7))
+        older = make_match(date=self.match.date - datetime.timedelta(days=14))
+        url = "/api/matches/?page_size=1"
+        etag = self.assertRevalidates(url)
+
+        admission.set_status(older, self.players[1], "going")
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        make_match(date=self.match.date + datetime.timedelta(days=7))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_team_and_match_writes_bump_the_version(self):
+        version = Match.objects.get(pk=self.match.pk).version
+        team = self.match.teams.create(name="A")
+        team.delete()
+        Match.objects.get(pk=self.match.pk).save()
+        self.assertEqual(Match.objects.get(pk=self.match.pk).version, version + 3)
+
+    def test_saving_a_stale_instance_never_reuses_a_version(self):
+        url = f"/api/matches/{self.match.pk}/"
+        stale = Match.objects.get(pk=self.match.pk)
+        seen = {self.client.get(url)["ETag"]}
+        for p in self.players:
+            admission.set_status(self.match, p, "going")
+            seen.add(self.client.get(url)["ETag"])
+
+        stale.notes = "moved indoors"
+        stale.save()
+        self.assertNotIn(self.client.get(url)["ETag"], seen)
+        self.assertEqual(Match.objects.get(pk=self.match.pk).version, stale.version + len(self.players) + 1)
+
+
+class FragmentCacheTests(TestCase):
+    def setUp(self):
+        league_cache.get_cache().clear()
+        self.players = make_players(3)
+        self.client.force_login(self.players[0].user)
+        self.matches = [make_match(date=datetime.date(2025, 6, day), created_by=self.players[0]) for day in (1, 2)]
+        for p in self.players:
+            admission.set_status(self.matches[0], p, "going")
+
+    def test_list_cards_are_reused_until_a_match_changes(self):
+        self.client.get("/")
+        # session + user + paginator count + page, no participant queries
+        with self.assertNumQueries(4):
+            page = self.client.get("/")
+        self.assertContains(page, "player1")
+
+        admission.leave(self.matches[0], self.players[1])
+        page = self.client.get("/")
+        self.assertNotContains(page, "player1")
+        self.assertEqual(league_cache.stats()["misses"], 3)
+
+    def test_detail_keeps_per_user_bits_out_of_the_cache(self):
+        url = f"/{self.matches[0].pk}/"
+        self.assertNotContains(self.client.get(url), 'id="btnRandomizeTeams"')
+        self.matches[0].teams.create(name="A")
+        self.matches[0].teams.create(name="B")
+        self.assertContains(self.client.get(url), 'id="btnRandomizeTeams"')
+
+        self.client.force_login(self.players[1].user)
+        self.assertNotContains(self.client.get(url), 'id="btnRandomizeTeams"')
+        self.assertEqual(league_cache.stats(), {"hits": 1, "misses": 2, "hit_rate": 1 / 3})
+
+    def test_list_card_shows_a_bounded_roster(self):
+        extra = make_players(7, prefix="late")
+        for p in extra:
+            admission.set_status(self.matches[1], p, "going")
+        # session + user + count + page + one ROW_NUMBER()-windowed roster query
+        with self.assertNumQueries(5):
+            page = self.client.get("/")
+        self.assertContains(page, "late5")
+        self.assertNotContains(page, "late6")
+        self.assertContains(page, "+1 more")
+
+    def test_renaming_a_player_refreshes_their_cards(self):
+        self.client.get("/")
+        profile = self.players[1]
+        profile.nickname = "Speedy"
+        profile.save()
+        self.assertContains(self.client.get("/"), "Speedy")
+
+        # the detail page caches the organizer's name too
+        other = make_match(date=datetime.date(2025, 6, 3), created_by=self.players[2])
+        for match in self.matches:
+            self.client.get(f"/{match.pk}/")
+        organizer = self.players[0].user
+        organizer.username = "renamed0"
+        organizer.save()
+        self.assertContains(self.client.get(f"/{self.matches[1].pk}/"), "<strong>renamed0</strong>")
+        self.assertContains(self.client.get(f"/{self.matches[0].pk}/"), "renamed0")
+        other.refresh_from_db(fields=["version"])
+        version = other.version
+        organizer.save(update_fields=["last_login"])
+        organizer.save()
+        other.refresh_from_db(fields=["version"])
+        self.assertEqual(other.version, version)
+
+
+class BenchmarkSuiteTests(TestCase):
+    def test_every_endpoint_stays_within_its_query_budget(self):
+        players = seeding.seed_players(60)
+        seeding.seed_matches(30, players, seed=1)
+        results = benchmarks.run(repeat=2)
+
+        self.assertEqual({r["name"] for r in results}, {e.name for e in benchmarks.ENDPOINTS})
+        for r in results:
+            with self.subTest(r["name"]):
+                self.assertFalse(r["unexpected_status"], r["status"])
+                self.assertLessEqual(r["queries"], r["budget"])
+        # the suite rolls its writes back
+        self.assertEqual(Match.objects.count(), 30)
+
+    def test_seeding_twice_reuses_the_players(self):
+        out = io.StringIO()
+        for _ in range(2):
+            call_command("seed_league", players=20, matches=5, prefix="again", stdout=out)
+        self.assertIn("Created 0 player(s).", out.getvalue())
+        self.assertEqual(User.objects.filter(username__startswith="again").count(), 20)
+        self.assertEqual(Match.objects.count(), 10)
+        self.assertFalse(MatchParticipation.objects.exclude(player__user__username__startswith="again").exists())
+
+
+class PlayerImportTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser("admin", password="x")
+        self.client.force_login(self.admin)
+
+    def test_api_creates_users_and_profiles_in_bulk(self):
+        rows = [{"username": f"club{i}", "password": "s3cret-pass", "nickname": f"C{i}"} for i in range(3)]
+        rows[2].pop("password")
+        response = self.client.post("/api/players/import/", {"players": rows}, content_type="application/json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json(), {"created": 3})
+
+        users = User.objects.filter(username__startswith="club").select_related("profile").order_by("username")
+        self.assertTrue(users[0].check_password("s3cret-pass"))
+        self.assertFalse(users[2].has_usable_password())
+        self.assertEqual([u.profile.nickname for u in users], ["C0", "C1", "C2"])
+
+    def test_invalid_roster_imports_nothing(self):
+        for rows, flagged in [
+            ([{"username": "new"}, {"username": "bad", "preferred_position": "XX"}], [False, True]),
+            ([{"username": "new"}, {"username": "admin"}, {"username": "new"}], [False, True, True]),
+        ]:
+            response = self.client.post("/api/players/import/", {"players": rows}, content_type="application/json")
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual([bool(e) for e in response.json()["players"]], flagged)
+        self.assertFalse(User.objects.filter(username="new").exists())
+
+    def test_csv_upload_and_command(self):
+        roster = "username,email,preferred_position\nkeeper,k@example.com,GK\nstriker,,FW\n"
+        upload = SimpleUploadedFile("roster.csv", roster.encode())
+        response = self.client.post("/api/players/import/", {"file": upload})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(User.objects.get(username="striker").profile.preferred_position, "FW")
+
+        with tempfile.NamedTemporaryFile("w", suffix=".json") as fh:
+            json.dump([{"username": "winger", "password": "pw-123456"}], fh)
+            fh.flush()
+            call_command("import_players", fh.name, stdout=io.StringIO())
+        self.assertTrue(User.objects.get(username="winger").check_password("pw-123456"))
+
+    def test_only_admins_can_import(self):
+        self.client.force_login(make_players(1)[0].user)
+        response = self.client.post("/api/players/import/", {"players": [{"username": "x"}]}, content_type="application/json")
+        self.assertEqual(response.status_code, 403)
+
+    def test_user_saves_leave_the_profile_alone(self):
+        user = User.objects.create_user("fresh")
+        self.assertTrue(PlayerProfil.objects.filter(user=user).exists())
+        with self.assertNumQueries(1):
+            user.save(update_fields=["last_login"])
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.players = make_players(2)
+        self.june = make_match(date=datetime.date(2025, 6, 1), price_per_player=5)
+        self.july = make_match(date=datetime.date(2025, 7, 1))
+        for match in (self.june, self.july):
+            admission.set_status(match, self.players[0], "going")
+        admission.set_status(self.july, self.players[1], "going")
+        staff = User.objects.create_user("accountant", is_staff=True)
+        self.client.force_login(staff)
+
+    def export(self, path, **params):
+        response = self.client.get(f"/exports/{path}", params)
+        self.assertEqual(response.status_code, 200)
+        return response, b"".join(response.streaming_content).decode()
+
+    def test_csv_export_with_filters(self):
+        _, body = self.export("participations.csv", date_from="2025-06-15")
+        lines = list(csv.DictReader(io.StringIO(body)))
+        self.assertEqual([(r["match_id"], r["username"]) for r in lines],
+                         [(str(self.july.pk), "player0"), (str(self.july.pk), "player1")])
+
+        _, body = self.export("matches.jsonl", player=self.players[1].pk)
+        self.assertEqual([json.loads(line)["match_id"] for line in body.splitlines()], [self.july.pk])
+
+    def test_since_cursor_returns_only_changed_matches(self):
+        Match.objects.update(updated_at=timezone.now() - datetime.timedelta(hours=1))
+        response, _ = self.export("matches.csv")
+        cursor = response["X-Export-Cursor"]
+        _, body = self.export("matches.jsonl", since=cursor)
+        self.assertEqual(body, "")
+
+        MatchParticipation.objects.filter(match=self.june).update(has_paid=True)
+        Match.objects.filter(pk=self.june.pk).touch()
+        _, body = self.export("participations.jsonl", since=cursor)
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([(r["match_id"], r["has_paid"], r["price"]) for r in rows], [(self.june.pk, True, "5.00")])
+
+    def test_writes_committed_after_the_cursor_are_not_lost(self):
+        Match.objects.update(updated_at=timezone.now() - datetime.timedelta(hours=1))
+        response, _ = self.export("matches.csv")
+        cursor = response["X-Export-Cursor"]
+        # stamped inside a transaction that began before the export, committed after it
+        Match.objects.filter(pk=self.july.pk).update(updated_at=parse_datetime(cursor) - datetime.timedelta(seconds=1))
+        _, body = self.export("matches.jsonl", since=cursor)
+        self.assertEqual([json.loads(line)["match_id"] for line in body.splitlines()], [self.july.pk])
+
+    def test_bad_filters_and_non_staff(self):
+        self.assertEqual(self.client.get("/exports/matches.csv", {"date_from": "June"}).status_code, 400)
+        self.assertEqual(self.client.get("/exports/badges.csv").status_code, 404)
+        self.client.force_login(self.players[0].user)
+        self.assertEqual(self.client.get("/exports/matches.csv").status_code, 302)
+
+
+class LedgerTests(TestCase):
+    def setUp(self):
+        self.players = make_players(3)
+        self.match = make_match(price_per_player=decimal.Decimal("8.00"), created_by=self.players[0])
+        self.parts = [admission.set_status(self.match, p, "going")[0] for p in self.players]
+        self.client.force_login(self.players[0].user)
+
+    def finalize(self, results):
+        response = self.client.post(f"/api/matches/{self.match.pk}/finalize/", {"players": results},
+                                    content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        jobs.run_pending()
+
+    def test_finalize_charges_players_and_prepayments_net_out(self):
+        response = self.client.post(f"/api/matches/{self.match.pk}/mark-paid/",
+                                    {"participations": [self.parts[1].pk]}, content_type="application/json")
+        self.assertEqual(response.json()["paid"], 1)
+        self.assertEqual(ledger.balance(self.players[1]), decimal.Decimal("-8.00"))  # prepaid
+
+        self.finalize([
+            {"id": self.parts[0].pk, "played": True, "has_paid": True},
+            {"id": self.parts[1].pk, "played": True, "has_paid": True},
+            {"id": self.parts[2].pk, "no_show": True},
+        ])
+        self.assertEqual([ledger.balance(p) for p in self.players], [0, 0, 8])
+        self.assertEqual([b.player_id for b in ledger.debtors()], [self.players[2].pk])
+
+        summary = self.client.get(f"/api/matches/{self.match.pk}/payments/").json()
+        self.assertEqual((summary["charged"], summary["paid"], summary["outstanding"]), ("24.00", "16.00", "8.00"))
+        self.assertEqual(summary["unpaid"], [{"player": self.players[2].pk, "owed": "8.00"}])
+
+        response = self.client.post(f"/api/matches/{self.match.pk}/mark-paid/",
+                                    {"participations": [p.pk for p in self.parts]}, content_type="application/json")
+        self.assertEqual(response.json()["paid"], 1)  # only the debtor had something to pay
+        self.assertFalse(ledger.debtors().exists())
+        self.assertTrue(MatchParticipation.objects.get(pk=self.parts[2].pk).has_paid)
+
+    def test_balances_match_the_ledger_and_entries_are_append_only(self):
+        self.finalize([{"id": p.pk, "played": True} for p in self.parts])
+        entry = ledger.record(self.players[1], "payment", "5.00")
+        ledger.record(self.players[1], "refund", "1.50")
+        expected = {b.player_id: b.balance for b in PlayerBalance.objects.all()}
+        self.assertEqual(expected[self.players[1].pk], decimal.Decimal("4.50"))
+
+        ledger.rebuild_balances()
+        self.assertEqual({b.player_id: b.balance for b in PlayerBalance.objects.all()}, expected)
+        with self.assertRaises(ValueError):
+            entry.save()
+        with self.assertRaises(ValueError):
+            entry.delete()
+
+    def test_money_endpoints_are_restricted(self):
+        self.client.force_login(self.players[1].user)
+        url = f"/api/matches/{self.match.pk}/mark-paid/"
+        body = {"participations": [self.parts[1].pk]}
+        self.assertEqual(self.client.post(url, body, content_type="application/json").status_code, 403)
+        self.assertEqual(self.client.get(f"/api/players/{self.players[0].pk}/balance/").status_code, 403)
+        self.assertEqual(self.client.get(f"/api/players/{self.players[1].pk}/balance/").json()["balance"], "0.00")
+        self.assertEqual(self.client.get("/api/players/debtors/").status_code, 403)
+        self.assertEqual(self.client.post("/api/ledger/", {}).status_code, 403)
+
+
+class LineupApiTests(TestCase):
+    def setUp(self):
+        self.players = make_players(5)
+        self.match = make_match(max_players=4, created_by=self.players[0])
+        self.teams = [self.match.teams.create(name="A"), self.match.teams.create(name="B")]
+        self.parts = [admission.set_status(self.match, p, "going")[0] for p in self.players]
+        self.client.force_login(self.players[0].user)
+        self.url = f"/api/matches/{self.match.pk}/lineup/"
+
+    def put(self, players):
+        return self.client.put(self.url, {"players": players}, content_type="application/json")
+
+    def test_whole_lineup_in_one_request(self):
+        lineup = [{"id": p.pk, "team": self.teams[n % 2].pk} for n, p in enumerate(self.parts[:4])]
+        # session, user, match + teams, organizer profile, participations, savepoint,
+        # bulk_update, touch, savepoint release, roster
+        with self.assertNumQueries(11):
+            response = self.put(lineup)
+        self.assertEqual(response.status_code, 200)
+        teams = {row["id"]: row["team"]["id"] for row in response.json() if row["team"]}
+        self.assertEqual(teams, {item["id"]: item["team"] for item in lineup})
+
+    def test_status_changes_promote_the_waitlist(self):
+        self.assertEqual(self.parts[4].status, "waiting")
+        response = self.put([{"id": self.parts[1].pk, "team": None, "status": "not_going"}])
+        self.assertEqual(response.status_code, 200)
+        statuses = {row["id"]: row["status"] for row in response.json()}
+        self.assertEqual((statuses[self.parts[1].pk], statuses[self.parts[4].pk]), ("not_going", "going"))
+        self.match.refresh_from_db()
+        self.assertEqual((self.match.going_count, self.match.waiting_count), (4, 0))
+
+    def test_invalid_lineups_change_nothing(self):
+        other = make_match().teams.create(name="X")
+        self.assertEqual(self.put([{"id": self.parts[0].pk, "team": other.pk}]).status_code, 400)
+        self.assertEqual(self.put([{"id": self.parts[4].pk, "team": None, "status": "going"}]).status_code, 400)
+        self.assertFalse(MatchParticipation.objects.filter(team__isnull=False).exists())
+
+        self.client.force_login(self.players[1].user)
+        self.assertEqual(self.put([{"id": self.parts[0].pk, "team": self.teams[0].pk}]).status_code, 403)
+
+
+class PlayerStatsTests(TestCase):
+    def setUp(self):
+        self.players = make_players(4)
+        self.client.force_login(self.players[0].user)
+
+    def finalize(self, day, stats):
+        match = make_match(date=day, final_score=True)
+        for profile, row in zip(self.players, stats):
+            MatchParticipation.objects.create(match=match, player=profile, **row)
+        player_stats.apply_match(match)
+        return match
+
+    def test_incremental_updates_equal_rebuild(self):
+        self.finalize(datetime.date(2025, 6, 10), [
+            dict(actually_played=True, goals=2, is_mvp=True), dict(no_show=True), dict(actually_played=True),
+        ])
+        self.finalize(datetime.date(2025, 7, 1), [dict(actually_played=True, assists=1), dict(actually_played=True)])
+        incremental = list(PlayerStats.objects.order_by("player").values())
+        player_stats.rebuild()
+        self.assertEqual(incremental, list(PlayerStats.objects.order_by("player").values()))
+        first = PlayerStats.objects.get(player=self.players[0])
+        self.assertEqual((first.matches_played, first.goals, first.mvps), (2, 2, 1))
+        self.assertEqual(first.last_played, datetime.date(2025, 7, 1))
+        self.assertEqual(PlayerStats.objects.get(player=self.players[1]).no_show_rate, 0.5)
+
+    def test_stats_endpoint_is_a_single_row_read(self):
+        self.finalize(datetime.date(2025, 6, 10), [dict(actually_played=True, goals=3)])
+        self.client.get("/api/matches/")  # load the session and user
+        with self.assertNumQueries(3):  # session, user, stats row
+            data = self.client.get(f"/api/players/{self.players[0].pk}/stats/").json()
+        self.assertEqual((data["goals"], data["matches_played"], data["attendance_rate"]), (3, 1, 1.0))
+        never = self.client.get(f"/api/players/{self.players[3].pk}/stats/").json()
+        self.assertEqual((never["matches_played"], never["attendance_rate"]), (0, None))
+        self.assertEqual(self.client.get("/api/players/999999/stats/").status_code, 404)
+
+    def test_compare_keeps_the_requested_order(self):
+        self.finalize(datetime.date(2025, 6, 10), [dict(actually_played=True), dict(actually_played=True, goals=1)])
+        ids = [self.players[1].pk, self.players[3].pk, self.players[0].pk]
+        data = self.client.get(f"/api/players/compare/?ids={','.join(map(str, ids))}").json()
+        self.assertEqual([row["player"] for row in data], ids)
+        self.assertEqual([row["goals"] for row in data], [1, 0, 0])
+        self.assertEqual(self.client.get("/api/players/compare/?ids=1,x").status_code, 400)
+        self.assertEqual(self.client.get("/api/players/compare/?ids=").status_code, 400)
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.player = make_players(1)[0]
+        self.client.force_login(self.player.user)
+        self.park = make_match(title="Sunday league", location="Riverside Park", notes="Bring bibs")
+        self.hall = make_match(title="Riverside derby", location="Indoor Hall")
+        self.comment = MatchComment.objects.create(match=self.hall, author=self.player, text="Who brings the ball?")
+
+    def get(self, **params):
+        return self.client.get("/api/search/", params)
+
+    def test_ranked_prefix_search_stays_in_sync(self):
+        self.assertTrue(search.available())
+        data = self.get(q="rivers").json()
+        # a title hit outranks a location hit
+        self.assertEqual([m["id"] for m in data["matches"]], [self.hall.pk, self.park.pk])
+        self.assertEqual(data["matches"][0]["snippet"], "[Riverside] derby")
+        self.assertEqual([c["id"] for c in self.get(q="brin bal").json()["comments"]], [self.comment.pk])
+
+        self.park.location = "City Park"
+        self.park.save()
+        MatchComment.objects.create(match=self.hall, author=self.player, text="Riverside again")
+        with self.assertNumQueries(10):  # one statement per related table, however many comments
+            self.hall.delete()
+        data = self.get(q="riverside").json()
+        self.assertEqual((data["matches"], data["comments"]), ([], []))
+        self.assertEqual([m["id"] for m in self.get(q="city", type="matches").json()["matches"]], [self.park.pk])
+
+    def test_rebuild_indexes_bulk_created_rows(self):
+        Match.objects.bulk_create([Match(date=datetime.date(2025, 6, 1), time=datetime.time(18), location="Dockside")])
+        self.assertEqual(self.get(q="dock").json()["matches"], [])
+        search.rebuild()
+        self.assertEqual(len(self.get(q="dock").json()["matches"]), 1)
+
+    @override_settings(LEAGUE_SEARCH_FTS=False)
+    def test_icontains_fallback(self):
+        data = self.get(q="riverside").json()
+        self.assertFalse(data["ranked"])
+        self.assertEqual({m["id"] for m in data["matches"]}, {self.park.pk, self.hall.pk})
+        self.assertIsNone(data["matches"][0]["snippet"])
+
+    def test_admin_search_uses_the_index(self):
+        self.player.user.is_staff = self.player.user.is_superuser = True
+        self.player.user.save()
+        response = self.client.get("/admin/league/match/", {"q": "derb"})
+        self.assertEqual(list(response.context["cl"].result_list), [self.hall])
+
+    def test_bad_queries(self):
+        self.assertEqual(self.get(q="  ").status_code, 400)
+        self.assertEqual(self.get(q='"AND OR*').status_code, 200)  # FTS syntax is quoted away
+        self.assertEqual(self.get(q="x", type="players").status_code, 400)
+        self.assertEqual(self.get(q="x", limit="500").status_code, 400)
+
+
+class QueryPlanTests(TestCase):
+    def test_critical_queries_use_their_indexes(self):
+        failures = query_plans.check()
+        self.assertEqual(failures, {}, "\n".join(
+            f"{name}: {problems} {plan}" for name, (problems, plan) in failures.items()
+        ))
+
+    def test_full_scans_are_reported(self):
+        failures = query_plans.check({"by_notes": lambda: Match.objects.filter(notes="bibs")})
+        self.assertEqual(failures["by_notes"][0], ["full scan of league_match"])
+        self.assertEqual(query_plans.full_scans(Match.objects.order_by("-date", "-time")), [])
+
+
+class SqliteSetupTests(TestCase):
+    def test_connections_are_configured(self):
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], 5000)
+            cursor.execute("PRAGMA synchronous")
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+        self.assertEqual(connection.transaction_mode, "IMMEDIATE")
+
+    def test_concurrent_writers_from_several_processes(self):
+        result = write_contention.run("tuned", processes=4, writes=50)
+        self.assertEqual((result["committed"], result["errors"]), (200, 0))
+        self.assertTrue(result["consistent"])
+
+
+@override_settings(ROOT_URLCONF="goalit.asgi_urls")
+class AsyncApiTests(TestCase):
+    def setUp(self):
+        self.players = make_players(3)
+        self.match = make_match(max_players=1)
+        self.url = f"/api/matches/{self.match.pk}"
+        self.client = AsyncClient()
+
+    async def as_player(self, n):
+        await self.client.aforce_login(await sync_to_async(lambda: self.players[n].user)())
+
+    async def test_join_and_leave_follow_the_capacity_rules(self):
+        await self.as_player(0)
+        first = await self.client.post(f"{self.url}/join/", {"status": "going"}, content_type="application/json")
+        self.assertEqual((first.json()["status"], first.json()["waitlist_position"]), ("going", None))
+        await self.as_player(1)
+        second = await self.client.post(f"{self.url}/join/")
+        self.assertEqual((second.json()["status"], second.json()["waitlist_position"]), ("waiting", 1))
+        bad = await self.client.post(f"{self.url}/join/", {"status": "waiting"}, content_type="application/json")
+        self.assertEqual(bad.status_code, 400)
+
+        await self.as_player(0)
+        self.assertEqual((await self.client.post(f"{self.url}/leave/")).status_code, 204)
+        self.assertEqual((await self.client.post(f"{self.url}/leave/")).status_code, 400)
+        promoted = await MatchParticipation.objects.aget(match=self.match, player=self.players[1])
+        self.assertEqual(promoted.status, "going")
+        self.assertEqual((await self.client.post("/api/matches/999999/join/")).status_code, 404)
+
+    async def test_finalized_matches_refuse_joins_and_leaves(self):
+        await sync_to_async(admission.set_status)(self.match, self.players[0], "going")
+        await sync_to_async(admission.set_status)(self.match, self.players[1], "going")
+        await Match.objects.filter(pk=self.match.pk).aupdate(final_score=True)
+        await self.as_player(0)
+        for urlconf in ("goalit.asgi_urls", "goalit.urls"):
+            with self.subTest(urlconf), override_settings(ROOT_URLCONF=urlconf):
+                for action in ("join", "leave"):
+                    response = await self.client.post(f"{self.url}/{action}/")
+                    self.assertEqual((response.status_code, response.json()), (400, {"detail": "Match is finalized."}))
+        parts = MatchParticipation.objects.filter(match=self.match).order_by("id")
+        self.assertEqual([p.status async for p in parts], ["going", "waiting"])
+
+    async def test_participants_match_the_sync_endpoint(self):
+        await sync_to_async(admission.set_status)(self.match, self.players[0], "going")
+        await self.as_player(2)
+        response = await self.client.get(f"{self.url}/participants/")
+        self.assertIs(response.resolver_match.func, async_api.participants)
+        with override_settings(ROOT_URLCONF="goalit.urls"):
+            sync = await self.client.get(f"{self.url}/participants/")
+        self.assertEqual(response.json(), sync.json())
+        self.assertEqual(response["ETag"], sync["ETag"])
+        cached = await self.client.get(f"{self.url}/participants/", headers={"if-none-match": response["ETag"]})
+        self.assertEqual(cached.status_code, 304)
+
+        await self.client.alogout()
+        self.assertEqual((await self.client.get(f"{self.url}/participants/")).status_code, 403)
+
+    async def test_basic_auth_and_csrf_match_the_drf_endpoints(self):
+        def set_password():
+            self.players[0].user.set_password("pw")
+            self.players[0].user.save()
+        await sync_to_async(set_password)()
+        client = AsyncClient(enforce_csrf_checks=True)
+        basic = {"authorization": "Basic " + base64.b64encode(b"player0:pw").decode()}
+
+        joined = await client.post(f"{self.url}/join/", headers=basic)
+        self.assertEqual((joined.status_code, joined.json()["status"]), (200, "going"))
+        self.assertEqual((await client.get(f"{self.url}/participants/", headers=basic)).status_code, 200)
+        self.assertEqual((await client.post(f"{self.url}/leave/", headers=basic)).status_code, 204)
+        wrong = {"authorization": "Basic " + base64.b64encode(b"player0:nope").decode()}
+        self.assertEqual((await client.post(f"{self.url}/join/", headers=wrong)).status_code, 403)
+
+        # a session still needs its CSRF token for writes, as with DRF's SessionAuthentication
+        await client.aforce_login(await sync_to_async(lambda: self.players[0].user)())
+        refused = await client.post(f"{self.url}/join/")
+        self.assertEqual(refused.status_code, 403)
+        self.assertIn("CSRF", refused.json()["detail"])
+
+    async def test_comment_long_poll_wakes_on_a_new_comment(self):
+        await self.as_player(0)
+        posted = await self.client.post(f"{self.url}/comments/", {"text": "first"}, content_type="application/json")
+        self.assertEqual(posted.status_code, 201)  # handed to MatchViewSet
+        since = posted.json()["id"]
+
+        started = time.monotonic()
+        poll = asyncio.ensure_future(self.client.get(f"{self.url}/comments/", {"since": since, "wait": 10}))
+        await asyncio.sleep(0.2)
+        self.assertFalse(poll.done())
+
+        def comment():
+            with self.captureOnCommitCallbacks(execute=True):
+                MatchComment.objects.create(match=self.match, author=self.players[1], text="second")
+        await sync_to_async(comment)()
+        data = (await asyncio.wait_for(poll, 5)).json()
+        self.assertEqual([c["text"] for c in data["results"]], ["second"])
+        self.assertLess(time.monotonic() - started, 5)
+        bad = await self.client.get(f"{self.url}/comments/", {"since": since, "wait": "nan"})
+        self.assertEqual(bad.status_code, 400)
+
+
+class CommentApiTests(TestCase):
+    def setUp(self):
+        self.players = make_players(3)
+        self.match = make_match()
+        self.url = f"/api/matches/{self.match.pk}/comments/"
+        self.client.force_login(self.players[0].user)
+
+    def post(self, text):
+        return self.client.post(self.url, {"text": text}, content_type="application/json")
+
+    def test_thread_pages_are_constant_queries(self):
+        for n in range(7):
+            self.client.force_login(self.players[n % 3].user)
+            self.assertEqual(self.post(f"comment {n}").status_code, 201)
+        self.client.get("/api/matches/")  # load the session
+        with self.assertNumQueries(4):  # session, user, match exists, page with authors
+            page = self.client.get(self.url, {"page_size": 3}).json()
+        texts = [c["text"] for c in page["results"]]
+        while page["next"]:
+            page = self.client.get(page["next"]).json()
+            texts += [c["text"] for c in page["results"]]
+        self.assertEqual(texts, [f"comment {n}" for n in range(7)])
+        self.assertEqual(self.client.get(self.url).json()["results"][1]["author"], "player1")
+
+    def test_since_returns_only_new_comments(self):
+        first = self.post("first").json()
+        data = self.client.get(self.url, {"since": first["id"]}).json()
+        self.assertEqual(data, {"since": first["id"], "results": []})
+        self.post("second")
+        self.post("third")
+        data = self.client.get(self.url, {"since": first["id"], "wait": 5}).json()
+        self.assertEqual([c["text"] for c in data["results"]], ["second", "third"])
+        self.assertEqual(self.client.get(self.url, {"since": data["since"]}).json()["results"], [])
+        self.assertEqual(self.client.get(self.url, {"since": "x"}).status_code, 400)
+        for wait in ("nan", "inf", "-inf"):
+            self.assertEqual(self.client.get(self.url, {"since": 0, "wait": wait}).status_code, 400)
+        started = time.monotonic()
+        self.assertEqual(self.client.get(self.url, {"since": data["since"], "wait": -5}).status_code, 200)
+        self.assertLess(time.monotonic() - started, 0.5)
+
+    def test_long_poll_gives_up_at_the_deadline(self):
+        started = time.monotonic()
+        data = self.client.get(self.url, {"since": 0, "wait": 0.3}).json()
+        self.assertEqual(data["results"], [])
+        self.assertGreaterEqual(time.monotonic() - started, 0.3)
+
+    def test_invalid_comments(self):
+        self.assertEqual(self.post("   ").status_code, 400)
+        self.assertEqual(self.post("x" * 2001).status_code, 400)
+        self.assertEqual(self.client.get("/api/matches/999999/comments/").status_code, 404)
+
+
+def make_image(size=(1600, 1200), color="red", fmt="JPEG", name="photo.jpg"):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, fmt)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type=f"image/{fmt.lower()}")
+
+
+class HighlightPipelineTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name, LEAGUE_JOB_WORKERS=0)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.player = make_players(1)[0]
+        self.match = make_match()
+        self.url = f"/api/matches/{self.match.pk}/highlights/"
+        self.client.force_login(self.player.user)
+
+    def upload(self, image):
+        response = self.client.post(self.url, {"image": image, "description": "Top bins"})
+        jobs.run_pending()
+        return response
+
+    def test_upload_is_processed_into_variants(self):
+        response = self.upload(make_image())
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()["status"], "pending")
+
+        highlight = MatchHighlight.objects.get()
+        self.assertEqual((highlight.status, highlight.width, highlight.height), ("ready", 1600, 1200))
+        sizes = {key: (d["width"], d["height"]) for key, d in highlight.derivatives.items()}
+        self.assertEqual(sizes, {
+            "thumb.webp": (256, 256), "w640.webp": (640, 480), "w640.jpg": (640, 480),
+            "w1280.webp": (1280, 960), "w1280.jpg": (1280, 960),
+        })
+        self.assertTrue(highlight.image.name.startswith(f"highlights/{highlight.content_hash[:2]}/"))
+
+        response = self.client.get(highlight.derivatives["thumb.webp"]["url"])
+        self.assertEqual(response["Cache-Control"], "public, max-age=31536000, immutable")
+        self.assertEqual(Image.open(io.BytesIO(b"".join(response.streaming_content))).size, (256, 256))
+        self.assertEqual(self.client.get("/media/highlights/derived/../../x").status_code, 404)
+
+    def test_duplicate_upload_reuses_original_and_derivatives(self):
+        self.upload(make_image())
+        response = self.upload(make_image(name="same-again.jpg"))
+        self.assertEqual(response.status_code, 201)
+        first, second = MatchHighlight.objects.order_by("id")
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(first.derivatives, second.derivatives)
+
+    def test_processing_is_a_durable_job_that_skips_stored_variants(self):
+        self.upload(make_image())
+        highlight = MatchHighlight.objects.get()
+        self.assertEqual(Job.objects.get().payload, {"highlight_id": highlight.pk})
+        default_storage.delete(highlight.derivatives["w640.jpg"]["name"])
+        MatchHighlight.objects.update(status="pending")
+        with mock.patch("league.highlights.render", wraps=highlights.render) as render:
+            self.assertEqual(highlights.process(highlight.pk), "ready")
+        self.assertEqual([call.args[1].key for call in render.call_args_list], ["w640.jpg"])
+        highlight.refresh_from_db()
+        self.assertEqual(highlight.derivatives["thumb.webp"]["width"], 256)
+
+    def test_small_images_are_not_upscaled_and_bad_uploads_rejected(self):
+        self.upload(make_image(size=(300, 200), fmt="PNG", name="small.png"))
+        derivatives = MatchHighlight.objects.get().derivatives
+        self.assertEqual((derivatives["w1280.jpg"]["width"], derivatives["w1280.jpg"]["height"]), (300, 200))
+        bad = SimpleUploadedFile("fake.jpg", b"not an image", content_type="image/jpeg")
+        self.assertEqual(self.client.post(self.url, {"image": bad}).status_code, 400)
+
+    def test_gallery_pages_are_constant_queries(self):
+        for n in range(5):
+            self.upload(make_image(color=(n * 40, 0, 0)))
+        self.client.get("/api/matches/")  # load the session
+        with self.assertNumQueries(4):  # session, user, match, page with uploaders
+            page = self.client.get(self.url, {"page_size": 2}).json()
+        ids = [h["id"] for h in page["results"]]
+        while page["next"]:
+            page = self.client.get(page["next"]).json()
+            ids += [h["id"] for h in page["results"]]
+        self.assertEqual(ids, sorted(ids, reverse=True))
+        self.assertEqual(len(ids), 5)
+        self.assertEqual(page["results"][0]["added_by"], "player0")
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        self.calls = []
+        jobs.handler("test_job")(self.handle)
+        self.addCleanup(jobs.HANDLERS.pop, "test_job")
+
+    def handle(self, n, fail=0):
+        self.calls.append(n)
+        Standing.objects.create(player=make_players(1, prefix=f"p{len(self.calls)}-")[0], period=datetime.date(2025, 6, 1))
+        if len(self.calls) <= fail:
+            raise RuntimeError("flaky")
+
+    def test_jobs_run_after_commit_only(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            job = jobs.enqueue("test_job", {"n": 1})
+        self.assertEqual(len(callbacks), 1)  # wakes a worker thread once committed
+        self.assertEqual(jobs.run_pending(), {"done": 1})
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, self.calls), ("done", 1, [1]))
+        self.assertIsNotNone(job.finished_at)
+        with self.assertRaises(ValueError):
+            jobs.enqueue("no_such_job")
+
+    def test_failures_roll_back_and_retry_with_backoff(self):
+        job = jobs.enqueue("test_job", {"n": 1, "fail": 1}, max_attempts=2)
+        self.assertEqual(jobs.run_pending(), {"queued": 1})
+        job.refresh_from_db()
+        self.assertEqual(job.status, "queued")
+        self.assertIn("RuntimeError: flaky", job.last_error)
+        self.assertGreater(job.run_after, timezone.now())
+        self.assertEqual(Standing.objects.count(), 0)  # the failed attempt's writes are gone
+        self.assertEqual(jobs.run_pending(), {})  # not due yet
+
+        Job.objects.update(run_after=timezone.now())
+        self.assertEqual(jobs.run_pending(), {"done": 1})
+        self.assertEqual(Standing.objects.count(), 1)
+
+        jobs.enqueue("test_job", {"n": 2, "fail": 99}, max_attempts=1)
+        self.assertEqual(jobs.run_pending(), {"failed": 1})
+
+    def test_unique_jobs_and_stale_requeue(self):
+        first = jobs.enqueue("test_job", {"n": 1}, unique=True)
+        self.assertEqual(jobs.enqueue("test_job", {"n": 1}, unique=True), first)
+        self.assertEqual(jobs.claim(5, "dead worker"), [first])
+        self.assertEqual(jobs.requeue_stale(timeout=3600), 0)
+        Job.objects.update(started_at=timezone.now() - datetime.timedelta(hours=2))
+        self.assertEqual(jobs.requeue_stale(timeout=3600), 1)
+        self.assertEqual(jobs.run_pending(), {"done": 1})
+
+    def test_a_requeued_claim_cannot_commit(self):
+        jobs.enqueue("test_job", {"n": 1})
+        [slow] = jobs.claim(1, "slow worker")
+        Job.objects.update(started_at=timezone.now() - datetime.timedelta(hours=2))
+        jobs.requeue_stale(timeout=3600)
+        self.assertEqual(jobs.run_pending("other worker"), {"done": 1})
+        self.assertEqual(jobs.execute(slow), "lost")  # the slow worker finishes late
+        self.assertEqual(self.calls, [1, 1])
+        self.assertEqual(Standing.objects.count(), 1)  # its writes were rolled back
+
+    def test_admin_retries_only_failed_jobs(self):
+        done = jobs.enqueue("test_job", {"n": 1})
+        jobs.run_pending()
+        failed = jobs.enqueue("test_job", {"n": 2, "fail": 99}, max_attempts=1)
+        jobs.run_pending()
+        admin_user = User.objects.create_superuser("root")
+        self.client.force_login(admin_user)
+        response = self.client.post("/admin/league/job/", {"action": "retry", "_selected_action": [done.pk, failed.pk]},
+                                    follow=True)
+        self.assertContains(response, "1 job(s) queued. 1 skipped")
+        done.refresh_from_db()
+        failed.refresh_from_db()
+        self.assertEqual((done.status, failed.status, failed.attempts), ("done", "queued", 0))
+
+    def test_metrics(self):
+        for n in range(3):
+            jobs.enqueue("test_job", {"n": n})
+        self.assertEqual(jobs.metrics()["depth"], 3)
+        jobs.run_pending(limit=2)
+        stats = jobs.metrics()
+        self.assertEqual(stats["by_status"], {"queued": 1, "running": 0, "done": 2, "failed": 0})
+        self.assertEqual(stats["queued_by_kind"], {"test_job": 1})
+        self.assertEqual(stats["wait_seconds"]["count"], 2)
+        self.assertGreaterEqual(stats["run_seconds"]["p95"], 0)
+
+
+@override_settings(LEAGUE_METRICS_SAMPLE_RATE=1.0, LEAGUE_METRICS_TOKEN="s3cret")
+class MetricsTests(TestCase):
+    def setUp(self):
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+        self.player = make_players(1)[0]
+        self.match = make_match()
+        self.client.force_login(self.player.user)
+
+    def scrape(self):
+        response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer s3cret")
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def test_requests_are_recorded_per_view(self):
+        self.client.get(f"/api/matches/{self.match.pk}/")
+        self.client.get(f"/{self.match.pk}/")
+        text = self.scrape()
+        self.assertIn('league_request_duration_seconds_count{view="match-detail",method="GET",status="200"} 1', text)
+        self.assertIn('league_request_duration_seconds_bucket{view="league:match_detail",method="GET",status="200",'
+                      'le="+Inf"} 1', text)
+        self.assertIn('league_request_queries_count{view="match-detail"} 1', text)
+        self.assertIn('league_view_slowest_query_seconds{view="match-detail"}', text)
+        self.assertIn('league_jobs{status="queued"} 0', text)
+        self.assertEqual(metrics.QUERY_COUNT.snapshot()[("match-detail",)][1], 5)  # as in its benchmark budget
+
+    def test_metrics_need_staff_or_token(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+        self.assertEqual(self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer nope").status_code, 403)
+        self.player.user.is_staff = True
+        self.player.user.save()
+        self.assertEqual(self.client.get("/metrics").status_code, 200)
+
+    def test_slow_requests_are_logged_with_their_sql(self):
+        with override_settings(LEAGUE_SLOW_REQUEST_SECONDS=0), self.assertLogs("league.slow_requests") as logs:
+            self.client.get(f"/api/matches/{self.match.pk}/")
+        self.assertIn("(match-detail) -> 200", logs.output[0])
+        self.assertIn("5 queries", logs.output[0])
+        self.assertIn("SELECT", logs.output[0])
+
+    def test_unsampled_requests_skip_the_query_recorder(self):
+        with override_settings(LEAGUE_METRICS_SAMPLE_RATE=0, LEAGUE_SLOW_REQUEST_SECONDS=0), \
+                mock.patch.object(metrics, "QueryRecorder") as recorder, \
+                self.assertLogs("league.slow_requests") as logs:
+            self.client.get(f"/api/matches/{self.match.pk}/")
+        recorder.assert_not_called()
+        self.assertIn("(match-detail) -> 200", logs.output[0])
+        self.assertIn("SQL not sampled", logs.output[0])
+        self.assertNotIn(("match-detail",), metrics.QUERY_COUNT.snapshot())
+
+    @override_settings(ROOT_URLCONF="goalit.asgi_urls")
+    async def test_async_views_stay_async(self):
+        async def view(request):
+            return HttpResponse()
+
+        self.assertTrue(iscoroutinefunction(RequestMetricsMiddleware(view)))
+        client = AsyncClient()
+        await client.aforce_login(await sync_to_async(lambda: self.player.user)())
+        response = await client.get(f"/api/matches/{self.match.pk}/participants/")
+        self.assertEqual(response.status_code, 200)
+        # the async ORM's queries are on the connection the middleware wrapped
+        self.assertEqual(metrics.QUERY_COUNT.snapshot()[("async-match-participants",)][1], 5)
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = metrics.Histogram("h", "Test.", ["view"], (0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 3):
+            histogram.observe(value, 'a"b')
+        self.assertEqual(list(histogram.lines())[2:], [
+            'h_bucket{view="a\\"b",le="0.1"} 2',
+            'h_bucket{view="a\\"b",le="1.0"} 3',
+            'h_bucket{view="a\\"b",le="+Inf"} 4',
+            'h_sum{view="a\\"b"} 3.65',
+            'h_count{view="a\\"b"} 4',
+        ])
 
-# Create your tests here.
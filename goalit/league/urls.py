@@ -8,10 +8,12 @@ urlpatterns = [
     path('signup/', views.signup, name='signup'),
     path("", views.MatchListView.as_view(), name="match_list"),
     path("<int:pk>/", views.match_detail, name="match_detail"),
+    path("<int:pk>/events/", views.match_events, name="match_events"),          # SSE roster deltas
     path("<int:pk>/join/", views.join_match, name="join_match"),
     path("<int:pk>/leave/", views.leave_match, name="leave_match"),
     path("<int:pk>/set-status/", views.set_status, name="set_status"),  # Going/Maybe/Not
     path("<int:pk>/set-team/", views.set_team, name="set_team"),        # manual team assign (organizer)
     path("<int:pk>/finalize/", views.finalize_match, name="finalize_match"),  # set final score + attendance
+    path("exports/<slug:kind>.<slug:fmt>", views.export, name="export"),      # staff: streaming CSV/JSONL dumps
   
 ]
@@ -1,18 +1,29 @@
+import secrets
+
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import ensure_csrf_cookie
 from django.contrib import messages
 from django.db import transaction
+from django.db.models import prefetch_related_objects
 from django.shortcuts import get_object_or_404, redirect, render
 from django.views.generic import ListView
+from django.core.handlers.asgi import ASGIRequest
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseBadRequest, StreamingHttpResponse
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
 from .models import Match, MatchParticipation, Team, PlayerProfil
 from .forms import ParticipationStatusForm, SetTeamForm, FinalizeMatchForm, SignUpForm
+from . import admission, cache, events, exports, finalization, highlights, metrics
 from django.shortcuts import render, redirect
 from django.contrib.auth import login
 from django.contrib.auth.models import User
 from django.contrib import messages
 
+EVENT_KEEPALIVE_SECONDS = 15
 
 
 @method_decorator(ensure_csrf_cookie, name="dispatch")
@@ -22,15 +33,19 @@ class MatchListView(LoginRequiredMixin, ListView):
     context_object_name = "matches"
     paginate_by = 20
     def get_queryset(self):
-        return Match.objects.order_by("-date", "-time").prefetch_related("participations__player__user")
+        # participants are only loaded for cards missing from the fragment cache
+        return Match.objects.order_by("-date", "-time")
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["match_cards"] = cache.match_cards(list(context["matches"]))
+        return context
 
 @login_required
 def match_detail(request, pk):
     match = get_object_or_404(Match, pk=pk)
     profile = request.user.profile
     participation = MatchParticipation.objects.filter(match=match, player=profile).first()
-    teams = match.teams.all().order_by("id")
-    participants = match.participations.select_related("player__user", "team").all()
 
     status_form = None
     if participation:
@@ -38,12 +53,43 @@ def match_detail(request, pk):
 
     return render(request, "league/match_detail.html", {
         "match": match,
+        "fragments": cache.match_detail_fragments(match),
+        "is_organizer": match.created_by_id == profile.pk,
         "participation": participation,
-        "teams": teams,
-        "participants": participants,
         "status_form": status_form,
     })
 
+@login_required
+async def match_events(request, pk):
+    """
+    Server-Sent Events stream of roster deltas for one match (see league.events).
+    Needs an ASGI server (goalit/asgi.py); under WSGI it answers 204 so the
+    browser's EventSource stops retrying and the page falls back to refetching.
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+    if not await Match.objects.filter(pk=pk).aexists():
+        raise Http404("No Match matches the given query.")
+
+    subscription = events.get_broker().subscribe(events.match_channel(pk))
+
+    async def stream():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                message = await subscription.get(timeout=EVENT_KEEPALIVE_SECONDS)
+                if message is None:
+                    yield ": keepalive\n\n"  # keeps proxies from closing an idle stream
+                else:
+                    yield f"data: {message}\n\n"
+        finally:
+            subscription.close()
+
+    response = StreamingHttpResponse(stream(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
 @login_required
 def join_match(request, pk):
     match = get_object_or_404(Match, pk=pk)
@@ -52,16 +98,12 @@ def join_match(request, pk):
         return redirect("league:match_detail", pk=pk)
     profile = request.user.profile
 
-    part, created = MatchParticipation.objects.get_or_create(match=match, player=profile)
-    # naive capacity enforcement
-    confirmed_count = match.participations.filter(status="going").count()
-    if confirmed_count >= match.max_players:
-        part.status = "waiting"
-        messages.info(request, "Match is full, you’re on the waiting list.")
+    part, _ = admission.set_status(match, profile, "going")
+    if part.status == "waiting":
+        position = admission.waitlist_position(part)
+        messages.info(request, f"Match is full, you’re #{position} on the waiting list.")
     else:
-        part.status = "going"
         messages.success(request, "You’ve joined this match.")
-    part.save()
     return redirect("league:match_detail", pk=pk)
 
 @login_required
@@ -71,7 +113,7 @@ def leave_match(request, pk):
         messages.error(request, "This match has been finalized and you can't join or change it anymore.")
         return redirect("league:match_detail", pk=pk)
     profile = request.user.profile
-    MatchParticipation.objects.filter(match=match, player=profile).delete()
+    admission.leave(match, profile)
     messages.success(request, "You’ve left this match.")
     return redirect("league:match_detail", pk=pk)
 
@@ -88,17 +130,11 @@ def set_status(request, pk):
         form = ParticipationStatusForm(request.POST, instance=part)
         if form.is_valid():
             status = form.cleaned_data["status"]
-            # Capacity check only for "going"
-            if status == "going":
-                if match.participations.filter(status="going").exclude(id=part.id).count() >= match.max_players:
-                    messages.warning(request, "No more slots — setting you to waiting list.")
-                    part.status = "waiting"
-                    part.save()
-                else:
-                    form.save()
-                    messages.success(request, "Status updated.")
+            part, _ = admission.set_status(match, profile, status)
+            # Capacity only applies to "going"
+            if status == "going" and part.status == "waiting":
+                messages.warning(request, "No more slots — setting you to waiting list.")
             else:
-                form.save()
                 messages.success(request, "Status updated.")
     return redirect("league:match_detail", pk=pk)
 
@@ -109,7 +145,7 @@ def set_team(request, pk):
         messages.error(request, "This match has been finalized and you can't join or change it anymore.")
         return redirect("league:match_detail", pk=pk)
     # Simple permission: only creator can assign teams
-    if match.created_by != request.user.profile:
+    if match.created_by_id != request.user.profile.pk:
         messages.error(request, "Only the match organizer can assign teams.")
         return redirect("league:match_detail", pk=pk)
 
@@ -121,11 +157,11 @@ def set_team(request, pk):
             part = get_object_or_404(MatchParticipation, pk=part_id, match=match)
             part.team = team
             part.save()
+            events.roster_changed(match.pk, [part])
             messages.success(request, "Team updated.")
     return redirect("league:match_detail", pk=pk)
 
 @login_required
-@transaction.atomic
 def finalize_match(request, pk):
     match = get_object_or_404(Match, pk=pk)
     if match.final_score:
@@ -133,14 +169,15 @@ def finalize_match(request, pk):
         return redirect("league:match_detail", pk=pk)
 
     # Only organizer can finalize
-    if match.created_by != request.user.profile:
+    if match.created_by_id != request.user.profile.pk:
         messages.error(request, "Only the match organizer can finalize the match.")
         return redirect("league:match_detail", pk=pk)
 
     if request.method == "POST":
         form = FinalizeMatchForm(request.POST)
         if form.is_valid():
-            # 1) Save team scores
+            # 1) Team scores
+            teams = []
             for team in match.teams.all():
                 field_name = f"score_{team.id}"
                 value = request.POST.get(field_name)
@@ -149,27 +186,31 @@ def finalize_match(request, pk):
                         team.score = int(value)
                     except (TypeError, ValueError):
                         pass  # ignore invalid input, keep old score
-                    team.save()
+                    teams.append(team)
 
-            # 2) Save attendance (played / no_show)
-            for p in match.participations.all():
+            # 2) Attendance (played / no_show)
+            participations = list(match.participations.all())
+            for p in participations:
                 played_field = f"played_{p.id}"
                 no_show_field = f"no_show_{p.id}"
 
                 # Checkbox => present as "on" if checked
                 p.actually_played = request.POST.get(played_field) == "on"
                 p.no_show = request.POST.get(no_show_field) == "on"
-                p.save()
 
-            # 3) Mark match as finalized
-            match.final_score = True  # you used 'final_score' in your model
-            match.save()
+            # 3) Save everything in bulk, mark the match as finalized and update the standings
+            if not finalization.finalize(match, teams, participations, ["actually_played", "no_show"]):
+                messages.error(request, "This match has been finalized and you can't join or change it anymore.")
+                return redirect("league:match_detail", pk=pk)
 
             messages.success(request, "Match finalized.")
             return redirect("league:match_detail", pk=pk)
     else:
         form = FinalizeMatchForm()
 
+    # the form lists every participant by name
+    prefetch_related_objects([match], "teams", "participations__player__user")
+
     return render(
         request,
         "league/finalize_match.html",
@@ -180,6 +221,30 @@ def finalize_match(request, pk):
     )
 
 
+@staff_member_required
+def export(request, kind, fmt):
+    """
+    Stream an export (see league.exports) as CSV or JSON Lines.
+    Query params: date_from, date_to, player, since. The X-Export-Cursor
+    header is the `since` to pass next time.
+    """
+    if kind not in exports.EXPORTS or fmt not in exports.FORMATS:
+        raise Http404("Unknown export.")
+    try:
+        filters = exports.parse_filters(request.GET)
+    except ValueError as exc:
+        return HttpResponseBadRequest(str(exc))
+
+    cursor = exports.new_cursor()
+    response = StreamingHttpResponse(
+        exports.render(kind, fmt, exports.rows(kind, **filters)),
+        content_type=exports.FORMATS[fmt],
+    )
+    response["Content-Disposition"] = f'attachment; filename="{kind}.{fmt}"'
+    response["X-Export-Cursor"] = cursor
+    return response
+
+
 def signup(request):
     # Restrict if user is logged in AND is staff/admin
     if request.user.is_authenticated and request.user.is_staff:
@@ -201,4 +266,31 @@ def signup(request):
     else:
         form = SignUpForm()
 
-    return render(request, "league/signup.html", {"form": form})
\ No newline at end of file
+    return render(request, "league/signup.html", {"form": form})
+
+# derivative names are derived from the image content, so a URL's bytes never change
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+def highlight_derivative(request, path):
+    """
+    Serve a highlight thumbnail/variant with far-future cache headers. In
+    production let the web server serve MEDIA_ROOT/highlights/derived/ with
+    the same Cache-Control instead.
+    """
+    try:
+        f = default_storage.open(f"{highlights.DERIVED_DIR}/{path}")
+    except (FileNotFoundError, SuspiciousFileOperation):
+        raise Http404("No such highlight image.")
+    response = FileResponse(f)
+    response["Cache-Control"] = IMMUTABLE
+    return response
+
+
+def prometheus_metrics(request):
+    """league.metrics for Prometheus: staff sessions, or the LEAGUE_METRICS_TOKEN bearer token."""
+    token = settings.LEAGUE_METRICS_TOKEN
+    authorized = bool(token) and secrets.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}")
+    if not (authorized or request.user.is_staff):
+        return HttpResponse("Forbidden", status=403, content_type="text/plain")
+    return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
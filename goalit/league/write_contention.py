@@ -0,0 +1,112 @@
+"""
+Multi-process write contention on an SQLite file, before and after the
+league.sqlite connection setup.
+
+Each worker process plays a signup window: in a loop it reads the match,
+then joins it in one transaction (read the counter, insert the
+participation, bump the counter), the write pattern of
+league.admission.set_status. Failed transactions are counted, not
+retried, so the error rate is what users would see.
+
+MODES["default"] is a plain connection: rollback journal, deferred BEGIN
+and Python's 5 s busy timeout. Two deferred transactions that both read
+and then write deadlock on the lock upgrade, and one of them fails at
+once. MODES["tuned"] is what the app runs with: league.sqlite.PRAGMAS and
+BEGIN IMMEDIATE.
+"""
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import time
+
+from .sqlite import PRAGMAS, configure
+
+MODES = {
+    "default": {"pragmas": {}, "begin": "BEGIN"},
+    "tuned": {"pragmas": PRAGMAS, "begin": "BEGIN IMMEDIATE"},
+}
+
+SCHEMA = [
+    "CREATE TABLE match (id INTEGER PRIMARY KEY, going_count INTEGER NOT NULL DEFAULT 0)",
+    "CREATE TABLE participation (id INTEGER PRIMARY KEY, match_id INTEGER NOT NULL, player_id INTEGER NOT NULL, "
+    "status TEXT NOT NULL, UNIQUE (match_id, player_id))",
+    "INSERT INTO match (id) VALUES (1)",
+]
+
+
+def _connect(path, mode):
+    conn = sqlite3.connect(path, isolation_level=None)  # autocommit: transactions are explicit
+    configure(conn.cursor(), MODES[mode]["pragmas"])
+    return conn
+
+
+def _worker(path, mode, worker, writes, start, results):
+    conn = _connect(path, mode)
+    committed = errors = 0
+    start.wait()
+    began = time.perf_counter()
+    for n in range(writes):
+        try:
+            conn.execute("SELECT going_count FROM match WHERE id = 1").fetchone()
+            conn.execute(MODES[mode]["begin"])
+            conn.execute("SELECT going_count FROM match WHERE id = 1").fetchone()
+            conn.execute(
+                "INSERT INTO participation (match_id, player_id, status) VALUES (1, ?, 'going')",
+                [worker * writes + n],
+            )
+            conn.execute("UPDATE match SET going_count = going_count + 1 WHERE id = 1")
+            conn.execute("COMMIT")
+            committed += 1
+        except sqlite3.OperationalError:  # "database is locked"
+            errors += 1
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+    results.put((committed, errors, time.perf_counter() - began))
+    conn.close()
+
+
+def run(mode="tuned", processes=4, writes=200):
+    """
+    Run `processes` workers doing `writes` joins each on a scratch database.
+    Returns a dict: mode, processes, attempts, committed, errors,
+    error_rate, seconds, commits_per_second, consistent (counter == rows).
+    """
+    ctx = multiprocessing.get_context("spawn")  # no inherited Django connections
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "contention.sqlite3")
+        conn = _connect(path, mode)
+        for statement in SCHEMA:
+            conn.execute(statement)
+        conn.close()
+
+        start, results = ctx.Event(), ctx.Queue()
+        workers = [
+            ctx.Process(target=_worker, args=(path, mode, n, writes, start, results)) for n in range(processes)
+        ]
+        for process in workers:
+            process.start()
+        start.set()
+        outcomes = [results.get() for _ in workers]
+        for process in workers:
+            process.join()
+
+        conn = _connect(path, mode)
+        counter = conn.execute("SELECT going_count FROM match WHERE id = 1").fetchone()[0]
+        rows = conn.execute("SELECT count(*) FROM participation").fetchone()[0]
+        conn.close()
+
+    committed = sum(c for c, _, _ in outcomes)
+    errors = sum(e for _, e, _ in outcomes)
+    seconds = max(s for _, _, s in outcomes)
+    return {
+        "mode": mode,
+        "processes": processes,
+        "attempts": processes * writes,
+        "committed": committed,
+        "errors": errors,
+        "error_rate": round(errors / (processes * writes), 4),
+        "seconds": round(seconds, 3),
+        "commits_per_second": round(committed / seconds, 1) if seconds else None,
+        "consistent": counter == rows == committed,
+    }